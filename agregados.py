@@ -0,0 +1,339 @@
+"""
+Agregações exibidas no dashboard, calculadas por seção a partir da base filtrada.
+
+Cada agregador recebe a base já filtrada e devolve apenas resultados pequenos
+(contagens, pivots, tabelas de performance). O app guarda esses resultados em um
+cache LRU identificado pela base (hash do arquivo) e pelo estado dos filtros, de
+modo que voltar a uma combinação de filtros já vista não recalcula nada.
+
+Os resultados são objetos tipados (dataclasses), os mesmos devolvidos pelas
+consultas equivalentes do banco analítico. Contagens, tabelas cruzadas e médias
+por dimensão categórica usam os núcleos de nucleos_agregacao (bincount sobre os
+códigos), com resultados idênticos aos de value_counts, crosstab e groupby.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from classificacao_sla import contar_sla_por_grupo
+from nucleos_agregacao import codificar, contar, contar_serie, serie_por_volume, somar, somar_exatos, tabela_cruzada
+from preprocessamento import COLUNAS_ETAPAS
+
+# Agrupamentos disponíveis na tabela de tempo médio por etapa
+AGRUPAMENTOS_ETAPAS = ['Transportador', 'Estado Destino']
+
+
+@dataclass(frozen=True)
+class Insights:
+    """Indicadores de faturamento dos registros com Receita = Sim"""
+    registros: int
+    seq_1_perc: float = 0.0
+    total_valor: float = 0.0
+    total_notas: int = 0
+
+
+@dataclass(frozen=True)
+class MetricasDashboard:
+    """KPIs do Dashboard Geral"""
+    total_nfs: int
+    entregas_no_prazo: int
+    total_realizadas: int
+    taxa_sla: float
+    valor_total: float
+    peso_total: float
+    peso_medio: float
+    lead_time_medio: float
+
+
+@dataclass(frozen=True)
+class Rankings:
+    """Contagens por dimensão, ordenadas por volume (None quando a coluna não existe)"""
+    transportadores: Optional[pd.Series]
+    estados: Optional[pd.Series]
+    status: Optional[pd.Series]
+    ocorrencias: Optional[pd.Series]
+    meses: Optional[pd.Series]
+    qtd_transportadores: int
+    qtd_estados: int
+
+
+@dataclass(frozen=True)
+class ContagemNotas:
+    """Pivots Sequência de Faturamento x BU (vazios quando não há registros com Receita = Sim)"""
+    registros: int
+    contagem: Optional[pd.DataFrame] = None
+    percentual: Optional[pd.DataFrame] = None
+    valor: Optional[pd.DataFrame] = None
+
+
+@dataclass(frozen=True)
+class PerformanceSla:
+    """% SLA por transportadora e tempo médio das etapas por agrupamento"""
+    performance_transp: Optional[pd.DataFrame]
+    tempo_etapas: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Pendencias:
+    """Notas sem data de entrega, entregues atrasadas e pendências por transportadora"""
+    sem_data: int
+    atrasadas: int
+    por_transportador: pd.Series
+
+    @property
+    def total(self):
+        return self.sem_data + self.atrasadas
+
+
+def contar_valores(serie, mascara=None):
+    """
+    Conta a ocorrência de cada valor (só nas linhas da máscara, se houver), ignorando categorias
+    sem registros (colunas categóricas mantêm no value_counts categorias filtradas com contagem zero)
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return contar_serie(serie, mascara)
+    contagem = (serie if mascara is None else serie[mascara]).value_counts()
+    return contagem[contagem > 0]
+
+
+def _linhas_receita(df):
+    """Máscara dos registros com Receita = Sim"""
+    return (df['Receita'] == 'Sim').to_numpy(dtype=bool, na_value=False)
+
+
+def chave_filtros(hash_arquivo, selecoes=None, data_inicio=None, data_fim=None, regra_sla=None):
+    """
+    Monta a chave (hashable) que identifica a base filtrada:
+    hash do arquivo, valores selecionados por coluna (ordenados), período e regra de SLA.
+    Seleções equivalentes, em qualquer ordem, geram a mesma chave.
+    """
+    selecoes_normalizadas = tuple(
+        (col, tuple(sorted(str(v) for v in valores)))
+        for col, valores in sorted((selecoes or {}).items())
+        if valores is not None
+    )
+    periodo = (str(data_inicio), str(data_fim)) if data_inicio is not None and data_fim is not None else None
+    return (hash_arquivo, selecoes_normalizadas, periodo, regra_sla)
+
+
+def agregar_insights(df):
+    """Sequência 1 (%), valor total e total de notas dos registros com Receita = Sim"""
+    if df.empty or not all(col in df.columns for col in ['Receita', 'Seq. De Fat', 'Valor NF']):
+        return None
+
+    receita = _linhas_receita(df)
+    registros = int(receita.sum())
+    if registros == 0:
+        return Insights(registros=0)
+
+    codigos_seq, sequencias = codificar(df['Seq. De Fat'][receita])
+    contagem_seq = contar(codigos_seq, len(sequencias))
+    total_notas = int(contagem_seq.sum())
+    seq_1 = contagem_seq[sequencias == 1].sum()
+    return Insights(
+        registros=registros,
+        seq_1_perc=seq_1 / total_notas * 100 if total_notas > 0 else 0,
+        total_valor=df['Valor NF'][receita].sum(),
+        total_notas=total_notas,
+    )
+
+
+def agregar_dashboard(df):
+    """Métricas principais do Dashboard Geral"""
+    entregas_no_prazo = int(df['No Prazo'].sum()) if 'No Prazo' in df.columns else 0
+    total_realizadas = entregas_no_prazo + (int(df['Atrasada'].sum()) if 'Atrasada' in df.columns else 0)
+    tem_peso = 'Peso Bruto NF' in df.columns
+    tem_lead_time = 'Lead Time' in df.columns
+
+    return MetricasDashboard(
+        total_nfs=len(df),
+        entregas_no_prazo=entregas_no_prazo,
+        total_realizadas=total_realizadas,
+        taxa_sla=(entregas_no_prazo / total_realizadas * 100) if total_realizadas > 0 else 0,
+        valor_total=df['Valor NF'].sum() if 'Valor NF' in df.columns else 0,
+        peso_total=df['Peso Bruto NF'].sum() if tem_peso else 0,
+        peso_medio=df['Peso Bruto NF'].mean() if tem_peso and df['Peso Bruto NF'].notna().any() else 0,
+        lead_time_medio=df['Lead Time'].mean() if tem_lead_time and df['Lead Time'].notna().any() else 0,
+    )
+
+
+def agregar_rankings(df):
+    """Contagens por transportadora, estado, status, ocorrência e mês (ordenadas por volume)"""
+    def contar(col):
+        return contar_valores(df[col]) if col in df.columns else None
+
+    ocorrencias = None
+    if 'Ocorrência' in df.columns:
+        preenchidas = (df['Ocorrência'].notna() & (df['Ocorrência'] != '')).to_numpy()
+        ocorrencias = contar_valores(df['Ocorrência'], preenchidas)
+
+    # Sem categorias zeradas, o tamanho da contagem é o número de valores distintos (nunique)
+    transportadores = contar('Transportador')
+    estados = contar('Estado Destino')
+    return Rankings(
+        transportadores=transportadores,
+        estados=estados,
+        status=contar('Status'),
+        ocorrencias=ocorrencias,
+        meses=contar('Mês Nota'),
+        qtd_transportadores=len(transportadores) if transportadores is not None else 0,
+        qtd_estados=len(estados) if estados is not None else 0,
+    )
+
+
+def agregar_contagem_notas(df):
+    """Pivots Sequência de Faturamento x BU (contagem, percentual e valor) dos registros com Receita = Sim"""
+    if not all(col in df.columns for col in ['Receita', 'Seq. De Fat', 'Unid Negoc', 'Valor NF']):
+        return None
+
+    receita = _linhas_receita(df)
+    registros = int(receita.sum())
+    if registros == 0:
+        return ContagemNotas(registros=0)
+
+    # Sequência x BU sobre os códigos, só com os pares observados (como crosstab e pivot_table)
+    codigos_seq, sequencias = codificar(df['Seq. De Fat'][receita])
+    codigos_bu, bus = codificar(df['Unid Negoc'][receita])
+    tabela = tabela_cruzada(codigos_seq, len(sequencias), codigos_bu, len(bus))
+    linhas = np.flatnonzero(tabela.sum(axis=1) > 0)
+    colunas = np.flatnonzero(tabela.sum(axis=0) > 0)
+    tabela = tabela[np.ix_(linhas, colunas)]
+
+    indice_seq = sequencias.take(linhas).tolist()
+    indice = pd.Index(indice_seq + ['Total Geral'], dtype=object, name='Seq. De Fat')
+    nomes_colunas = pd.Index(bus.take(colunas).tolist() + ['Total Geral'], name='Unid Negoc')
+    total_linhas = tabela.sum(axis=1)
+
+    pivot_contagem = pd.DataFrame(
+        np.vstack([np.column_stack([tabela, total_linhas]), np.append(tabela.sum(axis=0), total_linhas.sum())]),
+        index=indice,
+        columns=nomes_colunas,
+    )
+
+    # Percentuais por coluna (BU)
+    pivot_percentual = pd.DataFrame(
+        np.column_stack([tabela / tabela.sum(axis=0), total_linhas / total_linhas.sum()]),
+        index=pd.Index(indice_seq, dtype=object, name='Seq. De Fat'),
+        columns=nomes_colunas,
+    ) * 100
+
+    # Somas de valor com a soma do pandas (por par, por sequência, por BU e geral)
+    pares = (codigos_seq >= 0) & (codigos_bu >= 0)
+    codigos_linha = np.full(len(sequencias), -1)
+    codigos_linha[linhas] = np.arange(len(linhas))
+    codigos_coluna = np.full(len(bus), -1)
+    codigos_coluna[colunas] = np.arange(len(colunas))
+    linha_par = np.where(pares, codigos_linha[codigos_seq], -1)
+    coluna_par = np.where(pares, codigos_coluna[codigos_bu], -1)
+    valores = df['Valor NF'].to_numpy(dtype=np.float64)[receita]
+
+    matriz_valor = np.zeros((len(linhas) + 1, len(colunas) + 1))
+    celulas = somar(np.where(pares, linha_par * len(colunas) + coluna_par, -1), valores)
+    matriz_valor[celulas.index // len(colunas), celulas.index % len(colunas)] = celulas.to_numpy()
+    por_linha = somar(linha_par, valores)
+    matriz_valor[por_linha.index, -1] = por_linha.to_numpy()
+    por_coluna = somar(coluna_par, valores)
+    matriz_valor[-1, por_coluna.index] = por_coluna.to_numpy()
+    matriz_valor[-1, -1] = pd.Series(valores[pares]).sum()
+
+    pivot_valor = pd.DataFrame(matriz_valor, index=indice, columns=nomes_colunas)
+
+    return ContagemNotas(
+        registros=registros,
+        contagem=pivot_contagem,
+        percentual=pivot_percentual,
+        valor=pivot_valor,
+    )
+
+
+def _tempo_medio_etapas(df, coluna):
+    """
+    Média (1 casa) de cada etapa e total de NFs por valor de `coluna`. Com coluna categórica
+    e etapas inteiras, as somas saem de um bincount (exatas, como no groupby); caso contrário, groupby.
+    """
+    inteiras = all(pd.api.types.is_integer_dtype(df[etapa]) for etapa in COLUNAS_ETAPAS)
+    if not (isinstance(df[coluna].dtype, pd.CategoricalDtype) and inteiras):
+        tabela = df.groupby(coluna, observed=True)[COLUNAS_ETAPAS].mean().round(1)
+        tabela['📦 Total NFs'] = df.groupby(coluna, observed=True).size()
+        return tabela
+
+    codigos, categorias = codificar(df[coluna])
+    total_nfs = contar(codigos, len(categorias))
+    observados = np.flatnonzero(total_nfs > 0)
+    indice = pd.CategoricalIndex(pd.Categorical.from_codes(observados, dtype=df[coluna].dtype), name=coluna)
+
+    medias = {}
+    for etapa in COLUNAS_ETAPAS:
+        valores = df[etapa].to_numpy(dtype=np.float64, na_value=np.nan)
+        soma, quantidade = somar_exatos(codigos, len(categorias), valores)
+        media = np.divide(soma, quantidade, out=np.zeros(len(categorias)), where=quantidade > 0)
+        medias[etapa] = pd.array(media[observados], dtype='Float64', copy=False)
+        medias[etapa][quantidade[observados] == 0] = pd.NA
+
+    tabela = pd.DataFrame(medias, index=indice).round(1)
+    tabela['📦 Total NFs'] = total_nfs[observados]
+    return tabela
+
+
+def agregar_performance_sla(df):
+    """
+    Entregas no prazo/atrasadas e % SLA por transportadora (None sem entregas classificadas)
+    e tempo médio de cada etapa por agrupamento.
+    """
+    if not all(col in df.columns for col in ['Transportador', 'Data de Entrega', 'Previsão de Entrega']):
+        return None
+
+    # Contagens no prazo/atrasadas por transportadora em um único groupby sobre os indicadores
+    performance_transp = contar_sla_por_grupo(df, 'Transportador')
+    if performance_transp.empty:
+        performance_transp = None
+
+    tempo_etapas = {}
+    for coluna in AGRUPAMENTOS_ETAPAS:
+        if coluna in df.columns:
+            tabela = _tempo_medio_etapas(df, coluna)
+            tempo_etapas[coluna] = tabela.sort_values('Dias Úteis Entrega', ascending=False)
+
+    return PerformanceSla(performance_transp=performance_transp, tempo_etapas=tempo_etapas)
+
+
+def agregar_pendencias(df):
+    """Quantidade de notas sem data de entrega e entregues atrasadas, e pendências por transportadora"""
+    if not all(col in df.columns for col in ['Data de Entrega', 'Previsão de Entrega', 'Transportador']):
+        return None
+
+    pendentes = df['Pendente'].to_numpy()
+    atrasadas = df['Atrasada'].to_numpy()
+
+    transportador = df['Transportador']
+    if isinstance(transportador.dtype, pd.CategoricalDtype):
+        # Pendente (sem data de entrega) e Atrasada (entregue) nunca coincidem: uma única contagem
+        codigos, categorias = codificar(transportador)
+        contagens = contar(codigos, len(categorias), pendentes | atrasadas)
+        por_transportador = serie_por_volume(contagens, transportador.dtype, transportador.name)
+    else:
+        por_transportador = contar_valores(pd.concat([transportador[pendentes], transportador[atrasadas]], ignore_index=True))
+
+    return Pendencias(
+        sem_data=int(pendentes.sum()),
+        atrasadas=int(atrasadas.sum()),
+        por_transportador=por_transportador,
+    )
+
+
+# Seções do dashboard e seus agregadores (nome -> função)
+AGREGADORES = {
+    'insights': agregar_insights,
+    'dashboard': agregar_dashboard,
+    'rankings': agregar_rankings,
+    'contagem_notas': agregar_contagem_notas,
+    'performance_sla': agregar_performance_sla,
+    'pendencias': agregar_pendencias,
+}
+
+
+def calcular_agregado(secao, df):
+    """Calcula o agregado de uma seção do dashboard"""
+    return AGREGADORES[secao](df)
@@ -0,0 +1,559 @@
+"""
+Banco analítico embutido (DuckDB ou SQLite, em arquivo local) para os agregados do dashboard.
+
+As partes do histórico são carregadas uma única vez em uma tabela do banco,
+já com as durações da timeline. Os agregados das seções (KPIs, rankings,
+crosstabs, performance de SLA e pendências) são calculados por SQL, com os
+filtros aplicados no WHERE, e devolvidos nos mesmos objetos de `agregados`.
+Apenas o resultado agrupado chega ao pandas. O que o dashboard precisa além dos
+agregados (opções dos filtros, período, totais, preview e Busca NF) também é
+consultado no banco, as linhas sempre com LIMIT: o histórico não é carregado
+inteiro em memória.
+
+Datas são gravadas como segundos desde 1970 (inteiros), o que mantém o mesmo SQL
+válido nos dois motores. O DuckDB é usado quando estiver instalado; caso
+contrário, o SQLite da biblioteca padrão.
+"""
+import importlib.util
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+from agregados import (AGRUPAMENTOS_ETAPAS, ContagemNotas, Insights, MetricasDashboard, Pendencias,
+                       PerformanceSla, Rankings)
+from classificacao_sla import STATUS_ATRASADA, STATUS_NO_PRAZO
+from historico import DIRETORIO_HISTORICO, ler_manifesto
+from filtros import COLUNA_DATA_FILTRO, COLUNAS_FILTRO
+from ingestao import ESQUEMA_BASE, aplicar_esquema
+from preprocessamento import COLUNAS_ETAPAS, normalizar_base
+
+TABELA = 'base'
+TABELA_PARTES = 'partes_carregadas'
+# Tabela temporária com as chaves das NFs atualizadas por uma parte
+TABELA_ATUALIZADAS = 'nfs_atualizadas'
+# Dicionários de categorias do histórico (coluna, valor, código), para desempatar as contagens
+TABELA_CATEGORIAS = 'categorias'
+
+# Durações da timeline gravadas junto com a base (os indicadores de prazo são calculados por SQL)
+COLUNAS_DURACAO = COLUNAS_ETAPAS + ['Dias Corridos Entrega', 'Tempo Total']
+
+TIPOS_SQL = {
+    'texto': 'VARCHAR',
+    'categoria': 'VARCHAR',
+    'inteiro': 'BIGINT',
+    'numero': 'DOUBLE',
+    'data': 'BIGINT',
+}
+
+COLUNAS_TABELA = {col: TIPOS_SQL[tipo] for col, tipo in ESQUEMA_BASE.items()}
+COLUNAS_TABELA.update({col: 'BIGINT' for col in COLUNAS_DURACAO})
+
+# Incrementar sempre que as colunas gravadas no banco mudarem de cálculo, recarregando o histórico num banco novo
+VERSAO_BANCO = 2
+
+# Máximo de linhas devolvidas pelas consultas de linhas (preview e Busca NF)
+LIMITE_LINHAS = 50
+
+_SEGUNDOS_DIA = 86400
+_EPOCA = pd.Timestamp('1970-01-01')
+
+
+def motor_disponivel():
+    """Retorna 'duckdb' quando o pacote estiver instalado; caso contrário, 'sqlite'"""
+    return 'duckdb' if importlib.util.find_spec('duckdb') is not None else 'sqlite'
+
+
+def caminho_banco(motor=None, diretorio=DIRETORIO_HISTORICO):
+    """Arquivo do banco analítico, guardado junto com as partes do histórico"""
+    motor = motor or motor_disponivel()
+    return Path(diretorio) / f"historico_v{VERSAO_BANCO}.{'duckdb' if motor == 'duckdb' else 'sqlite'}"
+
+
+def conectar(caminho, motor=None):
+    """Abre uma conexão com o banco (o arquivo é criado se não existir)"""
+    motor = motor or motor_disponivel()
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    if motor == 'duckdb':
+        import duckdb
+        return duckdb.connect(str(caminho))
+    # Sem transações implícitas: BEGIN/COMMIT explícitos, como no DuckDB
+    return sqlite3.connect(str(caminho), isolation_level=None)
+
+
+def _q(coluna):
+    """Nome de coluna entre aspas duplas (as colunas têm espaços e acentos)"""
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def _consultar(conexao, sql, parametros=()):
+    """Executa uma consulta e devolve o resultado como DataFrame"""
+    cursor = conexao.execute(sql, list(parametros))
+    colunas = [descricao[0] for descricao in cursor.description]
+    return pd.DataFrame(cursor.fetchall(), columns=colunas)
+
+
+def _preparar_parte(df):
+    """
+    Converte uma parte do histórico para as colunas da tabela, com valores Python
+    (None nos vazios), na ordem de COLUNAS_TABELA
+    """
+    df = normalizar_base(df)
+    colunas = {}
+    for col, tipo in COLUNAS_TABELA.items():
+        if col not in df.columns:
+            serie = pd.Series(None, index=df.index, dtype=object)
+        elif ESQUEMA_BASE.get(col) == 'data':
+            serie = ((df[col] - _EPOCA) // pd.Timedelta(seconds=1)).astype('Int64')
+        elif tipo == 'VARCHAR':
+            serie = df[col].astype(object).map(lambda v: None if pd.isna(v) else str(v))
+        else:
+            serie = df[col]
+        colunas[col] = [None if pd.isna(v) else v for v in serie.astype(object).tolist()]
+    return pd.DataFrame(colunas, columns=list(COLUNAS_TABELA), dtype=object)
+
+
+def _inserir(conexao, linhas):
+    """Insere as linhas na tabela (DuckDB lê o DataFrame diretamente; SQLite usa executemany)"""
+    if isinstance(conexao, sqlite3.Connection):
+        marcadores = ', '.join('?' for _ in COLUNAS_TABELA)
+        conexao.executemany(f"INSERT INTO {TABELA} VALUES ({marcadores})", linhas.itertuples(index=False, name=None))
+    else:
+        conexao.register('parte_historico', linhas)
+        conexao.execute(f"INSERT INTO {TABELA} SELECT * FROM parte_historico")
+        conexao.unregister('parte_historico')
+
+
+def _remover_versoes_anteriores(conexao, linhas):
+    """
+    Remove da tabela as NFs (Numero + Seq. De Fat) que a parte traz de novo: vale a versão mais recente.
+    As chaves vão para uma tabela temporária e as versões anteriores saem em um DELETE por conjunto.
+    """
+    numero, seq = _q('Numero'), _q('Seq. De Fat')
+    chaves = linhas[['Numero', 'Seq. De Fat']].drop_duplicates()
+    conexao.execute(f"CREATE TEMP TABLE {TABELA_ATUALIZADAS} ({numero} VARCHAR, {seq} BIGINT)")
+    if isinstance(conexao, sqlite3.Connection):
+        conexao.executemany(
+            f"INSERT INTO {TABELA_ATUALIZADAS} VALUES (?, ?)", chaves.itertuples(index=False, name=None)
+        )
+        conexao.execute(f"CREATE INDEX {TABELA_ATUALIZADAS}_nf ON {TABELA_ATUALIZADAS} ({numero}, {seq})")
+        conexao.execute(
+            f"DELETE FROM {TABELA} WHERE ({numero}, {seq}) IN (SELECT {numero}, {seq} FROM {TABELA_ATUALIZADAS})"
+        )
+        # IN não compara vazios: chaves com NULL saem à parte, considerando iguais dois vazios (IS)
+        conexao.execute(
+            f"DELETE FROM {TABELA} WHERE ({numero} IS NULL OR {seq} IS NULL) AND EXISTS ("
+            f"SELECT 1 FROM {TABELA_ATUALIZADAS} t WHERE t.{numero} IS {TABELA}.{numero} AND t.{seq} IS {TABELA}.{seq})"
+        )
+    else:
+        conexao.register('chaves_atualizadas', chaves)
+        conexao.execute(f"INSERT INTO {TABELA_ATUALIZADAS} SELECT * FROM chaves_atualizadas")
+        conexao.unregister('chaves_atualizadas')
+        conexao.execute(
+            f"DELETE FROM {TABELA} USING {TABELA_ATUALIZADAS} t "
+            f"WHERE {TABELA}.{numero} IS NOT DISTINCT FROM t.{numero} AND {TABELA}.{seq} IS NOT DISTINCT FROM t.{seq}"
+        )
+    conexao.execute(f"DROP TABLE {TABELA_ATUALIZADAS}")
+
+
+def _gravar_categorias(conexao, dicionarios):
+    """Regrava os dicionários de categorias do histórico (valores como texto, como na tabela da base)"""
+    categorias = pd.DataFrame(
+        [(col, str(valor), codigo) for col, valores in dicionarios.items() for codigo, valor in enumerate(valores)],
+        columns=['coluna', 'valor', 'codigo'], dtype=object
+    )
+    conexao.execute("BEGIN TRANSACTION")
+    conexao.execute(f"DELETE FROM {TABELA_CATEGORIAS}")
+    if isinstance(conexao, sqlite3.Connection):
+        conexao.executemany(f"INSERT INTO {TABELA_CATEGORIAS} VALUES (?, ?, ?)", categorias.itertuples(index=False, name=None))
+    else:
+        conexao.register('categorias_historico', categorias)
+        conexao.execute(f"INSERT INTO {TABELA_CATEGORIAS} SELECT * FROM categorias_historico")
+        conexao.unregister('categorias_historico')
+    conexao.execute("COMMIT")
+
+
+def sincronizar_historico(conexao, diretorio=DIRETORIO_HISTORICO):
+    """
+    Carrega no banco as partes do histórico que ainda não foram carregadas.
+    Cada parte é lida e inserida uma única vez; as NFs que ela atualiza têm a versão
+    anterior removida da tabela (como em historico.ler_historico). Os dicionários de
+    categorias do manifesto são regravados a cada sincronização.
+    Retorna a quantidade de partes carregadas nesta chamada.
+    """
+    definicao = ', '.join(f"{_q(col)} {tipo}" for col, tipo in COLUNAS_TABELA.items())
+    conexao.execute(f"CREATE TABLE IF NOT EXISTS {TABELA} ({definicao})")
+    conexao.execute(f"CREATE INDEX IF NOT EXISTS {TABELA}_nf ON {TABELA} ({_q('Numero')}, {_q('Seq. De Fat')})")
+    conexao.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_PARTES} (parte VARCHAR PRIMARY KEY)")
+    conexao.execute(f"CREATE TABLE IF NOT EXISTS {TABELA_CATEGORIAS} (coluna VARCHAR, valor VARCHAR, codigo BIGINT)")
+    carregadas = set(_consultar(conexao, f"SELECT parte FROM {TABELA_PARTES}")['parte'])
+
+    manifesto = ler_manifesto(diretorio)
+    novas = 0
+    for registro in manifesto['arquivos']:
+        parte = registro['parte']
+        if not parte or parte in carregadas:
+            continue
+
+        linhas = _preparar_parte(pd.read_parquet(Path(diretorio) / parte))
+        conexao.execute("BEGIN TRANSACTION")
+        if registro.get('linhas_atualizadas'):
+            _remover_versoes_anteriores(conexao, linhas)
+        _inserir(conexao, linhas)
+        conexao.execute(f"INSERT INTO {TABELA_PARTES} VALUES (?)", [parte])
+        conexao.execute("COMMIT")
+        novas += 1
+
+    _gravar_categorias(conexao, manifesto['dicionarios'])
+    return novas
+
+
+def _clausula_where(selecoes=None, data_inicio=None, data_fim=None):
+    """Monta o WHERE com os filtros globais (mesma semântica de filtros.construir_mascara)"""
+    partes = []
+    parametros = []
+
+    for col, valores in (selecoes or {}).items():
+        if valores is None:
+            continue
+        valores = [str(v) for v in valores]
+        if not valores:
+            partes.append('1 = 0')
+            continue
+        partes.append(f"{_q(col)} IN ({', '.join('?' for _ in valores)})")
+        parametros.extend(valores)
+
+    if data_inicio is not None and data_fim is not None:
+        inicio = (pd.Timestamp(data_inicio) - _EPOCA) // pd.Timedelta(seconds=1)
+        fim = (pd.Timestamp(data_fim) - _EPOCA) // pd.Timedelta(seconds=1) + _SEGUNDOS_DIA - 1
+        partes.append(f"{_q('Dt Nota Fiscal')} BETWEEN ? AND ?")
+        parametros.extend([int(inicio), int(fim)])
+
+    where = f"WHERE {' AND '.join(partes)}" if partes else ''
+    return where, parametros
+
+
+def _expressoes_prazo(regra_sla=(0, False, False)):
+    """
+    Expressões SQL (0/1) de No Prazo, Atrasada e Pendente conforme a regra de SLA
+    (tolerância em dias corridos e comparação por dia; ver classificar_entregas).
+    Tolerância em dias úteis não é suportada no banco (ver suporta_regra).
+    """
+    tolerancia_dias, _, por_dia = regra_sla
+    entrega, previsao = _q('Data de Entrega'), _q('Previsão de Entrega')
+    if por_dia:
+        entrega = f"({entrega} - {entrega} % {_SEGUNDOS_DIA})"
+        previsao = f"({previsao} - {previsao} % {_SEGUNDOS_DIA})"
+    limite = f"({previsao} + {int(tolerancia_dias) * _SEGUNDOS_DIA})"
+
+    classificada = f"{_q('Data de Entrega')} IS NOT NULL AND {_q('Previsão de Entrega')} IS NOT NULL"
+    return {
+        'no_prazo': f"CASE WHEN {classificada} AND {entrega} <= {limite} THEN 1 ELSE 0 END",
+        'atrasada': f"CASE WHEN {classificada} AND {entrega} > {limite} THEN 1 ELSE 0 END",
+        'pendente': f"CASE WHEN {_q('Data de Entrega')} IS NULL THEN 1 ELSE 0 END",
+    }
+
+
+def suporta_regra(regra_sla):
+    """Indica se a regra de SLA pode ser calculada no banco (tolerância em dias úteis exige o pandas)"""
+    tolerancia_dias, tolerancia_em_dias_uteis, _ = regra_sla
+    return not (tolerancia_em_dias_uteis and tolerancia_dias)
+
+
+def _contar_por(conexao, coluna, where, parametros, condicao=None):
+    """
+    Contagem por valor de `coluna`, ordenada por volume (equivalente a contar_valores).
+    Empates seguem a ordem das categorias no dicionário do histórico, como no value_counts.
+    """
+    condicoes = f"{_q(coluna)} IS NOT NULL" + (f" AND {condicao}" if condicao else '')
+    where = f"{where} AND {condicoes}" if where else f"WHERE {condicoes}"
+    resultado = _consultar(
+        conexao,
+        f"SELECT contagem.valor, contagem.n FROM ("
+        f"SELECT {_q(coluna)} AS valor, COUNT(*) AS n FROM {TABELA} {where} GROUP BY {_q(coluna)}"
+        f") contagem LEFT JOIN {TABELA_CATEGORIAS} c ON c.coluna = ? AND c.valor = contagem.valor "
+        f"ORDER BY contagem.n DESC, c.codigo IS NULL, c.codigo, contagem.valor",
+        list(parametros) + [coluna]
+    )
+    return pd.Series(resultado['n'].to_numpy(), index=pd.Index(resultado['valor'], name=coluna), name='count')
+
+
+def agregar_insights(conexao, where, parametros, regra_sla):
+    """Equivalente SQL de agregados.agregar_insights"""
+    where_receita = f"{where} AND {_q('Receita')} = 'Sim'" if where else f"WHERE {_q('Receita')} = 'Sim'"
+    linha = _consultar(
+        conexao,
+        f"SELECT COUNT(*) AS registros, COUNT({_q('Seq. De Fat')}) AS total_notas, "
+        f"SUM(CASE WHEN {_q('Seq. De Fat')} = 1 THEN 1 ELSE 0 END) AS seq_1, "
+        f"COALESCE(SUM({_q('Valor NF')}), 0) AS total_valor FROM {TABELA} {where_receita}",
+        parametros
+    ).iloc[0]
+
+    if linha['registros'] == 0:
+        return Insights(registros=0)
+    total_notas = int(linha['total_notas'])
+    return Insights(
+        registros=int(linha['registros']),
+        seq_1_perc=(linha['seq_1'] or 0) / total_notas * 100 if total_notas > 0 else 0,
+        total_valor=float(linha['total_valor']),
+        total_notas=total_notas,
+    )
+
+
+def agregar_dashboard(conexao, where, parametros, regra_sla):
+    """Equivalente SQL de agregados.agregar_dashboard"""
+    prazo = _expressoes_prazo(regra_sla)
+    linha = _consultar(
+        conexao,
+        f"SELECT COUNT(*) AS total_nfs, SUM({prazo['no_prazo']}) AS no_prazo, SUM({prazo['atrasada']}) AS atrasada, "
+        f"COALESCE(SUM({_q('Valor NF')}), 0) AS valor_total, COALESCE(SUM({_q('Peso Bruto NF')}), 0) AS peso_total, "
+        f"AVG({_q('Peso Bruto NF')}) AS peso_medio, AVG({_q('Lead Time')}) AS lead_time_medio FROM {TABELA} {where}",
+        parametros
+    ).iloc[0]
+
+    entregas_no_prazo = int(linha['no_prazo'] or 0)
+    total_realizadas = entregas_no_prazo + int(linha['atrasada'] or 0)
+    return MetricasDashboard(
+        total_nfs=int(linha['total_nfs']),
+        entregas_no_prazo=entregas_no_prazo,
+        total_realizadas=total_realizadas,
+        taxa_sla=(entregas_no_prazo / total_realizadas * 100) if total_realizadas > 0 else 0,
+        valor_total=float(linha['valor_total']),
+        peso_total=float(linha['peso_total']),
+        peso_medio=float(linha['peso_medio']) if pd.notna(linha['peso_medio']) else 0,
+        lead_time_medio=float(linha['lead_time_medio']) if pd.notna(linha['lead_time_medio']) else 0,
+    )
+
+
+def agregar_rankings(conexao, where, parametros, regra_sla):
+    """Equivalente SQL de agregados.agregar_rankings"""
+    distintos = _consultar(
+        conexao,
+        f"SELECT COUNT(DISTINCT {_q('Transportador')}) AS transportadores, "
+        f"COUNT(DISTINCT {_q('Estado Destino')}) AS estados FROM {TABELA} {where}",
+        parametros
+    ).iloc[0]
+
+    return Rankings(
+        transportadores=_contar_por(conexao, 'Transportador', where, parametros),
+        estados=_contar_por(conexao, 'Estado Destino', where, parametros),
+        status=_contar_por(conexao, 'Status', where, parametros),
+        ocorrencias=_contar_por(conexao, 'Ocorrência', where, parametros, f"{_q('Ocorrência')} <> ''"),
+        meses=_contar_por(conexao, 'Mês Nota', where, parametros),
+        qtd_transportadores=int(distintos['transportadores']),
+        qtd_estados=int(distintos['estados']),
+    )
+
+
+def agregar_contagem_notas(conexao, where, parametros, regra_sla):
+    """
+    Equivalente SQL de agregados.agregar_contagem_notas: o banco agrupa por Sequência x BU
+    e os pivots (com totais) são montados sobre o resultado agrupado.
+    """
+    where_receita = f"{where} AND {_q('Receita')} = 'Sim'" if where else f"WHERE {_q('Receita')} = 'Sim'"
+    registros = int(_consultar(conexao, f"SELECT COUNT(*) AS n FROM {TABELA} {where_receita}", parametros)['n'].iloc[0])
+    if registros == 0:
+        return ContagemNotas(registros=0)
+
+    seq, bu = _q('Seq. De Fat'), _q('Unid Negoc')
+    agrupado = _consultar(
+        conexao,
+        f"SELECT {seq} AS seq, {bu} AS bu, COUNT(*) AS n, COALESCE(SUM({_q('Valor NF')}), 0) AS valor "
+        f"FROM {TABELA} {where_receita} AND {seq} IS NOT NULL AND {bu} IS NOT NULL GROUP BY {seq}, {bu}",
+        parametros
+    )
+    agrupado = agrupado.rename(columns={'seq': 'Seq. De Fat', 'bu': 'Unid Negoc'})
+
+    pivot_contagem = pd.crosstab(
+        agrupado['Seq. De Fat'], agrupado['Unid Negoc'], values=agrupado['n'], aggfunc='sum',
+        margins=True, margins_name='Total Geral'
+    ).fillna(0).astype('int64')
+
+    pivot_percentual = pd.crosstab(
+        agrupado['Seq. De Fat'], agrupado['Unid Negoc'], values=agrupado['n'], aggfunc='sum',
+        normalize='columns', margins=True, margins_name='Total Geral'
+    ).fillna(0) * 100
+
+    pivot_valor = agrupado.pivot_table(
+        index='Seq. De Fat', columns='Unid Negoc', values='valor', aggfunc='sum',
+        fill_value=0, margins=True, margins_name='Total Geral'
+    )
+
+    return ContagemNotas(
+        registros=registros,
+        contagem=pivot_contagem,
+        percentual=pivot_percentual,
+        valor=pivot_valor,
+    )
+
+
+def agregar_performance_sla(conexao, where, parametros, regra_sla):
+    """Equivalente SQL de agregados.agregar_performance_sla"""
+    prazo = _expressoes_prazo(regra_sla)
+    transportador = _q('Transportador')
+    where_transp = f"{where} AND {transportador} IS NOT NULL" if where else f"WHERE {transportador} IS NOT NULL"
+
+    performance = _consultar(
+        conexao,
+        f"SELECT {transportador} AS transportador, SUM({prazo['no_prazo']}) AS no_prazo, SUM({prazo['atrasada']}) AS atrasada "
+        f"FROM {TABELA} {where_transp} GROUP BY {transportador} "
+        f"HAVING SUM({prazo['no_prazo']}) + SUM({prazo['atrasada']}) > 0 ORDER BY {transportador}",
+        parametros
+    )
+    performance_transp = None
+    if not performance.empty:
+        performance_transp = pd.DataFrame({
+            STATUS_NO_PRAZO: performance['no_prazo'].astype('int64').to_numpy(),
+            STATUS_ATRASADA: performance['atrasada'].astype('int64').to_numpy(),
+        }, index=pd.Index(performance['transportador'], name='Transportador'))
+        performance_transp['Total'] = performance_transp[STATUS_NO_PRAZO] + performance_transp[STATUS_ATRASADA]
+        performance_transp['% SLA'] = (performance_transp[STATUS_NO_PRAZO] / performance_transp['Total'] * 100).round(1)
+
+    tempo_etapas = {}
+    medias = ', '.join(f"AVG({_q(col)}) AS {_q(col)}" for col in COLUNAS_ETAPAS)
+    for coluna in AGRUPAMENTOS_ETAPAS:
+        condicao = f"{_q(coluna)} IS NOT NULL"
+        where_grupo = f"{where} AND {condicao}" if where else f"WHERE {condicao}"
+        tabela = _consultar(
+            conexao,
+            f"SELECT {_q(coluna)} AS grupo, {medias}, COUNT(*) AS total FROM {TABELA} {where_grupo} GROUP BY {_q(coluna)} ORDER BY {_q(coluna)}",
+            parametros
+        )
+        tabela = tabela.set_index(pd.Index(tabela.pop('grupo'), name=coluna))
+        total = tabela.pop('total').astype('int64')
+        tabela = tabela.astype('float64').round(1)
+        tabela['📦 Total NFs'] = total
+        tempo_etapas[coluna] = tabela.sort_values('Dias Úteis Entrega', ascending=False)
+
+    return PerformanceSla(performance_transp=performance_transp, tempo_etapas=tempo_etapas)
+
+
+def agregar_pendencias(conexao, where, parametros, regra_sla):
+    """Equivalente SQL de agregados.agregar_pendencias"""
+    prazo = _expressoes_prazo(regra_sla)
+    linha = _consultar(
+        conexao,
+        f"SELECT SUM({prazo['pendente']}) AS sem_data, SUM({prazo['atrasada']}) AS atrasadas FROM {TABELA} {where}",
+        parametros
+    ).iloc[0]
+    sem_data, atrasadas = int(linha['sem_data'] or 0), int(linha['atrasadas'] or 0)
+
+    condicao = f"({prazo['pendente']} = 1 OR {prazo['atrasada']} = 1)"
+    return Pendencias(
+        sem_data=sem_data,
+        atrasadas=atrasadas,
+        por_transportador=_contar_por(conexao, 'Transportador', where, parametros, condicao),
+    )
+
+
+# Seções do dashboard e suas consultas (mesmos nomes de agregados.AGREGADORES)
+AGREGADORES_SQL = {
+    'insights': agregar_insights,
+    'dashboard': agregar_dashboard,
+    'rankings': agregar_rankings,
+    'contagem_notas': agregar_contagem_notas,
+    'performance_sla': agregar_performance_sla,
+    'pendencias': agregar_pendencias,
+}
+
+
+def resumir_base(caminho, colunas_filtro=COLUNAS_FILTRO, coluna_data=COLUNA_DATA_FILTRO, motor=None):
+    """
+    Resumo da tabela para o sidebar, no formato usado de filtros.preparar_filtros: total de linhas,
+    colunas com algum valor, opções (ordenadas) de cada dimensão de filtro e datas mínima e máxima
+    """
+    with closing(conectar(caminho, motor)) as conexao:
+        contagens = ', '.join(f"COUNT({_q(col)})" for col in COLUNAS_TABELA)
+        linha = conexao.execute(
+            f"SELECT COUNT(*), {contagens}, MIN({_q(coluna_data)}), MAX({_q(coluna_data)}) FROM {TABELA}"
+        ).fetchone()
+        total, preenchidas, data_min, data_max = linha[0], linha[1:-2], linha[-2], linha[-1]
+        colunas = [col for col, n in zip(COLUNAS_TABELA, preenchidas) if n]
+
+        dimensoes = {}
+        for col in colunas_filtro:
+            if col in colunas:
+                valores = conexao.execute(f"SELECT DISTINCT {_q(col)} FROM {TABELA} WHERE {_q(col)} IS NOT NULL").fetchall()
+                dimensoes[col] = {'opcoes': sorted(valor for valor, in valores)}
+
+    return {
+        'total': int(total),
+        'colunas': colunas,
+        'dimensoes': dimensoes,
+        'data_min': None if data_min is None else pd.Timestamp(data_min, unit='s').date(),
+        'data_max': None if data_max is None else pd.Timestamp(data_max, unit='s').date(),
+    }
+
+
+def totais_sql(caminho, selecoes=None, data_inicio=None, data_fim=None, motor=None):
+    """Quantidade de linhas e soma do Valor NF com os filtros (formato de indice_diario.totais_periodo)"""
+    where, parametros = _clausula_where(selecoes, data_inicio, data_fim)
+    with closing(conectar(caminho, motor)) as conexao:
+        registros, valor = conexao.execute(
+            f"SELECT COUNT(*), COALESCE(SUM({_q('Valor NF')}), 0) FROM {TABELA} {where}", parametros
+        ).fetchone()
+    return {'registros': int(registros), 'somas': {'Valor NF': float(valor)}}
+
+
+def _linhas(conexao, where, parametros, regra_sla, limite):
+    """
+    Até `limite` linhas da tabela, na ordem de inclusão, com os tipos do esquema
+    (datas como datetime) e o indicador No Prazo pela regra de SLA
+    """
+    colunas = ', '.join(_q(col) for col in COLUNAS_TABELA)
+    no_prazo = _expressoes_prazo(regra_sla)['no_prazo']
+    linhas = _consultar(
+        conexao,
+        f"SELECT {colunas}, {no_prazo} AS {_q('No Prazo')} FROM {TABELA} {where} ORDER BY rowid LIMIT {int(limite)}",
+        parametros
+    )
+    datas = [col for col, tipo in ESQUEMA_BASE.items() if tipo == 'data']
+    for col in datas:
+        linhas[col] = pd.to_datetime(linhas[col], unit='s')
+    for col in COLUNAS_DURACAO:
+        linhas[col] = pd.array(linhas[col], dtype='Int64')
+    linhas['No Prazo'] = linhas['No Prazo'].astype(bool)
+    return aplicar_esquema(linhas, {col: tipo for col, tipo in ESQUEMA_BASE.items() if col not in datas})
+
+
+def consultar_linhas(caminho, selecoes=None, data_inicio=None, data_fim=None, regra_sla=(0, False, False),
+                     limite=LIMITE_LINHAS, motor=None):
+    """Primeiras linhas (até `limite`) com os filtros aplicados, como DataFrame"""
+    where, parametros = _clausula_where(selecoes, data_inicio, data_fim)
+    with closing(conectar(caminho, motor)) as conexao:
+        return _linhas(conexao, where, parametros, regra_sla, limite)
+
+
+def buscar_nf_sql(caminho, termo, modo='contem', colunas=('Numero',), regra_sla=(0, False, False),
+                  limite=LIMITE_LINHAS, motor=None):
+    """
+    Busca NFs no banco com a semântica de busca_nf.buscar_nf (exata, prefixo ou trecho, sem
+    diferenciar maiúsculas de minúsculas). Retorna (até `limite` linhas, total de linhas encontradas).
+    """
+    termo = str(termo).strip().lower()
+    colunas = [col for col in colunas if col in COLUNAS_TABELA]
+    if not termo or not colunas:
+        return pd.DataFrame(columns=list(COLUNAS_TABELA)), 0
+
+    if modo == 'exata':
+        comparacao, valor = "= ?", termo
+    else:
+        # Curingas do LIKE no termo valem como texto
+        escapado = termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        comparacao = "LIKE ? ESCAPE '\\'"
+        valor = f"{escapado}%" if modo == 'prefixo' else f"%{escapado}%"
+    where = "WHERE " + " OR ".join(f"LOWER({_q(col)}) {comparacao}" for col in colunas)
+    parametros = [valor] * len(colunas)
+
+    with closing(conectar(caminho, motor)) as conexao:
+        total = conexao.execute(f"SELECT COUNT(*) FROM {TABELA} {where}", parametros).fetchone()[0]
+        return _linhas(conexao, where, parametros, regra_sla, limite), int(total)
+
+
+def calcular_agregado_sql(secao, caminho, selecoes=None, data_inicio=None, data_fim=None,
+                          regra_sla=(0, False, False), motor=None):
+    """Calcula o agregado de uma seção no banco, com os filtros aplicados no WHERE"""
+    where, parametros = _clausula_where(selecoes, data_inicio, data_fim)
+    with closing(conectar(caminho, motor)) as conexao:
+        return AGREGADORES_SQL[secao](conexao, where, parametros, regra_sla)
@@ -0,0 +1,213 @@
+"""
+Benchmarks do dashboard sobre bases sintéticas (ver dados_sinteticos).
+
+Mede, para cada tamanho de base, a ingestão (planilha lida de uma vez e em
+blocos, e cópia colunar), a normalização, a preparação e aplicação dos filtros,
+os totais do período pelo índice diário, os agregados de cada seção (sobre as
+linhas e pelo cubo pré-agregado) e a Busca NF (tempo de um lote de buscas
+por modo). Os tempos (melhor e mediana das repetições) são gravados em JSON e
+podem ser comparados com uma execução de referência para detectar regressões.
+
+Exemplos:
+    python benchmark.py                                     # 10 mil, 100 mil e 1 milhão de linhas
+    python benchmark.py --linhas 10000 --saida benchmarks/atual.json --comparar benchmarks/referencia.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from agregados import AGREGADORES
+from busca_nf import MODOS_BUSCA, buscar_nf, construir_indice_nf
+from cache_colunar import gravar_parquet_atomico, tipar_para_parquet
+from cubo import calcular_agregado_cubo, construir_cubo
+from dados_sinteticos import gerar_base, gravar_planilha
+from filtros import preparar_filtros
+from indice_diario import totais_periodo
+from ingestao import aplicar_esquema, ler_planilha_base, ler_planilha_base_em_fluxo
+from metricas_sla import FiltroBase, aplicar_filtro
+from preprocessamento import normalizar_base
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000]
+
+# Acima deste número de linhas a leitura da planilha não é medida (gravar o XLSX levaria muitos minutos)
+LIMITE_EXCEL_PADRAO = 100_000
+
+# Variação máxima (fração do tempo de referência) antes de uma etapa ser considerada regressão
+TOLERANCIA_PADRAO = 0.25
+
+DIRETORIO_BENCHMARKS = Path(__file__).resolve().parent / 'benchmarks'
+
+# Buscas por lote na medição da Busca NF
+TERMOS_BUSCA = 50
+
+
+def medir(funcao, repeticoes):
+    """Executa `funcao` `repeticoes` vezes; retorna (melhor, mediana) em segundos e o último resultado"""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), statistics.median(tempos), resultado
+
+
+def _filtro_tipico(base):
+    """Seleção parecida com o uso do dashboard: 2 BUs, as 5 maiores transportadoras e um trimestre"""
+    bus = sorted(base['Unid Negoc'].dropna().unique())[:2]
+    transportadoras = base['Transportador'].value_counts().index[:5].tolist()
+    inicio = base['Dt Nota Fiscal'].min().normalize()
+    fim = inicio + pd.DateOffset(months=3) - pd.Timedelta(days=1)
+    return FiltroBase.criar({'Unid Negoc': bus, 'Transportador': transportadoras}, inicio.date(), fim.date())
+
+
+def executar_benchmark(linhas, repeticoes=3, limite_excel=LIMITE_EXCEL_PADRAO, semente=0, progresso=None):
+    """Mede todas as etapas para uma base de `linhas` NFs; retorna etapa -> {'melhor_s', 'mediana_s'}"""
+    resultados = {}
+
+    def registrar(etapa, funcao, vezes=repeticoes):
+        melhor, mediana, resultado = medir(funcao, vezes)
+        resultados[etapa] = {'melhor_s': melhor, 'mediana_s': mediana}
+        if progresso:
+            progresso(linhas, etapa, melhor)
+        return resultado
+
+    bruta = gerar_base(linhas, semente=semente)
+
+    with tempfile.TemporaryDirectory() as temporario:
+        temporario = Path(temporario)
+        if linhas <= limite_excel:
+            planilha = gravar_planilha(bruta, temporario / 'base.xlsx')
+            registrar('ingestao_planilha', lambda: ler_planilha_base(planilha), vezes=1)
+            registrar('ingestao_fluxo', lambda: ler_planilha_base_em_fluxo(planilha), vezes=1)
+
+        base = registrar('ingestao_esquema', lambda: aplicar_esquema(bruta))
+        caminho_parquet = temporario / 'base.parquet'
+        gravar_parquet_atomico(tipar_para_parquet(base), caminho_parquet)
+        registrar('ingestao_cache_colunar', lambda: pd.read_parquet(caminho_parquet, memory_map=True))
+
+    base = registrar('normalizacao', lambda: normalizar_base(base))
+    filtros_preparados = registrar('preparar_filtros', lambda: preparar_filtros(base))
+
+    filtro = _filtro_tipico(base)
+    filtrada = registrar('filtro', lambda: aplicar_filtro(base, filtro, filtros_preparados))
+    registrar('totais_periodo', lambda: totais_periodo(filtros_preparados['indice_diario'], filtro.data_inicio, filtro.data_fim))
+
+    # Agregados sobre a base completa (pior caso) e sobre a base filtrada
+    for secao, agregador in AGREGADORES.items():
+        registrar(f"agregado_{secao}", lambda: agregador(base))
+        registrar(f"agregado_{secao}_filtrado", lambda: agregador(filtrada))
+
+    # Os mesmos agregados filtrados, respondidos pelo cubo pré-agregado
+    cubo = registrar('cubo_construcao', lambda: construir_cubo(base))
+    for secao in AGREGADORES:
+        registrar(f"agregado_{secao}_cubo", lambda: calcular_agregado_cubo(secao, cubo, filtro))
+
+    indice = registrar('indice_busca_nf', lambda: construir_indice_nf(base))
+    rng = np.random.default_rng(semente)
+    numeros = base['Numero'].dropna().astype(str).to_numpy()
+    termos = rng.choice(numeros, TERMOS_BUSCA)
+    for modo in MODOS_BUSCA:
+        # Número completo na busca exata; trechos do número nas buscas por prefixo e por trecho
+        trechos = [termo if modo == 'exata' else (termo[:3] if modo == 'prefixo' else termo[2:5]) for termo in termos]
+
+        def buscar_lote(modo=modo, trechos=trechos):
+            for trecho in trechos:
+                buscar_nf(indice, trecho, modo)
+
+        registrar(f"busca_nf_{modo}", buscar_lote)
+
+    return resultados
+
+
+def ambiente():
+    """Versões e máquina em que o benchmark foi executado"""
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+    }
+
+
+def comparar(atual, referencia, tolerancia=TOLERANCIA_PADRAO):
+    """
+    Compara os melhores tempos com os da referência, para os tamanhos e etapas presentes nas duas.
+    Retorna uma tabela (linhas, etapa, referência, atual, variação, regressão).
+    """
+    linhas = []
+    for tamanho, etapas in atual['resultados'].items():
+        etapas_referencia = referencia['resultados'].get(tamanho, {})
+        for etapa, tempos in etapas.items():
+            if etapa not in etapas_referencia:
+                continue
+            anterior = etapas_referencia[etapa]['melhor_s']
+            variacao = tempos['melhor_s'] / anterior - 1 if anterior > 0 else 0.0
+            linhas.append({
+                'linhas': int(tamanho),
+                'etapa': etapa,
+                'referencia_s': anterior,
+                'atual_s': tempos['melhor_s'],
+                'variacao': variacao,
+                'regressao': variacao > tolerancia,
+            })
+    return pd.DataFrame(linhas, columns=['linhas', 'etapa', 'referencia_s', 'atual_s', 'variacao', 'regressao'])
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do dashboard sobre bases sintéticas.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO, help="Tamanhos das bases")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Repetições por etapa (padrão: 3)")
+    parser.add_argument('--limite-excel', type=int, default=LIMITE_EXCEL_PADRAO,
+                        help="Maior base em que a leitura da planilha é medida")
+    parser.add_argument('--semente', type=int, default=0, help="Semente do gerador (padrão: 0)")
+    parser.add_argument('--saida', type=Path, help="Arquivo JSON dos resultados (padrão: benchmarks/resultado_<data>.json)")
+    parser.add_argument('--comparar', type=Path, help="Resultado de referência para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help="Variação aceita em relação à referência (padrão: 0.25 = 25%%)")
+    args = parser.parse_args(argumentos)
+
+    resultado = {
+        'executado_em': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': ambiente(),
+        'repeticoes': args.repeticoes,
+        'resultados': {},
+    }
+    for linhas in args.linhas:
+        resultado['resultados'][str(linhas)] = executar_benchmark(
+            linhas, args.repeticoes, args.limite_excel, args.semente,
+            progresso=lambda n, etapa, tempo: print(f"{n:>9,} linhas  {etapa:<32} {tempo * 1000:10.2f} ms")
+        )
+
+    saida = args.saida or DIRETORIO_BENCHMARKS / f"resultado_{datetime.now():%Y%m%d_%H%M%S}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"📄 Resultados gravados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            referencia = json.load(f)
+        comparacao = comparar(resultado, referencia, args.tolerancia)
+        with pd.option_context('display.max_rows', None, 'display.width', 120):
+            print(comparacao.to_string(index=False, formatters={'variacao': '{:+.1%}'.format}))
+        regressoes = comparacao[comparacao['regressao']]
+        if not regressoes.empty:
+            print(f"⚠️ {len(regressoes)} etapa(s) mais lentas que a referência (tolerância {args.tolerancia:.0%})")
+            return 1
+        print("✅ Nenhuma regressão em relação à referência")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Índice de busca de notas fiscais para a aba Busca NF.
+
+Construído uma única vez por base, permite localizar NFs (e romaneios) por
+número exato, prefixo ou trecho do número, retornando as posições das linhas
+sem percorrer a coluna inteira a cada busca.
+"""
+import numpy as np
+
+COLUNAS_BUSCA = ['Numero', 'Nr Romaneio']
+
+MODOS_BUSCA = {
+    'contem': 'Contém',
+    'prefixo': 'Começa com',
+    'exata': 'Exata',
+}
+
+# Valores acima deste tamanho (em bytes) deixariam o índice de sufixos grande demais: ficam
+# fora dele e, na busca por trecho, apenas esses valores são percorridos com np.char.find
+TAMANHO_MAXIMO_SUFIXOS = 16
+
+# Maior que qualquer byte de um texto UTF-8: limite superior da busca por prefixo
+_FIM_PREFIXO = b'\xff'
+
+
+def _indexar_coluna(serie):
+    """
+    Monta as estruturas de busca de uma coluna (valores em minúsculas, codificados em UTF-8):
+    - valores ordenados, para busca exata e por prefixo com busca binária
+    - todos os sufixos dos valores de até TAMANHO_MAXIMO_SUFIXOS bytes ordenados (suffix array),
+      para busca por trecho: um trecho ocorre em um valor se e somente se é prefixo de algum
+      de seus sufixos; os valores mais longos são guardados à parte
+    """
+    textos = serie.astype('string').fillna('').str.lower().tolist()
+    valores = np.array([t.encode('utf-8') for t in textos], dtype=bytes)
+    total = len(valores)
+
+    ordem = np.argsort(valores, kind='stable')
+    indice = {
+        'total': total,
+        'valores': valores,
+        'ordenados': valores[ordem],
+        'ordem': ordem,
+    }
+
+    comprimentos = np.char.str_len(valores)
+    curtos = comprimentos <= TAMANHO_MAXIMO_SUFIXOS
+    indice['linhas_longas'] = np.flatnonzero(~curtos)
+    indice['valores_longos'] = valores[~curtos]
+
+    linhas_curtas = np.flatnonzero(curtos).astype(np.int32)
+    quantidade = len(linhas_curtas)
+    largura = max(int(comprimentos[curtos].max()) if quantidade else 0, 1)
+    matriz = np.ascontiguousarray(valores[curtos].astype(f'S{largura}')).view(np.uint8).reshape(quantidade, largura)
+    sufixos = []
+    for inicio in range(largura):
+        deslocada = np.zeros((quantidade, largura), dtype=np.uint8)
+        deslocada[:, :largura - inicio] = matriz[:, inicio:]
+        sufixos.append(deslocada.view(f'S{largura}').ravel())
+
+    sufixos = np.concatenate(sufixos)
+    linhas = np.tile(linhas_curtas, largura)
+    nao_vazios = sufixos != b''
+    sufixos = sufixos[nao_vazios]
+    linhas = linhas[nao_vazios]
+
+    ordem_sufixos = np.argsort(sufixos, kind='stable')
+    indice['sufixos'] = sufixos[ordem_sufixos]
+    indice['linhas_sufixos'] = linhas[ordem_sufixos]
+
+    return indice
+
+
+def construir_indice_nf(df, colunas=COLUNAS_BUSCA):
+    """Constrói o índice de busca para as colunas informadas que existirem na base"""
+    return {col: _indexar_coluna(df[col]) for col in colunas if col in df.columns}
+
+
+def _faixa_prefixo(ordenados, termo):
+    """Intervalo [inicio, fim) dos valores ordenados que começam com `termo`"""
+    inicio = np.searchsorted(ordenados, termo, side='left')
+    fim = np.searchsorted(ordenados, termo + _FIM_PREFIXO, side='left')
+    return inicio, fim
+
+
+def _buscar_coluna(indice_coluna, termo, modo):
+    """Retorna uma máscara booleana com as linhas da coluna que atendem à busca"""
+    mascara = np.zeros(indice_coluna['total'], dtype=bool)
+
+    if modo == 'exata':
+        ordenados = indice_coluna['ordenados']
+        inicio = np.searchsorted(ordenados, termo, side='left')
+        fim = np.searchsorted(ordenados, termo, side='right')
+        mascara[indice_coluna['ordem'][inicio:fim]] = True
+    elif modo == 'prefixo':
+        inicio, fim = _faixa_prefixo(indice_coluna['ordenados'], termo)
+        mascara[indice_coluna['ordem'][inicio:fim]] = True
+    else:
+        inicio, fim = _faixa_prefixo(indice_coluna['sufixos'], termo)
+        mascara[indice_coluna['linhas_sufixos'][inicio:fim]] = True
+        # Valores longos demais para o índice de sufixos
+        longos = np.char.find(indice_coluna['valores_longos'], termo) >= 0
+        mascara[indice_coluna['linhas_longas'][longos]] = True
+
+    return mascara
+
+
+def buscar_nf(indice, termo, modo='contem', colunas=('Numero',)):
+    """
+    Retorna as posições (iloc) das linhas cujo valor contém, começa com ou é igual a `termo`,
+    em ordem crescente. A busca não diferencia maiúsculas de minúsculas.
+    """
+    termo = str(termo).strip().lower().encode('utf-8')
+    colunas = [col for col in colunas if col in indice]
+    if not termo or not colunas:
+        return np.array([], dtype=np.int64)
+
+    mascara = _buscar_coluna(indice[colunas[0]], termo, modo)
+    for col in colunas[1:]:
+        mascara |= _buscar_coluna(indice[col], termo, modo)
+
+    return np.flatnonzero(mascara)
@@ -0,0 +1,165 @@
+"""
+Cache colunar em disco para as planilhas carregadas no dashboard.
+
+A primeira leitura de um arquivo grava uma cópia tipada em Parquet, identificada
+pelo hash do conteúdo. As leituras seguintes (inclusive depois de reiniciar o app)
+abrem essa cópia com memory-map em vez de interpretar o XLSX novamente.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+# Diretório do cache (pode ser alterado pela variável de ambiente SLA_CACHE_DIR)
+DIRETORIO_CACHE = Path(os.environ.get('SLA_CACHE_DIR', Path(__file__).resolve().parent / '.cache_sla'))
+
+# Incrementar sempre que a forma de ler/tipar a planilha mudar, invalidando cópias antigas
+VERSAO_CACHE = 2
+
+TAMANHO_BLOCO_HASH = 1024 * 1024
+
+
+def calcular_hash_arquivo(arquivo):
+    """
+    Calcula o hash SHA-256 do conteúdo de um arquivo.
+    Aceita um caminho, bytes ou um objeto de arquivo (ex.: UploadedFile do Streamlit).
+    """
+    hasher = hashlib.sha256()
+
+    if isinstance(arquivo, (bytes, bytearray)):
+        hasher.update(arquivo)
+    elif isinstance(arquivo, (str, os.PathLike)):
+        with open(arquivo, 'rb') as f:
+            for bloco in iter(lambda: f.read(TAMANHO_BLOCO_HASH), b''):
+                hasher.update(bloco)
+    elif hasattr(arquivo, 'getvalue'):
+        hasher.update(arquivo.getvalue())
+    else:
+        posicao = arquivo.tell()
+        arquivo.seek(0)
+        for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO_HASH), b''):
+            hasher.update(bloco)
+        arquivo.seek(posicao)
+
+    return hasher.hexdigest()
+
+
+def caminho_cache(hash_arquivo, aba='Base'):
+    """Retorna o caminho da cópia Parquet de uma aba de um arquivo"""
+    nome_aba = ''.join(c if c.isalnum() else '_' for c in aba)
+    return DIRETORIO_CACHE / f"{hash_arquivo}_{nome_aba}_v{VERSAO_CACHE}.parquet"
+
+
+def categorias_mistas(categorias):
+    """Indica se os valores misturam números e textos (o Parquet não grava categorias assim)"""
+    return pd.api.types.infer_dtype(categorias, skipna=True) in ('mixed', 'mixed-integer')
+
+
+def categorias_para_texto(serie):
+    """Converte os valores de uma coluna para texto e a devolve como categórica, preservando os vazios"""
+    valores = serie.astype(object)
+    return valores.where(valores.isna(), valores.astype(str)).astype('category')
+
+
+def tipar_para_parquet(df):
+    """
+    Ajusta colunas de tipo misto para que o DataFrame possa ser gravado em Parquet.
+    Colunas numéricas ou de data guardadas como texto são convertidas; as demais
+    colunas mistas viram texto, preservando os valores vazios. Colunas categóricas
+    com categorias de tipos mistos passam a ter categorias de texto.
+    """
+    df = df.copy()
+    df.columns = [str(col) for col in df.columns]
+
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            if categorias_mistas(df[col].cat.categories):
+                df[col] = categorias_para_texto(df[col])
+            continue
+        if df[col].dtype != object:
+            continue
+
+        tipo = pd.api.types.infer_dtype(df[col], skipna=True)
+        if tipo in ('integer', 'floating', 'mixed-integer-float', 'decimal'):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        elif tipo in ('datetime', 'datetime64', 'date'):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif tipo not in ('string', 'empty', 'boolean'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    return df
+
+
+def ler_cache(hash_arquivo, aba='Base'):
+    """Lê a cópia Parquet com memory-map. Retorna None se não existir ou estiver corrompida"""
+    caminho = caminho_cache(hash_arquivo, aba)
+    if not caminho.exists():
+        return None
+
+    try:
+        return pd.read_parquet(caminho, memory_map=True)
+    except Exception:
+        # Cópia corrompida ou gravada por versão incompatível: descartar
+        caminho.unlink(missing_ok=True)
+        return None
+
+
+def gravar_parquet_atomico(df, caminho):
+    """
+    Grava um DataFrame em Parquet de forma atômica (arquivo temporário + rename),
+    para que leituras concorrentes nunca vejam um arquivo pela metade.
+    """
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, caminho_tmp = tempfile.mkstemp(dir=caminho.parent, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(caminho_tmp, index=False)
+        os.replace(caminho_tmp, caminho)
+    finally:
+        if os.path.exists(caminho_tmp):
+            os.remove(caminho_tmp)
+
+
+def gravar_cache(df, hash_arquivo, aba='Base'):
+    """
+    Grava a cópia Parquet de forma atômica (ver gravar_parquet_atomico).
+    Retorna o DataFrame tipado que foi gravado.
+    """
+    df_tipado = tipar_para_parquet(df)
+    gravar_parquet_atomico(df_tipado, caminho_cache(hash_arquivo, aba))
+    return df_tipado
+
+
+def carregar_com_cache(arquivo, leitor, aba='Base'):
+    """
+    Carrega uma aba usando o cache colunar.
+
+    Se já existir uma cópia para o conteúdo do arquivo, ela é lida diretamente.
+    Caso contrário, `leitor(arquivo)` é chamado para interpretar a planilha e o
+    resultado é gravado no cache. Falhas ao gravar o cache não impedem o carregamento.
+    O hash do conteúdo fica em `df.attrs['hash_arquivo']`.
+    """
+    hash_arquivo = calcular_hash_arquivo(arquivo)
+
+    df = ler_cache(hash_arquivo, aba)
+    if df is not None:
+        df.attrs['hash_arquivo'] = hash_arquivo
+        return df
+
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    df = leitor(arquivo)
+
+    try:
+        df = gravar_cache(df, hash_arquivo, aba)
+    except Exception:
+        # Sem permissão de escrita, disco cheio, pyarrow ausente etc.: seguir sem cache
+        pass
+
+    # Identificador da base, usado como chave dos caches e índices construídos sobre ela
+    df.attrs['hash_arquivo'] = hash_arquivo
+    return df
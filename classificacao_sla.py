@@ -0,0 +1,96 @@
+"""
+Classificação vetorizada das entregas em no prazo / atrasada.
+
+A regra de SLA é configurável:
+- tolerância: dias após a Previsão de Entrega ainda considerados no prazo (ex.: D+1),
+  em dias corridos ou em dias úteis (conforme um calendário de dias_uteis, um único ou
+  um por UF de destino)
+- comparação por dia: ignora o horário das datas, comparando apenas a parte da data
+Entregas sem data de entrega ou sem previsão não são classificadas.
+"""
+import numpy as np
+import pandas as pd
+
+from dias_uteis import agrupar_por_estado
+from nucleos_agregacao import codificar, contar
+
+STATUS_NO_PRAZO = 'Entregue no Prazo'
+STATUS_ATRASADA = 'Entregue Atrasada'
+
+
+def calcular_prazo_limite(previsao, tolerancia_dias=0, calendario=None):
+    """
+    Soma a tolerância à previsão de entrega.
+    Com `calendario`, a tolerância é contada em dias úteis a partir do próximo dia útil
+    (o horário da previsão é preservado).
+    """
+    previsao = pd.Series(previsao)
+    if not tolerancia_dias:
+        return previsao
+    if calendario is None:
+        return previsao + pd.Timedelta(days=int(tolerancia_dias))
+
+    dias = previsao.to_numpy().astype('datetime64[D]')
+    validos = ~np.isnat(dias)
+    limite = dias.copy()
+    limite[validos] = np.busday_offset(dias[validos], int(tolerancia_dias), roll='forward', busdaycal=calendario)
+    return previsao + pd.to_timedelta(limite - dias)
+
+
+def calcular_prazo_limite_por_estado(previsao, tolerancia_dias, estados, calendarios):
+    """
+    Soma a tolerância em dias úteis à previsão de cada linha com o calendário da sua UF
+    (`calendarios` de dias_uteis.montar_calendarios_por_estado)
+    """
+    previsao = pd.Series(previsao)
+    limite = previsao.copy()
+    for posicoes, calendario in agrupar_por_estado(estados, calendarios):
+        limite.iloc[posicoes] = calcular_prazo_limite(previsao.iloc[posicoes], tolerancia_dias, calendario).to_numpy()
+    return limite
+
+
+def classificar_entregas(entrega, previsao, tolerancia_dias=0, por_dia=False, calendario=None, estados=None):
+    """
+    Classifica todas as entregas de uma vez.
+    Com `estados`, `calendario` é o dicionário de calendários por UF e cada linha usa o da sua UF.
+    Retorna dois arrays booleanos (no_prazo, atrasada); ambos são False quando
+    falta a data de entrega ou a previsão.
+    """
+    entrega = pd.Series(pd.to_datetime(entrega, errors='coerce'))
+    previsao = pd.Series(pd.to_datetime(previsao, errors='coerce'), index=entrega.index)
+
+    if por_dia:
+        entrega = entrega.dt.normalize()
+        previsao = previsao.dt.normalize()
+
+    if estados is not None and calendario is not None and tolerancia_dias:
+        limite = calcular_prazo_limite_por_estado(previsao, tolerancia_dias, estados, calendario)
+    else:
+        limite = calcular_prazo_limite(previsao, tolerancia_dias, calendario)
+    classificadas = (entrega.notna() & limite.notna()).to_numpy()
+    dentro_prazo = (entrega <= limite).to_numpy()
+
+    return classificadas & dentro_prazo, classificadas & ~dentro_prazo
+
+
+def contar_sla_por_grupo(df, coluna='Transportador'):
+    """
+    Entregas no prazo, atrasadas, total e % SLA por valor de `coluna`, em uma única passada
+    sobre os indicadores No Prazo / Atrasada: bincount sobre os códigos quando a coluna é
+    categórica e os indicadores booleanos; groupby nos demais casos (ex.: células do cubo).
+    Apenas grupos com entregas classificadas.
+    """
+    indicadores_booleanos = all(pd.api.types.is_bool_dtype(df[col]) for col in ['No Prazo', 'Atrasada'])
+    if isinstance(df[coluna].dtype, pd.CategoricalDtype) and indicadores_booleanos:
+        codigos, categorias = codificar(df[coluna])
+        observados = np.flatnonzero(contar(codigos, len(categorias)) > 0)
+        contagem = pd.DataFrame({
+            STATUS_NO_PRAZO: contar(codigos, len(categorias), df['No Prazo'].to_numpy())[observados],
+            STATUS_ATRASADA: contar(codigos, len(categorias), df['Atrasada'].to_numpy())[observados],
+        }, index=pd.CategoricalIndex(pd.Categorical.from_codes(observados, dtype=df[coluna].dtype), name=coluna))
+    else:
+        contagem = df.groupby(coluna, observed=True)[['No Prazo', 'Atrasada']].sum()
+        contagem.columns = [STATUS_NO_PRAZO, STATUS_ATRASADA]
+    contagem['Total'] = contagem[STATUS_NO_PRAZO] + contagem[STATUS_ATRASADA]
+    contagem['% SLA'] = (contagem[STATUS_NO_PRAZO] / contagem['Total'] * 100).round(1)
+    return contagem[contagem['Total'] > 0]
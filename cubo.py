@@ -0,0 +1,332 @@
+"""
+Cubo pré-agregado da base: BU × mês de faturamento × transportadora × estado × status × sequência.
+
+O cubo é montado uma vez por base (e regra de SLA). Cada célula guarda a
+quantidade de NFs, as entregas no prazo / atrasadas / pendentes e as somas (com a
+quantidade de valores preenchidos) de Valor NF, Peso Bruto NF, Lead Time e dos
+tempos das etapas. Em vez do cruzamento de todas as dimensões, que pode ter quase
+tantas células quanto linhas, o cubo guarda agregações menores: as dimensões dos
+filtros globais mais, em cada uma, as dimensões exibidas por uma seção (estado,
+mês, receita x sequência, ocorrência). Os filtros viram uma máscara sobre as
+células e os agregados saem de groupbys sobre essas fatias, com custo
+proporcional ao tamanho do cubo e não ao número de NFs.
+
+O período de faturamento é guardado por mês: o cubo responde aos períodos que
+cobrem meses inteiros (o período completo da base, um mês, um trimestre...). Para
+os demais, `cubo_responde` retorna False e o app calcula sobre as linhas.
+"""
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from agregados import (AGRUPAMENTOS_ETAPAS, ContagemNotas, Insights, MetricasDashboard, Pendencias, PerformanceSla,
+                       Rankings)
+from classificacao_sla import contar_sla_por_grupo
+from filtros import COLUNA_DATA_FILTRO
+from preprocessamento import COLUNAS_ETAPAS
+
+# Dimensões dos filtros globais (além do mês de faturamento), presentes em todas as agregações do cubo
+DIMENSOES_FILTRO_CUBO = ['Unid Negoc', 'Transportador', 'Status']
+
+# Agregações do cubo: dimensões além das de filtro. Cada seção lê apenas as agregações de que
+# precisa, bem menores que o cruzamento de todas as dimensões
+AGREGACOES_CUBO = {
+    'filtros': [],
+    'receita': ['Receita', 'Seq. De Fat'],
+    'estado': ['Estado Destino'],
+    'mes_nota': ['Mês Nota'],
+    'ocorrencia': ['Ocorrência'],
+}
+
+# Mês da Dt Nota Fiscal (ano * 12 + mês - 1; -1 sem data), usado pelo filtro de período
+COLUNA_MES_FATURAMENTO = 'Mês Faturamento'
+
+# Indicadores somados por célula (quantidade de NFs com o indicador)
+INDICADORES_CUBO = ['No Prazo', 'Atrasada', 'Pendente']
+
+# Colunas somadas por célula, com a quantidade de valores preenchidos (para as médias)
+SOMAS_CUBO = ['Valor NF', 'Peso Bruto NF', 'Lead Time'] + COLUNAS_ETAPAS
+
+COLUNA_NFS = 'NFs'
+
+
+def _preenchidos(coluna):
+    return f"{coluna} (preenchidos)"
+
+
+def _codigo_mes(data):
+    return data.year * 12 + data.month - 1
+
+
+@dataclass(frozen=True)
+class Cubo:
+    """Agregações do cubo (nome -> células) e os dados da base necessários para responder aos filtros"""
+    agregacoes: dict
+    colunas: frozenset
+    linhas: int
+    data_min: Optional[object] = None
+    data_max: Optional[object] = None
+
+    @property
+    def tamanho(self):
+        """Total de células de todas as agregações"""
+        return sum(len(celulas) for celulas in self.agregacoes.values())
+
+
+def construir_cubo(df):
+    """
+    Agrega a base (normalizada, com a regra de SLA aplicada) no cruzamento de todas as dimensões
+    e, a partir dele, em cada agregação de AGREGACOES_CUBO
+    """
+    chaves = [df[col] for col in DIMENSOES_FILTRO_CUBO if col in df.columns]
+    data_min = data_max = None
+    if COLUNA_DATA_FILTRO in df.columns:
+        datas = df[COLUNA_DATA_FILTRO]
+        mes = (datas.dt.year * 12 + datas.dt.month - 1).fillna(-1).astype('int32')
+        chaves.append(mes.rename(COLUNA_MES_FATURAMENTO))
+        if datas.notna().any():
+            data_min = datas.min().date()
+            data_max = datas.max().date()
+    dimensoes_filtro = [chave.name for chave in chaves]
+    extras = list(dict.fromkeys(col for dims in AGREGACOES_CUBO.values() for col in dims if col in df.columns))
+    chaves += [df[col] for col in extras]
+
+    medidas = {COLUNA_NFS: np.ones(len(df), dtype=np.int64)}
+    for col in INDICADORES_CUBO:
+        if col in df.columns:
+            medidas[col] = df[col].to_numpy(dtype=np.int64)
+    for col in SOMAS_CUBO:
+        if col in df.columns:
+            medidas[col] = df[col]
+            medidas[_preenchidos(col)] = df[col].notna().to_numpy(dtype=np.int64)
+    medidas = pd.DataFrame(medidas, index=df.index)
+
+    # Somas e contagens se acumulam: cada agregação sai do cruzamento completo, sem voltar às linhas
+    completo = medidas.groupby(chaves, observed=True, dropna=False, sort=False).sum().reset_index()
+    agregacoes = {}
+    for nome, dims in AGREGACOES_CUBO.items():
+        grupo = dimensoes_filtro + [col for col in dims if col in df.columns]
+        agregacoes[nome] = (
+            completo.groupby(grupo, observed=True, dropna=False, sort=False)[list(medidas.columns)]
+            .sum().reset_index()
+        )
+    return Cubo(agregacoes, frozenset(df.columns), len(df), data_min, data_max)
+
+
+def _periodo_no_cubo(cubo, data_inicio, data_fim):
+    """
+    Meses (códigos) cobertos pelo período, ou None quando o período corta algum mês ao meio.
+    As pontas antes da primeira ou depois da última data da base não cortam nenhum mês.
+    """
+    inicio_alinhado = data_inicio <= cubo.data_min or data_inicio.day == 1
+    fim_alinhado = data_fim >= cubo.data_max or (data_fim + timedelta(days=1)).day == 1
+    if not (inicio_alinhado and fim_alinhado):
+        return None
+    return _codigo_mes(data_inicio), _codigo_mes(data_fim)
+
+
+def _filtra_periodo(cubo, filtro):
+    return filtro.data_inicio is not None and filtro.data_fim is not None and cubo.data_min is not None
+
+
+def cubo_responde(cubo, filtro):
+    """Indica se os filtros podem ser respondidos pelo cubo (seleções nas dimensões de filtro e meses inteiros)"""
+    for col, _ in filtro.selecoes:
+        if col in cubo.colunas and col not in DIMENSOES_FILTRO_CUBO:
+            return False
+    if _filtra_periodo(cubo, filtro):
+        return _periodo_no_cubo(cubo, filtro.data_inicio, filtro.data_fim) is not None
+    return True
+
+
+def fatiar_cubo(cubo, filtro, agregacao='filtros'):
+    """Células de uma agregação que atendem aos filtros (mesma semântica de filtros.construir_mascara)"""
+    celulas = cubo.agregacoes[agregacao]
+    mascara = np.ones(len(celulas), dtype=bool)
+
+    for col, valores in filtro.selecoes:
+        if col not in celulas.columns:
+            continue
+        categorias = celulas[col].cat.categories
+        pertence = np.zeros(len(categorias) + 1, dtype=bool)
+        pertence[categorias.get_indexer([v for v in valores if v in categorias])] = True
+        mascara &= pertence[celulas[col].cat.codes.to_numpy()]
+
+    if _filtra_periodo(cubo, filtro):
+        mes_inicio, mes_fim = _periodo_no_cubo(cubo, filtro.data_inicio, filtro.data_fim)
+        meses = celulas[COLUNA_MES_FATURAMENTO].to_numpy()
+        mascara &= (meses >= mes_inicio) & (meses <= mes_fim)
+
+    return celulas if mascara.all() else celulas[mascara]
+
+
+def _contar(celulas, coluna, medida=COLUNA_NFS):
+    """
+    Equivalente a agregados.contar_valores sobre as linhas: contagem por categoria (na ordem
+    das categorias, antes da ordenação por volume, como no value_counts) sem as categorias zeradas
+    """
+    contagem = celulas.groupby(coluna, observed=False)[medida].sum().rename('count')
+    contagem = contagem.sort_values(ascending=False, kind='stable')
+    return contagem[contagem > 0]
+
+
+def _media(soma, preenchidos):
+    return soma / preenchidos if preenchidos > 0 else 0
+
+
+def agregar_insights_cubo(cubo, filtro):
+    if not all(col in cubo.colunas for col in ['Receita', 'Seq. De Fat', 'Valor NF']):
+        return None
+    celulas = fatiar_cubo(cubo, filtro, 'receita')
+    if celulas[COLUNA_NFS].sum() == 0:
+        return None
+
+    receita = celulas[celulas['Receita'] == 'Sim']
+    registros = int(receita[COLUNA_NFS].sum())
+    if registros == 0:
+        return Insights(registros=0)
+
+    contagem_seq = receita.groupby('Seq. De Fat')[COLUNA_NFS].sum()
+    total_notas = int(contagem_seq.sum())
+    return Insights(
+        registros=registros,
+        seq_1_perc=contagem_seq.get(1, 0) / total_notas * 100 if total_notas > 0 else 0,
+        total_valor=receita['Valor NF'].sum(),
+        total_notas=total_notas,
+    )
+
+
+def agregar_dashboard_cubo(cubo, filtro):
+    celulas = fatiar_cubo(cubo, filtro)
+    colunas = cubo.colunas
+    entregas_no_prazo = int(celulas['No Prazo'].sum()) if 'No Prazo' in colunas else 0
+    total_realizadas = entregas_no_prazo + (int(celulas['Atrasada'].sum()) if 'Atrasada' in colunas else 0)
+
+    def media(col):
+        return _media(celulas[col].sum(), celulas[_preenchidos(col)].sum()) if col in colunas else 0
+
+    return MetricasDashboard(
+        total_nfs=int(celulas[COLUNA_NFS].sum()),
+        entregas_no_prazo=entregas_no_prazo,
+        total_realizadas=total_realizadas,
+        taxa_sla=(entregas_no_prazo / total_realizadas * 100) if total_realizadas > 0 else 0,
+        valor_total=celulas['Valor NF'].sum() if 'Valor NF' in colunas else 0,
+        peso_total=celulas['Peso Bruto NF'].sum() if 'Peso Bruto NF' in colunas else 0,
+        peso_medio=media('Peso Bruto NF'),
+        lead_time_medio=media('Lead Time'),
+    )
+
+
+def agregar_rankings_cubo(cubo, filtro):
+    def contar(col, agregacao='filtros'):
+        return _contar(fatiar_cubo(cubo, filtro, agregacao), col) if col in cubo.colunas else None
+
+    ocorrencias = None
+    if 'Ocorrência' in cubo.colunas:
+        celulas = fatiar_cubo(cubo, filtro, 'ocorrencia')
+        ocorrencias = _contar(celulas[celulas['Ocorrência'].notna() & (celulas['Ocorrência'] != '')], 'Ocorrência')
+
+    transportadores = contar('Transportador')
+    estados = contar('Estado Destino', 'estado')
+    return Rankings(
+        transportadores=transportadores,
+        estados=estados,
+        status=contar('Status'),
+        ocorrencias=ocorrencias,
+        meses=contar('Mês Nota', 'mes_nota'),
+        qtd_transportadores=len(transportadores) if transportadores is not None else 0,
+        qtd_estados=len(estados) if estados is not None else 0,
+    )
+
+
+def agregar_contagem_notas_cubo(cubo, filtro):
+    if not all(col in cubo.colunas for col in ['Receita', 'Seq. De Fat', 'Unid Negoc', 'Valor NF']):
+        return None
+
+    celulas = fatiar_cubo(cubo, filtro, 'receita')
+    receita = celulas[celulas['Receita'] == 'Sim']
+    registros = int(receita[COLUNA_NFS].sum())
+    if registros == 0:
+        return ContagemNotas(registros=0)
+
+    def pivot(medida):
+        return receita.pivot_table(
+            index='Seq. De Fat',
+            columns='Unid Negoc',
+            values=medida,
+            aggfunc='sum',
+            fill_value=0,
+            observed=True,
+            margins=True,
+            margins_name='Total Geral'
+        )
+
+    pivot_contagem = pivot(COLUNA_NFS)
+    pivot_contagem.columns.name = 'Unid Negoc'
+
+    # Percentuais por coluna (BU), como no crosstab com normalize='columns'
+    pivot_percentual = pivot_contagem.drop(index='Total Geral') / pivot_contagem.loc['Total Geral'] * 100
+
+    return ContagemNotas(
+        registros=registros,
+        contagem=pivot_contagem,
+        percentual=pivot_percentual,
+        valor=pivot('Valor NF'),
+    )
+
+
+def agregar_performance_sla_cubo(cubo, filtro):
+    if not all(col in cubo.colunas for col in ['Transportador', 'Data de Entrega', 'Previsão de Entrega']):
+        return None
+
+    # As células guardam as quantidades no prazo / atrasadas nas colunas dos indicadores
+    celulas = fatiar_cubo(cubo, filtro)
+    performance_transp = contar_sla_por_grupo(celulas, 'Transportador')
+    if performance_transp.empty:
+        performance_transp = None
+
+    # Agrupamento de cada tabela de etapas -> agregação do cubo que o contém
+    agregacao_etapas = {'Transportador': 'filtros', 'Estado Destino': 'estado'}
+    tempo_etapas = {}
+    for coluna in AGRUPAMENTOS_ETAPAS:
+        if coluna in cubo.colunas:
+            grupos = fatiar_cubo(cubo, filtro, agregacao_etapas[coluna]).groupby(coluna, observed=True)
+            somas = grupos[COLUNAS_ETAPAS].sum()
+            preenchidos = grupos[[_preenchidos(col) for col in COLUNAS_ETAPAS]].sum().set_axis(COLUNAS_ETAPAS, axis=1)
+            tabela = (somas / preenchidos).where(preenchidos > 0).round(1)
+            tabela['📦 Total NFs'] = grupos[COLUNA_NFS].sum()
+            tempo_etapas[coluna] = tabela.sort_values('Dias Úteis Entrega', ascending=False)
+
+    return PerformanceSla(performance_transp=performance_transp, tempo_etapas=tempo_etapas)
+
+
+def agregar_pendencias_cubo(cubo, filtro):
+    if not all(col in cubo.colunas for col in ['Data de Entrega', 'Previsão de Entrega', 'Transportador']):
+        return None
+
+    celulas = fatiar_cubo(cubo, filtro)
+    celulas = celulas.assign(**{'Pendências': celulas['Pendente'] + celulas['Atrasada']})
+    return Pendencias(
+        sem_data=int(celulas['Pendente'].sum()),
+        atrasadas=int(celulas['Atrasada'].sum()),
+        por_transportador=_contar(celulas, 'Transportador', 'Pendências'),
+    )
+
+
+# Mesmas seções de agregados.AGREGADORES, calculadas sobre as células do cubo
+AGREGADORES_CUBO = {
+    'insights': agregar_insights_cubo,
+    'dashboard': agregar_dashboard_cubo,
+    'rankings': agregar_rankings_cubo,
+    'contagem_notas': agregar_contagem_notas_cubo,
+    'performance_sla': agregar_performance_sla_cubo,
+    'pendencias': agregar_pendencias_cubo,
+}
+
+
+def calcular_agregado_cubo(secao, cubo, filtro):
+    """Calcula o agregado de uma seção a partir das fatias do cubo (use antes `cubo_responde`)"""
+    return AGREGADORES_CUBO[secao](cubo, filtro)
@@ -0,0 +1,111 @@
+"""
+Gerador de bases sintéticas no formato da aba 'Base', para benchmarks e testes de carga.
+
+As distribuições imitam a operação real: poucas transportadoras concentram a
+maior parte do volume, SP/MG/RJ recebem a maioria das notas, a maior parte dos
+pedidos é faturada de uma vez (Seq. De Fat = 1) e as datas seguem a cadeia
+Dt Implant Ped <= Dt Nota Fiscal <= Data de Saída <= Data de Entrega. Notas ainda
+não despachadas ou em trânsito ficam sem as datas seguintes, e o Status é
+coerente com as datas preenchidas.
+"""
+import numpy as np
+import pandas as pd
+
+MESES = [
+    'JANEIRO', 'FEVEREIRO', 'MARÇO', 'ABRIL', 'MAIO', 'JUNHO',
+    'JULHO', 'AGOSTO', 'SETEMBRO', 'OUTUBRO', 'NOVEMBRO', 'DEZEMBRO',
+]
+
+# Participação aproximada de cada UF no volume de notas
+PESOS_ESTADOS = {
+    'SP': 30, 'MG': 11, 'RJ': 9, 'PR': 7, 'RS': 6, 'SC': 5, 'BA': 5, 'GO': 4, 'PE': 3,
+    'DF': 3, 'ES': 2, 'CE': 2, 'MT': 2, 'MS': 2, 'PA': 2, 'AM': 1, 'MA': 1, 'PB': 1,
+    'RN': 1, 'AL': 1, 'PI': 1, 'SE': 0.5, 'RO': 0.5, 'TO': 0.5, 'AC': 0.2, 'AP': 0.2, 'RR': 0.2,
+}
+
+UNIDADES_NEGOCIO = ['BU 010', 'BU 020', 'BU 030', 'BU 040', 'BU 050', 'BU 060']
+
+OCORRENCIAS_ATRASO = ['CLIENTE AUSENTE', 'ENDEREÇO NÃO LOCALIZADO', 'RECUSA DO DESTINATÁRIO', 'AVARIA NA CARGA']
+
+
+def _pesos(valores):
+    valores = np.asarray(valores, dtype=float)
+    return valores / valores.sum()
+
+
+def gerar_base(linhas, semente=0, inicio='2024-01-01', meses=12, transportadoras=40):
+    """
+    Gera `linhas` NFs sintéticas com as colunas da aba 'Base', como lidas da planilha.
+    A mesma semente gera sempre a mesma base.
+    """
+    rng = np.random.default_rng(semente)
+    n = int(linhas)
+    inicio = pd.Timestamp(inicio)
+    dias_periodo = (inicio + pd.DateOffset(months=meses) - inicio).days
+
+    # Transportadoras com volume em lei de potência (poucas concentram a maior parte)
+    nomes_transportadoras = np.array([f"TRANSPORTADORA {i:03d}" for i in range(1, transportadoras + 1)])
+    transportador = rng.choice(nomes_transportadoras, n, p=_pesos(1 / np.arange(1, transportadoras + 1) ** 1.1))
+    estado = rng.choice(list(PESOS_ESTADOS), n, p=_pesos(list(PESOS_ESTADOS.values())))
+    unidade = rng.choice(UNIDADES_NEGOCIO, n, p=_pesos([30, 25, 20, 12, 8, 5]))
+
+    # Cadeia de datas: implantação -> nota fiscal -> saída -> entrega
+    dia = np.timedelta64(1, 'D')
+    implantacao = np.datetime64(inicio.date()) + rng.integers(0, dias_periodo, n) * dia
+    dias_faturamento = rng.geometric(0.45, n) - 1
+    nota_fiscal = implantacao + dias_faturamento * dia
+    saida = nota_fiscal + (rng.geometric(0.6, n) - 1) * dia
+
+    # Lead time em dias úteis a partir da saída; a entrega oscila em torno da previsão
+    lead_time = rng.integers(1, 11, n)
+    previsao = np.busday_offset(saida, lead_time, roll='forward')
+    desvio = np.rint(rng.normal(-1.5, 2.0, n)).astype(np.int64)
+    entrega = np.maximum(np.busday_offset(previsao, desvio, roll='forward'), saida)
+
+    # Situação: entregue (maioria), em trânsito (saiu e não entregou) ou aguardando coleta
+    situacao = rng.choice([0, 1, 2], n, p=[0.82, 0.12, 0.06])
+    horas = rng.integers(8, 19, n) * np.timedelta64(1, 'h')
+    entrega = np.where(situacao == 0, entrega.astype('datetime64[s]') + horas, np.datetime64('NaT'))
+    saida = np.where(situacao == 2, np.datetime64('NaT'), saida.astype('datetime64[s]'))
+    status = np.array(['ENTREGUE', 'EM TRANSITO', 'AGUARDANDO COLETA'])[situacao]
+
+    atrasada = (situacao == 0) & (entrega > previsao.astype('datetime64[s]') + np.timedelta64(1, 'D'))
+    ocorrencia = np.where(situacao == 0, 'ENTREGA REALIZADA NORMALMENTE', '').astype(object)
+    ocorrencia[atrasada] = rng.choice(OCORRENCIAS_ATRASO, int(atrasada.sum()))
+
+    # Romaneio: uma carga por transportadora e dia de saída
+    carga = pd.Series(transportador).astype(str) + '|' + pd.Series(saida).astype(str)
+    romaneio = pd.factorize(carga)[0].astype(float) + 500000
+    romaneio[situacao == 2] = np.nan
+
+    valor = np.round(rng.lognormal(7.5, 1.1, n), 2)
+    peso = np.round(valor / rng.uniform(15, 60, n), 2)
+    mes_nota = np.array(MESES)[pd.DatetimeIndex(nota_fiscal).month - 1]
+
+    return pd.DataFrame({
+        'Numero': rng.permutation(n) + 100000,
+        'Seq. De Fat': np.minimum(rng.geometric(0.7, n), 6),
+        'Nr Romaneio': romaneio,
+        'Status': status,
+        'Transportador': transportador,
+        'Estado Destino': estado,
+        'Unid Negoc': unidade,
+        'Receita': np.where(rng.random(n) < 0.85, 'Sim', 'Não'),
+        'Mês Nota': mes_nota,
+        'Ocorrência': ocorrencia,
+        'Dt Implant Ped': pd.to_datetime(implantacao),
+        'Dt Nota Fiscal': pd.to_datetime(nota_fiscal),
+        'Data de Saída': pd.to_datetime(saida),
+        'Previsão de Entrega': pd.to_datetime(previsao),
+        'Data de Entrega': pd.to_datetime(entrega),
+        'Valor NF': valor,
+        'Peso Bruto NF': peso,
+        'Lead Time': lead_time.astype(float),
+        'Dias Faturamento': dias_faturamento.astype(float),
+    })
+
+
+def gravar_planilha(df, caminho, aba='Base'):
+    """Grava a base sintética como planilha Excel, na aba esperada pelo dashboard"""
+    df.to_excel(caminho, sheet_name=aba, index=False)
+    return caminho
@@ -0,0 +1,224 @@
+"""
+Cálculo vetorizado de dias úteis sobre colunas inteiras, com calendário de
+feriados brasileiros (nacionais e estaduais) configurável.
+
+A contagem é a quantidade de dias úteis no intervalo [início, fim] menos um,
+usando apenas a parte da data. Bases com destinos em várias UFs usam um
+calendário por UF (ver montar_calendarios_por_estado).
+
+GO, MG e SC não têm entradas nas tabelas estaduais por não terem feriado
+estadual em dia útil: GO não tem feriado estadual próprio, a data magna de MG é
+Tiradentes (já nacional) e os feriados de SC (Data Magna e Santa Catarina de
+Alexandria) são comemorados no domingo seguinte.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+FERIADOS_NACIONAIS_FIXOS = [
+    (1, 1, 'Confraternização Universal'),
+    (4, 21, 'Tiradentes'),
+    (5, 1, 'Dia do Trabalho'),
+    (9, 7, 'Independência do Brasil'),
+    (10, 12, 'Nossa Senhora Aparecida'),
+    (11, 2, 'Finados'),
+    (11, 15, 'Proclamação da República'),
+    (12, 25, 'Natal'),
+]
+
+# Feriados nacionais fixos instituídos a partir de um ano: (ano inicial, mês, dia, nome)
+FERIADOS_NACIONAIS_FIXOS_DESDE = [
+    (2024, 11, 20, 'Dia Nacional de Zumbi e da Consciência Negra'),  # Lei 14.759/2023
+]
+
+# Feriados móveis, em dias de distância da Páscoa
+FERIADOS_NACIONAIS_MOVEIS = [
+    (-2, 'Sexta-feira Santa'),
+]
+
+# Pontos facultativos nacionais, normalmente sem expediente no comércio e nas transportadoras
+PONTOS_FACULTATIVOS_MOVEIS = [
+    (-48, 'Carnaval (segunda-feira)'),
+    (-47, 'Carnaval (terça-feira)'),
+    (60, 'Corpus Christi'),
+]
+
+FERIADOS_ESTADUAIS_FIXOS = {
+    'AC': [
+        (1, 23, 'Dia do Evangélico'), (3, 8, 'Dia Internacional da Mulher'), (6, 15, 'Aniversário do Acre'),
+        (9, 5, 'Dia da Amazônia'), (11, 17, 'Assinatura do Tratado de Petrópolis'),
+    ],
+    'AL': [
+        (6, 24, 'São João'), (6, 29, 'São Pedro'), (9, 16, 'Emancipação Política de Alagoas'),
+        (11, 20, 'Dia da Consciência Negra'),
+    ],
+    'AM': [(9, 5, 'Elevação do Amazonas à Categoria de Província')],
+    'AP': [(3, 19, 'São José'), (9, 13, 'Criação do Território do Amapá')],
+    'BA': [(7, 2, 'Independência da Bahia')],
+    'CE': [(3, 19, 'São José'), (3, 25, 'Data Magna do Ceará')],
+    'DF': [(11, 30, 'Dia do Evangélico')],
+    'MA': [(7, 28, 'Adesão do Maranhão à Independência')],
+    'MS': [(10, 11, 'Criação do Estado de Mato Grosso do Sul')],
+    'MT': [(11, 20, 'Dia da Consciência Negra')],
+    'PA': [(8, 15, 'Adesão do Grão-Pará à Independência')],
+    'PB': [(8, 5, 'Fundação do Estado da Paraíba')],
+    'PE': [(3, 6, 'Revolução Pernambucana')],
+    'PI': [(10, 19, 'Dia do Piauí')],
+    'PR': [(12, 19, 'Emancipação Política do Paraná')],
+    'RJ': [(4, 23, 'São Jorge'), (11, 20, 'Dia da Consciência Negra')],
+    'RN': [(10, 3, 'Mártires de Cunhaú e Uruaçu')],
+    'RO': [(1, 4, 'Criação do Estado de Rondônia'), (6, 18, 'Dia do Evangélico')],
+    'RR': [(10, 5, 'Criação do Estado de Roraima')],
+    'RS': [(9, 20, 'Revolução Farroupilha')],
+    'SE': [(7, 8, 'Emancipação Política de Sergipe')],
+    'SP': [(7, 9, 'Revolução Constitucionalista')],
+    'TO': [
+        (3, 18, 'Autonomia do Tocantins'), (9, 8, 'Nossa Senhora da Natividade'),
+        (10, 5, 'Criação do Estado do Tocantins'),
+    ],
+}
+
+# Feriados estaduais móveis, em dias de distância da Páscoa
+FERIADOS_ESTADUAIS_MOVEIS = {
+    'ES': [(8, 'Nossa Senhora da Penha')],
+}
+
+
+def calcular_pascoa(ano):
+    """Calcula o domingo de Páscoa de um ano (algoritmo de Meeus/Jones/Butcher)"""
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return date(ano, mes, dia)
+
+
+def listar_feriados(anos, uf=None, incluir_facultativos=True):
+    """
+    Lista os feriados (data, nome) dos anos informados.
+    `uf` adiciona os feriados estaduais da UF; `incluir_facultativos` inclui Carnaval e Corpus Christi.
+    """
+    moveis = FERIADOS_NACIONAIS_MOVEIS + (PONTOS_FACULTATIVOS_MOVEIS if incluir_facultativos else [])
+    moveis = moveis + FERIADOS_ESTADUAIS_MOVEIS.get(str(uf).upper(), [])
+    fixos = FERIADOS_NACIONAIS_FIXOS + FERIADOS_ESTADUAIS_FIXOS.get(str(uf).upper(), [])
+
+    feriados = []
+    for ano in sorted(set(int(a) for a in anos)):
+        pascoa = calcular_pascoa(ano)
+        feriados.extend((date(ano, mes, dia), nome) for mes, dia, nome in fixos)
+        feriados.extend(
+            (date(ano, mes, dia), nome) for inicio, mes, dia, nome in FERIADOS_NACIONAIS_FIXOS_DESDE if ano >= inicio
+        )
+        feriados.extend((pascoa + timedelta(days=deslocamento), nome) for deslocamento, nome in moveis)
+
+    return sorted(feriados)
+
+
+def montar_calendario(anos=None, uf=None, incluir_facultativos=True, feriados_extras=None):
+    """
+    Monta um calendário de dias úteis (segunda a sexta) para np.busday_count.
+    Sem `anos`, o calendário considera apenas os fins de semana.
+    `feriados_extras` aceita datas adicionais (ex.: feriados municipais).
+    """
+    feriados = [d for d, _ in listar_feriados(anos, uf, incluir_facultativos)] if anos is not None else []
+    if feriados_extras is not None:
+        feriados.extend(pd.to_datetime(list(feriados_extras)).date)
+
+    return np.busdaycalendar(weekmask='1111100', holidays=np.array(feriados, dtype='datetime64[D]'))
+
+
+def _como_datas(valores):
+    """Series de datas (colunas já tipadas como data não são convertidas de novo)"""
+    serie = pd.Series(np.atleast_1d(valores) if np.ndim(valores) == 0 else valores)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    return pd.to_datetime(serie, errors='coerce')
+
+
+def _para_dias(valores):
+    """Converte datas (escalar, lista, array ou Series) para um array datetime64[D]"""
+    return _como_datas(valores).to_numpy().astype('datetime64[D]')
+
+
+def dias_uteis_entre(inicio, fim, calendario=None):
+    """
+    Calcula os dias úteis entre duas colunas de datas em uma única operação vetorizada.
+    Retorna float com NaN onde alguma das datas está ausente; Series com o mesmo índice
+    quando `inicio` é uma Series.
+    """
+    if calendario is None:
+        calendario = montar_calendario()
+
+    dias_inicio = _para_dias(inicio)
+    dias_fim = _para_dias(fim)
+
+    resultado = np.full(dias_inicio.shape, np.nan)
+    validos = ~(np.isnat(dias_inicio) | np.isnat(dias_fim))
+    a = dias_inicio[validos]
+    b = dias_fim[validos]
+
+    contagem = np.busday_count(a, b + np.timedelta64(1, 'D'), busdaycal=calendario) - 1
+    # Intervalo invertido: mesmo resultado de um bdate_range vazio
+    resultado[validos] = np.where(a > b, -1, contagem)
+
+    if isinstance(inicio, pd.Series):
+        return pd.Series(resultado, index=inicio.index)
+    return resultado
+
+
+def anos_das_datas(*colunas):
+    """
+    Anos cobertos pelas colunas de datas, do menor ao maior mais um (prazos somados
+    a datas do fim do ano avançam sobre o ano seguinte)
+    """
+    anos = [ano for ano in (_como_datas(coluna).dt.year.agg(['min', 'max']) for coluna in colunas) if ano.notna().all()]
+    if not anos:
+        return range(0)
+    return range(int(min(ano['min'] for ano in anos)), int(max(ano['max'] for ano in anos)) + 2)
+
+
+def montar_calendarios_por_estado(anos, estados, incluir_facultativos=True):
+    """
+    Monta um calendário (feriados nacionais + estaduais) para cada UF presente em `estados`.
+    A chave None traz apenas os feriados nacionais, usados nas linhas sem UF.
+    """
+    ufs = {str(uf).upper() for uf in pd.Series(estados).dropna().unique()}
+    calendarios = {uf: montar_calendario(anos, uf, incluir_facultativos) for uf in ufs}
+    calendarios[None] = montar_calendario(anos, None, incluir_facultativos)
+    return calendarios
+
+
+def agrupar_por_estado(estados, calendarios):
+    """
+    Gera (posições, calendário) para as linhas de cada UF de `estados`, com o calendário
+    da UF; UF ausente ou sem calendário montado usa o nacional (chave None)
+    """
+    estados = pd.Categorical(pd.Series(estados))
+    for codigo, posicoes in pd.Series(estados.codes).groupby(estados.codes, sort=False).indices.items():
+        uf = None if codigo < 0 else str(estados.categories[codigo]).upper()
+        yield posicoes, calendarios.get(uf, calendarios[None])
+
+
+def dias_uteis_por_estado(inicio, fim, estados, incluir_facultativos=True, calendarios=None):
+    """
+    Calcula dias úteis usando, para cada linha, o calendário nacional + estadual da UF informada.
+    Cada UF é processada de uma vez; sem `calendarios`, eles são montados para os anos presentes na base.
+    """
+    inicio = _como_datas(inicio).reset_index(drop=True)
+    fim = _como_datas(fim).reset_index(drop=True)
+    if calendarios is None:
+        calendarios = montar_calendarios_por_estado(anos_das_datas(inicio, fim), estados, incluir_facultativos)
+
+    resultado = np.full(len(inicio), np.nan)
+    for posicoes, calendario in agrupar_por_estado(estados, calendarios):
+        resultado[posicoes] = dias_uteis_entre(inicio.iloc[posicoes], fim.iloc[posicoes], calendario).to_numpy()
+
+    return resultado
@@ -0,0 +1,133 @@
+"""
+Motor dos filtros globais do sidebar.
+
+Os códigos inteiros das dimensões filtráveis, um bitmap por valor (bits empacotados,
+uma linha por bit), as datas de faturamento (em dias, como int64) e o índice diário
+(indice_diario) são preparados uma única vez por base. As seleções se resolvem por
+OU entre os bitmaps de uma dimensão e E entre dimensões. A cada interação os filtros
+são combinados em uma única máscara booleana, sem copiar a base nem materializar
+um DataFrame intermediário por filtro.
+"""
+import numpy as np
+
+from indice_diario import construir_indice_diario, fatia_periodo
+from nucleos_agregacao import codificar
+
+COLUNAS_FILTRO = ['Unid Negoc', 'Transportador', 'Status']
+COLUNA_DATA_FILTRO = 'Dt Nota Fiscal'
+
+
+def _bitmaps(codigos, n_categorias):
+    """Bitmap empacotado (np.packbits) de cada categoria e o das linhas com valor"""
+    bitmaps = np.stack([np.packbits(codigos == i) for i in range(n_categorias)]) if n_categorias else \
+        np.zeros((0, (len(codigos) + 7) // 8), dtype=np.uint8)
+    return bitmaps, np.packbits(codigos >= 0)
+
+
+def _uniao_bitmaps(dimensao, codigos_selecionados):
+    """
+    OU dos bitmaps selecionados. Com mais da metade das categorias selecionadas, combina
+    o complemento (as não selecionadas) e inverte, restrito às linhas com valor.
+    """
+    bitmaps = dimensao['bitmaps']
+    complemento = 2 * len(codigos_selecionados) > len(bitmaps)
+    if complemento:
+        codigos_selecionados = np.setdiff1d(np.arange(len(bitmaps)), codigos_selecionados)
+
+    uniao = np.zeros(bitmaps.shape[1], dtype=np.uint8)
+    for codigo in codigos_selecionados:
+        uniao |= bitmaps[codigo]
+
+    if complemento:
+        return ~uniao & dimensao['com_valor']
+    return uniao
+
+
+def preparar_filtros(df, colunas=COLUNAS_FILTRO, coluna_data=COLUNA_DATA_FILTRO):
+    """
+    Pré-calcula as estruturas usadas pelos filtros:
+    - por dimensão: códigos de cada linha, bitmaps por categoria, categorias e opções presentes
+      (ordenadas) para o multiselect
+    - datas de faturamento como número de dias (int64), com NaT no menor int64, e o índice diário
+      (indice_diario) que resolve o período por busca binária
+    """
+    dimensoes = {}
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        codigos, categorias = codificar(df[col])
+        categorias = list(categorias)
+        presentes = np.bincount(codigos[codigos >= 0], minlength=len(categorias)) > 0
+        bitmaps, com_valor = _bitmaps(codigos, len(categorias))
+        dimensoes[col] = {
+            'codigos': codigos,
+            'bitmaps': bitmaps,
+            'com_valor': com_valor,
+            'categorias': categorias,
+            'posicao': {categoria: i for i, categoria in enumerate(categorias)},
+            'opcoes': sorted(c for c, presente in zip(categorias, presentes) if presente),
+        }
+
+    dias = indice_diario = None
+    data_min = data_max = None
+    if coluna_data in df.columns and df[coluna_data].notna().any():
+        dias = df[coluna_data].to_numpy().astype('datetime64[D]').view(np.int64)
+        indice_diario = construir_indice_diario(dias, df, dimensoes)
+        data_min = df[coluna_data].min().date()
+        data_max = df[coluna_data].max().date()
+
+    return {
+        'total': len(df),
+        'dimensoes': dimensoes,
+        'dias': dias,
+        'indice_diario': indice_diario,
+        'data_min': data_min,
+        'data_max': data_max,
+    }
+
+
+def construir_mascara(filtros, selecoes=None, data_inicio=None, data_fim=None):
+    """
+    Combina os filtros em uma única máscara booleana.
+    `selecoes` mapeia coluna -> valores selecionados; colunas ausentes ou com None não filtram.
+    O período é inclusivo nas duas pontas; linhas sem data ficam fora quando há período.
+    """
+    # Seleções combinadas sobre os bits empacotados (8 linhas por byte)
+    bits = None
+    for col, valores in (selecoes or {}).items():
+        dimensao = filtros['dimensoes'].get(col)
+        if dimensao is None or valores is None:
+            continue
+
+        codigos_selecionados = np.unique(np.array(
+            [dimensao['posicao'][v] for v in valores if v in dimensao['posicao']], dtype=np.intp))
+        uniao = _uniao_bitmaps(dimensao, codigos_selecionados)
+        bits = uniao if bits is None else bits & uniao
+
+    if bits is None:
+        mascara = np.ones(filtros['total'], dtype=bool)
+    else:
+        mascara = np.unpackbits(bits, count=filtros['total']).view(bool)
+
+    if data_inicio is not None and data_fim is not None and filtros['indice_diario'] is not None:
+        # O período é a fatia [a, b) das linhas ordenadas por data; marca o lado menor
+        indice = filtros['indice_diario']
+        a, b = fatia_periodo(indice, data_inicio, data_fim)
+        ordem = indice['ordem']
+        if 2 * (b - a) < filtros['total']:
+            periodo = np.zeros(filtros['total'], dtype=bool)
+            periodo[ordem[a:b]] = True
+            mascara &= periodo
+        else:
+            mascara[ordem[:a]] = False
+            mascara[ordem[b:]] = False
+            mascara[indice['sem_data']] = False
+
+    return mascara
+
+
+def aplicar_mascara(df, mascara):
+    """Retorna a própria base quando nenhuma linha é removida; caso contrário, uma única seleção"""
+    if mascara.all():
+        return df
+    return df[mascara]
@@ -0,0 +1,370 @@
+"""
+Figuras Plotly do dashboard, montadas a partir dos agregados de cada seção.
+
+Cada gráfico é uma função pura (agregado + opções -> Figure), registrada em
+GRAFICOS. O app memoriza as figuras pela chave do agregado (base + filtros) e
+pelas opções do gráfico, de modo que um gráfico sem mudanças não é remontado
+nem revalidado a cada execução. Gráficos de categorias que podem crescer com a
+base (transportadoras) são limitados às N maiores antes de montar a figura, o
+que mantém pequeno o JSON enviado ao navegador.
+"""
+import pandas as pd
+import plotly.colors as pc
+import plotly.express as px
+import plotly.graph_objects as go
+
+from nucleos_agregacao import maiores
+
+# Máximo de barras no gráfico de performance por transportadora (as de maior volume)
+LIMITE_TRANSPORTADORAS_PERFORMANCE = 30
+
+ORDEM_MESES = ['JANEIRO', 'FEVEREIRO', 'MARÇO', 'ABRIL', 'MAIO', 'JUNHO',
+               'JULHO', 'AGOSTO', 'SETEMBRO', 'OUTUBRO', 'NOVEMBRO', 'DEZEMBRO']
+
+
+def ordenar_meses(data_series):
+    """Ordena uma série de dados por meses na ordem cronológica correta"""
+    meses_presentes = [mes for mes in ORDEM_MESES if mes in data_series.index]
+    return data_series.reindex(meses_presentes)
+
+
+def ajustar_posicao_texto(valores, threshold_percent=5):
+    """
+    Determina a posição e cor do texto baseado no tamanho dos valores.
+    Valores pequenos (< threshold_percent do máximo) ficam fora da barra em preto.
+    """
+    max_valor = max(valores) if valores else 1
+    threshold = max_valor * (threshold_percent / 100)
+
+    posicoes = []
+    cores = []
+
+    for valor in valores:
+        if valor < threshold:
+            posicoes.append('outside')
+            cores.append('black')
+        else:
+            posicoes.append('inside')
+            cores.append('white')
+
+    return posicoes, cores
+
+
+def limitar_categorias(serie, limite, rotulo_outros=None):
+    """
+    Mantém as `limite` categorias de maior valor (na ordem da série, se já ordenada).
+    Com `rotulo_outros`, as demais são somadas em uma única barra com esse rótulo.
+    """
+    if limite is None or len(serie) <= limite:
+        return serie
+    principais = serie.iloc[maiores(serie.to_numpy(), limite)] if not serie.is_monotonic_decreasing else serie.iloc[:limite]
+    if rotulo_outros is None:
+        return principais
+    outros = pd.Series([serie.drop(principais.index).sum()], index=[rotulo_outros])
+    return pd.concat([principais, outros])
+
+
+def classificar_sla(taxa_sla):
+    """Faixa de performance da taxa de SLA: (status, cor, emoji)"""
+    if taxa_sla >= 95:
+        return "EXCELENTE", "green", "🟢"
+    if taxa_sla >= 85:
+        return "BOM", "orange", "🟡"
+    if taxa_sla >= 70:
+        return "ATENÇÃO", "orange", "🟠"
+    return "CRÍTICO", "red", "🔴"
+
+
+def grafico_gauge_sla(taxa_sla):
+    """Gauge da taxa de SLA com a meta de 95% e o status da performance"""
+    fig_sla = go.Figure(go.Indicator(
+        mode = "gauge+number+delta",
+        value = taxa_sla,
+        domain = {'x': [0, 1], 'y': [0, 1]},
+        title = {'text': "🎯 Taxa de SLA (%)"},
+        delta = {'reference': 95},
+        gauge = {
+            'axis': {'range': [None, 100]},
+            'bar': {'color': "darkblue"},
+            'steps': [
+                {'range': [0, 50], 'color': "lightgray"},
+                {'range': [50, 85], 'color': "yellow"},
+                {'range': [85, 95], 'color': "orange"},
+                {'range': [95, 100], 'color': "green"}
+            ],
+            'threshold': {
+                'line': {'color': "red", 'width': 4},
+                'thickness': 0.75,
+                'value': 95
+            }
+        }
+    ))
+
+    entregas_atrasadas = 100 - taxa_sla
+    status, cor_status, emoji_status = classificar_sla(taxa_sla)
+
+    fig_sla.add_annotation(
+        x=0.5, y=0.15,
+        text=f"{emoji_status} Status: <b>{status}</b>",
+        showarrow=False,
+        font=dict(size=14, color=cor_status),
+        bgcolor="rgba(255,255,255,0.8)",
+        bordercolor=cor_status,
+        borderwidth=2
+    )
+
+    fig_sla.add_annotation(
+        x=0.5, y=0.05,
+        text=f"📊 {entregas_atrasadas:.1f}% das entregas estão atrasadas",
+        showarrow=False,
+        font=dict(size=11, color="darkred"),
+        bgcolor="rgba(255,255,255,0.8)"
+    )
+
+    fig_sla.update_layout(
+        height=350,
+        annotations=[
+            dict(
+                x=0.5, y=-0.1,
+                text="Meta: 95% | Crítico: <50% | Atenção: 50-85% | Bom: 85-95% | Excelente: ≥95%",
+                showarrow=False,
+                font=dict(size=10, color="gray"),
+                xref="paper", yref="paper"
+            )
+        ]
+    )
+    return fig_sla
+
+
+def grafico_ranking(contagem, total_nfs, top_n, titulo, eixo_x, unidade, cores):
+    """Barras horizontais do ranking por volume, com o percentual de cada barra sobre o total de NFs"""
+    contagem = limitar_categorias(contagem, top_n)
+    percentuais = (contagem.values / total_nfs * 100).round(1)
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=contagem.values,
+        y=contagem.index,
+        orientation='h',
+        text=[f'{val:,} ({pct}%)'.replace(',', '.') for val, pct in zip(contagem.values, percentuais)],
+        textposition='inside',
+        textfont=dict(color='white', size=10, family='Arial Black'),
+        marker=dict(
+            color=list(cores[:len(contagem)]),
+            line=dict(color='rgba(50,50,50,0.8)', width=1)
+        ),
+        hovertemplate='<b>%{y}</b><br>' +
+                      f'Volume: %{{x:,}} {unidade}<br>' +
+                      'Percentual: %{text}<br>' +
+                      '<extra></extra>'
+    ))
+
+    fig.update_layout(
+        title=dict(
+            text=titulo,
+            x=0.5,
+            font=dict(size=14, family="Arial Black")
+        ),
+        xaxis_title=eixo_x,
+        yaxis_title="",
+        height=500,
+        showlegend=False,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGray'),
+        yaxis=dict(showgrid=False),
+        margin=dict(l=20, r=20, t=60, b=20)
+    )
+    return fig
+
+
+def grafico_status(status_counts):
+    """Quantidade por status, com cores do gradiente Viridis e texto dentro ou fora da barra"""
+    posicoes, cores_texto = ajustar_posicao_texto(status_counts.values.tolist())
+
+    viridis_colors = pc.sequential.Viridis
+    min_val = min(status_counts.values)
+    max_val = max(status_counts.values)
+    range_val = max_val - min_val if max_val != min_val else 1
+    norm_values = [(v - min_val) / range_val for v in status_counts.values]
+    bar_colors = [viridis_colors[int(norm * (len(viridis_colors) - 1))] for norm in norm_values]
+
+    fig_status = go.Figure()
+    fig_status.add_trace(go.Bar(
+        x=status_counts.index,
+        y=status_counts.values,
+        text=[str(v) for v in status_counts.values],
+        textposition=posicoes,
+        textfont=dict(color=cores_texto, size=12, family='Arial Black'),
+        marker_color=bar_colors,
+        hovertemplate='<b>%{x}</b><br>Quantidade: %{y}<extra></extra>'
+    ))
+
+    fig_status.update_layout(
+        title="Quantidade por Status",
+        xaxis_title="Status",
+        yaxis_title="Quantidade",
+        height=400,
+        showlegend=False
+    )
+    return fig_status
+
+
+def _aplicar_posicoes_texto(fig, posicoes, cores_texto, hovertemplate):
+    """Texto das barras: posição única quando todas coincidem, 'auto' em preto quando mistas"""
+    if len(set(posicoes)) == 1:
+        fig.update_traces(
+            textposition=posicoes[0],
+            textfont=dict(color=cores_texto[0], size=11, family='Arial Black'),
+            hovertemplate=hovertemplate
+        )
+    else:
+        fig.update_traces(
+            textposition='auto',
+            textfont=dict(color='black', size=11, family='Arial Black'),
+            hovertemplate=hovertemplate
+        )
+
+
+def grafico_ocorrencias(ocorrencias, top_n):
+    """Principais ocorrências (rótulos longos abreviados em 30 caracteres)"""
+    top_ocorrencias = limitar_categorias(ocorrencias, top_n)
+    posicoes, cores_texto = ajustar_posicao_texto(top_ocorrencias.values.tolist())
+
+    df_ocorr = pd.DataFrame({
+        'Ocorrência': [str(x)[:30] + "..." if len(str(x)) > 30 else str(x) for x in top_ocorrencias.index],
+        'Quantidade': top_ocorrencias.values
+    })
+
+    fig_ocorr = px.bar(
+        df_ocorr,
+        x='Quantidade',
+        y='Ocorrência',
+        orientation='h',
+        title="Principais Ocorrências",
+        labels={'Quantidade': 'Quantidade', 'Ocorrência': 'Ocorrência'},
+        color='Quantidade',
+        color_continuous_scale='Reds',
+        text='Quantidade'
+    )
+    fig_ocorr.update_layout(height=400, showlegend=False, coloraxis_showscale=False)
+    _aplicar_posicoes_texto(fig_ocorr, posicoes, cores_texto, '<b>%{y}</b><br>Quantidade: %{x}<extra></extra>')
+    return fig_ocorr
+
+
+def grafico_mensal(mensal):
+    """Volume de NFs por mês, em ordem cronológica"""
+    mensal_ordenado = ordenar_meses(mensal)
+    posicoes, cores_texto = ajustar_posicao_texto(mensal_ordenado.values.tolist())
+
+    df_mensal = pd.DataFrame({
+        'Mês': mensal_ordenado.index,
+        'Quantidade': mensal_ordenado.values
+    })
+
+    fig_mensal = px.bar(
+        df_mensal,
+        x='Mês',
+        y='Quantidade',
+        title="Volume Total de NFs por Mês",
+        labels={'Mês': 'Mês', 'Quantidade': 'Quantidade de NFs'},
+        color='Quantidade',
+        color_continuous_scale='Blues',
+        text='Quantidade'
+    )
+    fig_mensal.update_layout(height=300, showlegend=False, coloraxis_showscale=False)
+    _aplicar_posicoes_texto(fig_mensal, posicoes, cores_texto, '<b>%{x}</b><br>Volume: %{y} NFs<extra></extra>')
+    return fig_mensal
+
+
+def grafico_volume(contagem, top_n, dimensao, titulo):
+    """Barras horizontais simples de volume de entregas por `dimensao` (Volumetria)"""
+    contagem = limitar_categorias(contagem, top_n)
+    df_volume = pd.DataFrame({
+        dimensao: contagem.index,
+        'Quantidade': contagem.values
+    })
+    fig = px.bar(
+        df_volume,
+        x='Quantidade',
+        y=dimensao,
+        orientation='h',
+        title=titulo,
+        labels={'Quantidade': 'Quantidade de Entregas', dimensao: dimensao}
+    )
+    fig.update_layout(height=500)
+    return fig
+
+
+def grafico_performance(performance_transp, minimo_entregas, top_n=LIMITE_TRANSPORTADORAS_PERFORMANCE):
+    """
+    % SLA por transportadora com ao menos `minimo_entregas` entregas, do pior para o melhor.
+    Com muitas transportadoras, exibe apenas as `top_n` de maior volume.
+    """
+    relevantes = performance_transp[performance_transp['Total'] >= minimo_entregas]
+    if top_n is not None and len(relevantes) > top_n:
+        relevantes = relevantes.iloc[maiores(relevantes['Total'].to_numpy(), top_n)]
+    transp_ordenada = relevantes.sort_values('% SLA', ascending=True)
+
+    df_performance = pd.DataFrame({
+        'Transportadora': transp_ordenada.index,
+        '% SLA': transp_ordenada['% SLA']
+    })
+
+    fig = px.bar(
+        df_performance,
+        x='% SLA',
+        y='Transportadora',
+        orientation='h',
+        title="🎯 Performance SLA por Transportadora",
+        labels={'% SLA': '% SLA Atingido', 'Transportadora': 'Transportadora'},
+        color='% SLA',
+        color_continuous_scale='RdYlGn'
+    )
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>% SLA Atingido: %{x:.1f}%<extra></extra>'
+    )
+    fig.update_layout(height=500, showlegend=False, coloraxis_showscale=False)
+    return fig
+
+
+def grafico_pendencias(por_transportador, top_n):
+    """Notas pendentes por transportadora"""
+    pendentes_transp = limitar_categorias(por_transportador, top_n)
+    df_pendentes = pd.DataFrame({
+        'Transportadora': pendentes_transp.index,
+        'Quantidade': pendentes_transp.values
+    })
+
+    fig = px.bar(
+        df_pendentes,
+        x='Quantidade',
+        y='Transportadora',
+        orientation='h',
+        title="🚚 Notas Pendentes por Transportadora",
+        labels={'Quantidade': 'Quantidade', 'Transportadora': 'Transportadora'},
+        color='Quantidade',
+        color_continuous_scale='Reds'
+    )
+    fig.update_traces(
+        hovertemplate='<b>%{y}</b><br>Notas Pendentes: %{x}<extra></extra>'
+    )
+    fig.update_layout(height=500, showlegend=False, coloraxis_showscale=False)
+    return fig
+
+
+GRAFICOS = {
+    'gauge_sla': grafico_gauge_sla,
+    'ranking': grafico_ranking,
+    'status': grafico_status,
+    'ocorrencias': grafico_ocorrencias,
+    'mensal': grafico_mensal,
+    'volume': grafico_volume,
+    'performance': grafico_performance,
+    'pendencias': grafico_pendencias,
+}
+
+
+def construir_grafico(nome, dados, **opcoes):
+    """Monta a figura `nome` de GRAFICOS a partir do agregado `dados` e das opções do gráfico"""
+    return GRAFICOS[nome](dados, **opcoes)
@@ -0,0 +1,262 @@
+"""
+Histórico local das bases mensais, em armazenamento colunar somente de inclusão.
+
+Cada arquivo enviado é incorporado uma única vez (identificado pelo hash do
+conteúdo) e grava uma nova parte em Parquet com as suas NFs (Numero + Seq. De Fat).
+Uma NF que já estava no histórico é gravada de novo: vale a versão do arquivo
+incorporado por último (ex.: uma NF pendente que foi entregue no mês seguinte), e
+a leitura descarta as versões anteriores. As análises leem todas as partes, sem
+interpretar novamente as planilhas já incorporadas.
+
+As colunas categóricas usam um dicionário de códigos único para todo o histórico,
+guardado no manifesto: valores novos recebem o próximo código e os existentes
+nunca mudam de código, de modo que as partes são unidas direto pelos códigos.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+from cache_colunar import (DIRETORIO_CACHE, calcular_hash_arquivo, categorias_mistas, categorias_para_texto,
+                           gravar_parquet_atomico, tipar_para_parquet)
+from ingestao import ESQUEMA_BASE, aplicar_esquema
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+# Diretório do histórico (pode ser alterado pela variável de ambiente SLA_HISTORICO_DIR)
+DIRETORIO_HISTORICO = Path(os.environ.get('SLA_HISTORICO_DIR', DIRETORIO_CACHE / 'historico'))
+
+# Colunas que identificam uma NF no histórico
+CHAVE_DEDUPLICACAO = ['Numero', 'Seq. De Fat']
+
+ARQUIVO_MANIFESTO = '_manifesto.json'
+
+# Trava das incorporações (leitura do manifesto, gravação da parte e do manifesto)
+ARQUIVO_TRAVA = '_manifesto.lock'
+
+_SEPARADOR_CHAVE = '\x1f'
+
+
+COLUNAS_CATEGORICAS = [col for col, tipo in ESQUEMA_BASE.items() if tipo == 'categoria']
+
+
+def ler_manifesto(diretorio=DIRETORIO_HISTORICO):
+    """
+    Retorna o manifesto do histórico: lista dos arquivos incorporados, na ordem de inclusão,
+    e os dicionários de categorias (coluna -> valores, na ordem dos códigos)
+    """
+    caminho = Path(diretorio) / ARQUIVO_MANIFESTO
+    if not caminho.exists():
+        return {'arquivos': [], 'dicionarios': {}}
+    with open(caminho, encoding='utf-8') as f:
+        manifesto = json.load(f)
+
+    if 'dicionarios' not in manifesto:
+        # Histórico gravado antes dos dicionários: montar a partir das categorias das partes
+        manifesto['dicionarios'] = {}
+        for parte in _partes(manifesto, diretorio):
+            df = pd.read_parquet(parte)
+            for col in COLUNAS_CATEGORICAS:
+                if col in df.columns:
+                    _estender_dicionario(manifesto['dicionarios'], col, df[col])
+    return manifesto
+
+
+def _gravar_manifesto(manifesto, diretorio):
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)"""
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+
+    fd, caminho_tmp = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, diretorio / ARQUIVO_MANIFESTO)
+
+
+@contextmanager
+def _trava_historico(diretorio):
+    """Trava exclusiva do histórico entre processos (flock em um arquivo do diretório)"""
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    with open(diretorio / ARQUIVO_TRAVA, 'a') as trava:
+        if fcntl is not None:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def calcular_hash_historico(manifesto):
+    """Identificador do conteúdo do histórico: muda sempre que um arquivo é incorporado"""
+    hashes = [arquivo['hash'] for arquivo in manifesto['arquivos']]
+    return hashlib.sha256('\n'.join(hashes).encode()).hexdigest()
+
+
+def _chaves(df, colunas):
+    """Chave textual Numero + Seq. De Fat de cada linha"""
+    chave = df[colunas[0]].astype('string').fillna('')
+    for col in colunas[1:]:
+        chave = chave + _SEPARADOR_CHAVE + df[col].astype('string').fillna('')
+    return chave
+
+
+def _estender_dicionario(dicionarios, coluna, serie):
+    """
+    Acrescenta ao fim do dicionário da coluna os valores ainda sem código (em ordem alfabética).
+    Se números e textos se misturarem, o dicionário passa a guardar textos (os códigos não mudam),
+    como as categorias gravadas por tipar_para_parquet.
+    """
+    dicionario = dicionarios.setdefault(coluna, [])
+    # Escalares numpy viram tipos Python para o dicionário poder ser gravado em JSON
+    valores = [valor.item() if hasattr(valor, 'item') else valor for valor in serie.dropna().unique()]
+    if categorias_mistas(pd.Index(dicionario + valores, dtype=object)):
+        dicionario[:] = [str(valor) for valor in dicionario]
+        valores = [str(valor) for valor in valores]
+    conhecidos = set(dicionario)
+    novos = {valor for valor in valores if valor not in conhecidos}
+    dicionario.extend(sorted(novos, key=str))
+    return dicionario
+
+
+def _dicionario_de_texto(dicionario):
+    """Indica se o dicionário guarda apenas textos"""
+    return pd.api.types.infer_dtype(pd.Index(dicionario, dtype=object), skipna=True) == 'string'
+
+
+def codificar_categorias(df, dicionarios):
+    """Converte as colunas categóricas para os dicionários do histórico (códigos estáveis)"""
+    for col, dicionario in dicionarios.items():
+        tipo = CategoricalDtype(dicionario)
+        if col not in df.columns:
+            df[col] = pd.Series(pd.Categorical([None] * len(df), dtype=tipo), index=df.index)
+            continue
+        serie = df[col]
+        valores = serie.cat.categories if isinstance(serie.dtype, CategoricalDtype) else serie
+        # Dicionário convertido para texto (ver _estender_dicionario): partes antigas com números também
+        if dicionario and _dicionario_de_texto(dicionario) and \
+                pd.api.types.infer_dtype(valores, skipna=True) not in ('string', 'empty'):
+            serie = categorias_para_texto(serie)
+        if isinstance(serie.dtype, CategoricalDtype):
+            df[col] = serie.cat.set_categories(dicionario)
+        else:
+            df[col] = serie.astype(tipo)
+    return df
+
+
+def versoes_substituidas(manifesto):
+    """Quantidade de NFs gravadas de novo por arquivos posteriores (versões antigas a descartar na leitura)"""
+    return sum(arquivo.get('linhas_atualizadas', 0) for arquivo in manifesto['arquivos'])
+
+
+def _incorporado(manifesto, hash_arquivo):
+    """Indica se um arquivo com este hash já está no histórico"""
+    return any(registro['hash'] == hash_arquivo for registro in manifesto['arquivos'])
+
+
+def _partes(manifesto, diretorio):
+    """Caminhos das partes Parquet do histórico, na ordem de inclusão"""
+    return [Path(diretorio) / arquivo['parte'] for arquivo in manifesto['arquivos'] if arquivo['parte']]
+
+
+def incorporar_arquivo(arquivo, leitor, nome=None, diretorio=DIRETORIO_HISTORICO):
+    """
+    Incorpora um arquivo ao histórico.
+    Arquivos já incorporados (mesmo conteúdo) são ignorados sem serem lidos e retornam None.
+    Caso contrário, `leitor(arquivo)` interpreta a planilha e as suas NFs são gravadas em
+    uma nova parte; as que já estavam no histórico substituem a versão anterior (ver ler_historico).
+    Retorna a entrada registrada no manifesto.
+    """
+    diretorio = Path(diretorio)
+    hash_arquivo = calcular_hash_arquivo(arquivo)
+    if _incorporado(ler_manifesto(diretorio), hash_arquivo):
+        return None
+
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    df = leitor(arquivo)
+    linhas_lidas = len(df)
+
+    # A planilha é lida fora da trava; o manifesto é relido dentro dela, para que duas
+    # incorporações simultâneas não gravem a mesma parte nem percam a entrada uma da outra
+    with _trava_historico(diretorio):
+        manifesto = ler_manifesto(diretorio)
+        if _incorporado(manifesto, hash_arquivo):
+            return None
+
+        # Apenas as colunas de chave das partes existentes são lidas, para contar as NFs atualizadas
+        colunas_chave = [col for col in CHAVE_DEDUPLICACAO if col in df.columns]
+        atualizadas = 0
+        if colunas_chave:
+            # Dentro do arquivo, também vale a última linha de cada NF
+            chaves = _chaves(df, colunas_chave)
+            ultimas = ~chaves.duplicated(keep='last')
+            df, chaves = df[ultimas.to_numpy()], chaves[ultimas]
+            existentes = pd.Series(False, index=chaves.index)
+            for parte in _partes(manifesto, diretorio):
+                existentes |= chaves.isin(_chaves(pd.read_parquet(parte, columns=colunas_chave), colunas_chave))
+            atualizadas = int(existentes.sum())
+
+        nome_parte = None
+        if not df.empty:
+            for col in COLUNAS_CATEGORICAS:
+                if col in df.columns:
+                    _estender_dicionario(manifesto['dicionarios'], col, df[col])
+            df = codificar_categorias(df.copy(), {col: manifesto['dicionarios'][col] for col in COLUNAS_CATEGORICAS if col in df.columns})
+            nome_parte = f"parte_{len(manifesto['arquivos']):05d}_{hash_arquivo[:12]}.parquet"
+            gravar_parquet_atomico(tipar_para_parquet(df), diretorio / nome_parte)
+
+        registro = {
+            'hash': hash_arquivo,
+            'nome': nome or getattr(arquivo, 'name', str(arquivo)),
+            'linhas_lidas': linhas_lidas,
+            'linhas_novas': len(df) - atualizadas,
+            'linhas_atualizadas': atualizadas,
+            'parte': nome_parte,
+            'incluido_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        manifesto['arquivos'].append(registro)
+        _gravar_manifesto(manifesto, diretorio)
+    return registro
+
+
+def ler_historico(diretorio=DIRETORIO_HISTORICO, esquema=ESQUEMA_BASE):
+    """
+    Lê todas as partes do histórico com memory-map. As colunas categóricas de todas as
+    partes recebem o dicionário completo do histórico (os códigos não mudam) e são unidas
+    sem voltar a texto; as demais colunas seguem o esquema de tipos. Cada NF aparece uma
+    única vez, na versão da parte mais recente.
+    Retorna None se o histórico estiver vazio. O identificador do histórico fica em `df.attrs['hash_arquivo']`.
+    """
+    manifesto = ler_manifesto(diretorio)
+    partes = _partes(manifesto, diretorio)
+    if not partes:
+        return None
+
+    dicionarios = manifesto['dicionarios']
+    df = pd.concat(
+        [codificar_categorias(pd.read_parquet(parte, memory_map=True), dicionarios) for parte in partes],
+        ignore_index=True
+    )
+    df = aplicar_esquema(df, {col: tipo for col, tipo in esquema.items() if col not in dicionarios})
+    if versoes_substituidas(manifesto):
+        colunas_chave = [col for col in CHAVE_DEDUPLICACAO if col in df.columns]
+        df = df[~df.duplicated(subset=colunas_chave, keep='last').to_numpy()].reset_index(drop=True)
+    df.attrs['hash_arquivo'] = calcular_hash_historico(manifesto)
+    return df
+
+
+def limpar_historico(diretorio=DIRETORIO_HISTORICO):
+    """Remove todas as partes e o manifesto do histórico"""
+    shutil.rmtree(diretorio, ignore_errors=True)
@@ -0,0 +1,99 @@
+"""
+Índice diário da data de faturamento, com somas acumuladas por dia.
+
+As linhas com data são ordenadas pelo dia de faturamento (ordenação estável) e,
+para cada dia presente, guardam-se a posição da primeira linha do dia e os
+acumulados até o dia anterior: quantidade de NFs, Valor NF, Peso Bruto NF e a
+contagem por valor das dimensões de filtro. Um período vira duas buscas binárias
+nos dias; os totais do período saem da diferença entre dois acumulados (O(1)) e
+as linhas do período formam uma fatia contígua da ordenação. Linhas sem data
+ficam fora da ordenação (em `sem_data`).
+"""
+import numpy as np
+
+# Valor usado para NaT nas datas em dias (menor int64)
+DIA_VAZIO = np.iinfo(np.int64).min
+
+# Colunas somadas por dia
+SOMAS_DIARIAS = ['Valor NF', 'Peso Bruto NF']
+
+
+def _acumular(valores_por_dia):
+    """Acumulado com um zero à frente: acumulado[i] = soma dos dias anteriores ao dia i"""
+    zeros = np.zeros((1,) + valores_por_dia.shape[1:], dtype=valores_por_dia.dtype)
+    return np.concatenate([zeros, np.cumsum(valores_por_dia, axis=0)])
+
+
+def construir_indice_diario(dias, df=None, dimensoes=None):
+    """
+    Monta o índice a partir das datas em dias (int64, NaT = DIA_VAZIO).
+    `df` fornece as colunas de SOMAS_DIARIAS; `dimensoes` (de filtros.preparar_filtros), os códigos
+    das dimensões contadas por dia.
+    """
+    ordem = np.argsort(dias, kind='stable')
+    # NaT (menor int64) fica no começo da ordenação
+    sem_data, ordem = np.split(ordem, [np.count_nonzero(dias == DIA_VAZIO)])
+    dias_ordenados = dias[ordem]
+    dias_presentes, primeira_linha = np.unique(dias_ordenados, return_index=True)
+    limites = np.append(primeira_linha, len(ordem))
+
+    somas = {}
+    for col in SOMAS_DIARIAS:
+        if df is not None and col in df.columns:
+            valores = np.nan_to_num(df[col].to_numpy(dtype=np.float64)[ordem])
+            somas[col] = _acumular(np.add.reduceat(valores, primeira_linha) if len(valores) else valores)
+
+    contagens = {}
+    dia_da_linha = np.repeat(np.arange(len(dias_presentes)), np.diff(limites))
+    for col, dimensao in (dimensoes or {}).items():
+        codigos = dimensao['codigos'][ordem]
+        validos = codigos >= 0
+        n_categorias = len(dimensao['categorias'])
+        tabela = np.bincount(dia_da_linha[validos] * n_categorias + codigos[validos],
+                             minlength=len(dias_presentes) * n_categorias)
+        contagens[col] = _acumular(tabela.reshape(len(dias_presentes), n_categorias))
+
+    return {
+        'ordem': ordem,
+        'sem_data': sem_data,
+        'dias': dias_presentes,
+        'limites': limites,
+        'somas': somas,
+        'contagens': contagens,
+    }
+
+
+def _dias_do_periodo(indice, data_inicio, data_fim):
+    """Posições (dia inicial, dia final exclusivo) do período nos dias presentes"""
+    inicio = np.datetime64(data_inicio, 'D').astype(np.int64)
+    fim = np.datetime64(data_fim, 'D').astype(np.int64)
+    return (int(np.searchsorted(indice['dias'], inicio, side='left')),
+            int(np.searchsorted(indice['dias'], fim, side='right')))
+
+
+def fatia_periodo(indice, data_inicio, data_fim):
+    """Intervalo [a, b) de `indice['ordem']` com as linhas do período (inclusivo nas duas pontas)"""
+    primeiro, ultimo = _dias_do_periodo(indice, data_inicio, data_fim)
+    ultimo = max(primeiro, ultimo)
+    return int(indice['limites'][primeiro]), int(indice['limites'][ultimo])
+
+
+def linhas_periodo(indice, data_inicio, data_fim):
+    """Posições das linhas do período, em ordem de data de faturamento"""
+    a, b = fatia_periodo(indice, data_inicio, data_fim)
+    return indice['ordem'][a:b]
+
+
+def totais_periodo(indice, data_inicio, data_fim):
+    """
+    Totais do período em O(1): quantidade de NFs, somas diárias e contagem por valor
+    de cada dimensão (arrays na ordem das categorias)
+    """
+    primeiro, ultimo = _dias_do_periodo(indice, data_inicio, data_fim)
+    ultimo = max(primeiro, ultimo)
+    a, b = indice['limites'][primeiro], indice['limites'][ultimo]
+    return {
+        'registros': int(b - a),
+        'somas': {col: float(acumulado[ultimo] - acumulado[primeiro]) for col, acumulado in indice['somas'].items()},
+        'contagens': {col: acumulado[ultimo] - acumulado[primeiro] for col, acumulado in indice['contagens'].items()},
+    }
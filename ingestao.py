@@ -0,0 +1,353 @@
+"""
+Leitura da aba 'Base' com projeção de colunas e esquema de tipos declarado.
+
+Apenas as colunas usadas pelo dashboard são lidas. Cada coluna recebe um tipo
+explícito: datas convertidas uma única vez, dimensões como `category`, valores
+monetários e pesos como float. Quando o pacote `python-calamine` está instalado,
+a planilha é lida pelo leitor calamine; caso contrário, pelo openpyxl em modo
+somente leitura.
+
+Planilhas grandes (acima de LIMITE_LEITURA_DIRETA) são lidas em fluxo: as linhas
+são percorridas em blocos pelo openpyxl em modo somente leitura e cada bloco é
+tipado e acrescentado a um único arquivo Parquet temporário. As dimensões são
+gravadas como códigos estáveis de um dicionário montado ao longo da leitura,
+o que mantém o esquema igual em todos os blocos, mesmo com categorias de tipos
+mistos. Durante a leitura, só o bloco atual fica em memória, em vez da
+planilha inteira mais as células do openpyxl.
+"""
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.io.parsers import TextParser
+
+# Tipos possíveis: 'data', 'categoria', 'numero' (float), 'inteiro' (Int64) e 'texto'
+ESQUEMA_BASE = {
+    'Numero': 'texto',
+    'Seq. De Fat': 'inteiro',
+    'Nr Romaneio': 'texto',
+    'Status': 'categoria',
+    'Transportador': 'categoria',
+    'Estado Destino': 'categoria',
+    'Unid Negoc': 'categoria',
+    'Receita': 'categoria',
+    'Mês Nota': 'categoria',
+    'Ocorrência': 'categoria',
+    'Dt Implant Ped': 'data',
+    'Dt Nota Fiscal': 'data',
+    'Data de Saída': 'data',
+    'Previsão de Entrega': 'data',
+    'Data de Entrega': 'data',
+    'Valor NF': 'numero',
+    'Peso Bruto NF': 'numero',
+    'Lead Time': 'numero',
+    'Dias Faturamento': 'numero',
+}
+
+# Acima deste tamanho (bytes do XLSX) a planilha é lida em blocos
+LIMITE_LEITURA_DIRETA = 20 * 1024 ** 2
+
+# Linhas da planilha por bloco na leitura em fluxo
+LINHAS_POR_BLOCO = 50_000
+
+
+def engine_disponivel():
+    """
+    Retorna o engine de leitura mais rápido disponível no ambiente.
+    None deixa o pandas escolher pelo formato do arquivo (openpyxl, em modo read_only, para .xlsx).
+    """
+    versao_pandas = tuple(int(p) for p in pd.__version__.split('.')[:2])
+    if versao_pandas >= (2, 2) and importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None
+
+
+def _para_texto(serie):
+    """Converte identificadores (NF, romaneio) para texto, sem o sufixo '.0' de números inteiros"""
+    if pd.api.types.is_float_dtype(serie) and (serie.dropna() % 1 == 0).all():
+        serie = serie.astype('Int64')
+    return serie.astype('string')
+
+
+def _para_inteiro(serie):
+    """Converte para inteiro com suporte a nulos; mantém float se houver valores fracionários"""
+    numeros = pd.to_numeric(serie, errors='coerce')
+    try:
+        return numeros.astype('Int64')
+    except (TypeError, ValueError):
+        return numeros
+
+
+def aplicar_esquema(df, esquema=ESQUEMA_BASE):
+    """
+    Aplica os tipos declarados no esquema às colunas presentes no DataFrame.
+    Colunas do esquema que não existem no arquivo são ignoradas.
+    """
+    df = df.copy()
+
+    for col, tipo in esquema.items():
+        if col not in df.columns:
+            continue
+
+        if tipo == 'data':
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif tipo == 'numero':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif tipo == 'inteiro':
+            df[col] = _para_inteiro(df[col])
+        elif tipo == 'categoria':
+            df[col] = df[col].astype('category')
+        elif tipo == 'texto':
+            df[col] = _para_texto(df[col])
+
+    return df
+
+
+def ler_planilha_base(arquivo, aba='Base', esquema=ESQUEMA_BASE, engine=None):
+    """
+    Lê a aba da planilha carregando apenas as colunas do esquema, já tipadas.
+    `engine` permite forçar o leitor ('calamine', 'openpyxl'); por padrão usa o mais rápido disponível.
+    """
+    if engine is None:
+        engine = engine_disponivel()
+
+    df = pd.read_excel(
+        arquivo,
+        sheet_name=aba,
+        engine=engine,
+        usecols=lambda col: col in esquema,
+        dtype={col: object for col, tipo in esquema.items() if tipo == 'texto'}
+    )
+
+    return aplicar_esquema(df, esquema)
+
+
+def tamanho_arquivo(arquivo):
+    """Tamanho em bytes de um caminho, bytes ou objeto de arquivo (ex.: UploadedFile do Streamlit)"""
+    if isinstance(arquivo, (bytes, bytearray)):
+        return len(arquivo)
+    if isinstance(arquivo, (str, os.PathLike)):
+        return os.path.getsize(arquivo)
+    if getattr(arquivo, 'size', None) is not None:
+        return arquivo.size
+    posicao = arquivo.tell()
+    tamanho = arquivo.seek(0, os.SEEK_END)
+    arquivo.seek(posicao)
+    return tamanho
+
+
+def _converter_celula(celula):
+    """Valor da célula como no pd.read_excel: vazio = '', erro = NaN, número inteiro como int"""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    if celula.value is None:
+        return ''
+    if celula.data_type == TYPE_ERROR:
+        return np.nan
+    if celula.data_type == TYPE_NUMERIC:
+        inteiro = int(celula.value)
+        return inteiro if inteiro == celula.value else float(celula.value)
+    return celula.value
+
+
+def _tipar_bloco(linhas, colunas, esquema):
+    """Monta e tipa um bloco de linhas (listas de valores já projetadas nas colunas do esquema)"""
+    bloco = TextParser(
+        linhas,
+        names=colunas,
+        dtype={col: object for col in colunas if esquema[col] == 'texto'}
+    ).read()
+    return aplicar_esquema(bloco, esquema)
+
+
+def ler_planilha_em_blocos(arquivo, aba='Base', esquema=ESQUEMA_BASE, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """
+    Percorre a aba em blocos de `linhas_por_bloco` linhas com o openpyxl em modo somente leitura.
+    Gera (bloco tipado, linhas lidas, total estimado de linhas ou None). Apenas as colunas do
+    esquema são convertidas. Como no pd.read_excel, linhas vazias no meio da aba viram linhas
+    sem valores e as do final são descartadas.
+    """
+    from openpyxl import load_workbook
+
+    if isinstance(arquivo, (bytes, bytearray)):
+        arquivo = io.BytesIO(arquivo)
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        if aba not in livro.sheetnames:
+            raise ValueError(f"Aba '{aba}' não encontrada na planilha")
+        planilha = livro[aba]
+        total_estimado = planilha.max_row - 1 if planilha.max_row else None
+        # A dimensão gravada no arquivo pode estar errada: percorrer todas as linhas
+        planilha.reset_dimensions()
+
+        linhas = planilha.rows
+        cabecalho = [_converter_celula(celula) for celula in next(linhas, ())]
+        posicoes = {}
+        for posicao, nome in enumerate(cabecalho):
+            if nome in esquema and nome not in posicoes:
+                posicoes[nome] = posicao
+        colunas = list(posicoes)
+
+        bloco = []
+        linhas_lidas = 0
+        blocos_gerados = 0
+        vazias_pendentes = 0
+        for linha in linhas:
+            valores = [_converter_celula(celula) for celula in linha]
+            linhas_lidas += 1
+            if all(valor == '' for valor in valores):
+                # Só entram na base se houver alguma linha preenchida depois delas
+                vazias_pendentes += 1
+                continue
+            bloco.extend([[''] * len(colunas)] * vazias_pendentes)
+            vazias_pendentes = 0
+            bloco.append([valores[p] if p < len(valores) else '' for p in posicoes.values()])
+            if len(bloco) >= linhas_por_bloco:
+                yield _tipar_bloco(bloco, colunas, esquema), linhas_lidas, total_estimado
+                blocos_gerados += 1
+                bloco = []
+
+        # Aba só com cabeçalho (ou só linhas vazias): um bloco vazio, já tipado
+        if bloco or blocos_gerados == 0:
+            yield _tipar_bloco(bloco, colunas, esquema), linhas_lidas, total_estimado
+    finally:
+        livro.close()
+
+
+def _esquema_blocos(colunas, esquema):
+    """
+    Esquema Arrow fixo dos blocos gravados em fluxo: dimensões como códigos (int32, -1 = vazio)
+    e inteiros como float, para que um bloco sem nulos não mude o tipo da coluna
+    """
+    tipos = {
+        'data': pa.timestamp('us'),
+        'numero': pa.float64(),
+        'inteiro': pa.float64(),
+        'texto': pa.string(),
+        'categoria': pa.int32(),
+    }
+    return pa.schema([(col, tipos[esquema[col]]) for col in colunas])
+
+
+def _codificar_bloco(bloco, dicionarios):
+    """
+    Troca as colunas categóricas do bloco pelos códigos no dicionário da coluna (valor -> código),
+    acrescentando ao dicionário as categorias ainda não vistas
+    """
+    bloco = bloco.copy()
+    for col, dicionario in dicionarios.items():
+        categorias = bloco[col].cat.categories
+        for valor in categorias:
+            dicionario.setdefault(valor, len(dicionario))
+        # Código -1 (vazio) aponta para a última posição do mapa
+        mapa = np.array([dicionario[valor] for valor in categorias] + [-1], dtype=np.int32)
+        bloco[col] = mapa[bloco[col].cat.codes.to_numpy()]
+    for col in bloco.columns:
+        if pd.api.types.is_integer_dtype(bloco[col]) and col not in dicionarios:
+            bloco[col] = bloco[col].astype('float64')
+    return bloco
+
+
+def _decodificar_categorias(codigos, dicionario):
+    """
+    Monta a coluna categórica a partir dos códigos gravados, com as categorias na mesma
+    ordem do astype('category') da planilha inteira
+    """
+    valores = list(dicionario)
+    categorias = pd.Categorical(valores).categories
+    ordem = np.append(categorias.get_indexer(pd.Index(valores, dtype=object)), -1).astype(np.int32)
+    return pd.Categorical.from_codes(ordem[np.asarray(codigos)], dtype=pd.CategoricalDtype(categorias))
+
+
+def ler_planilha_base_em_fluxo(arquivo, aba='Base', esquema=ESQUEMA_BASE, linhas_por_bloco=LINHAS_POR_BLOCO,
+                               progresso=None, diretorio=None):
+    """
+    Lê a aba em blocos (ver ler_planilha_em_blocos), acrescentando cada bloco tipado a um
+    único Parquet temporário; ao final, lê esse arquivo coluna a coluna e restaura as categorias.
+    `progresso(linhas_lidas, total_estimado)` é chamado a cada bloco.
+    """
+    with tempfile.TemporaryDirectory(dir=diretorio) as temporario:
+        caminho = Path(temporario) / 'base.parquet'
+        gravador = None
+        dicionarios = {}
+        try:
+            for bloco, linhas_lidas, total_estimado in ler_planilha_em_blocos(arquivo, aba, esquema, linhas_por_bloco):
+                if gravador is None:
+                    dicionarios = {col: {} for col in bloco.columns if esquema[col] == 'categoria'}
+                    esquema_blocos = _esquema_blocos(list(bloco.columns), esquema)
+                    gravador = pq.ParquetWriter(caminho, esquema_blocos)
+                tabela = pa.Table.from_pandas(
+                    _codificar_bloco(bloco, dicionarios), schema=esquema_blocos, preserve_index=False
+                )
+                gravador.write_table(tabela)
+                if progresso is not None:
+                    progresso(linhas_lidas, total_estimado)
+        finally:
+            if gravador is not None:
+                gravador.close()
+
+        # Uma coluna por vez: o pico da montagem é a base final mais uma coluna em Arrow
+        base = {}
+        arquivo_parquet = pq.ParquetFile(caminho)
+        for col in esquema_blocos.names:
+            valores = arquivo_parquet.read(columns=[col]).column(0).to_pandas()
+            if col in dicionarios:
+                base[col] = _decodificar_categorias(valores.to_numpy(), dicionarios[col])
+            else:
+                # Reaplica o esquema (inteiros voltam a Int64, textos a string)
+                base[col] = aplicar_esquema(valores.to_frame(col), {col: esquema[col]})[col]
+            del valores
+        arquivo_parquet.close()
+
+    return pd.DataFrame(base)
+
+
+def ler_planilha(arquivo, aba='Base', esquema=ESQUEMA_BASE, progresso=None, limite_leitura_direta=LIMITE_LEITURA_DIRETA):
+    """
+    Lê a aba de uma vez (ler_planilha_base) até `limite_leitura_direta` bytes; acima disso,
+    em fluxo (ler_planilha_base_em_fluxo), com memória limitada ao bloco.
+    `progresso(linhas_lidas, total_estimado)` acompanha a leitura (na leitura direta, só ao final).
+    """
+    if tamanho_arquivo(arquivo) > limite_leitura_direta:
+        return ler_planilha_base_em_fluxo(arquivo, aba, esquema, progresso=progresso)
+
+    df = ler_planilha_base(arquivo, aba, esquema)
+    if progresso is not None:
+        progresso(len(df), len(df))
+    return df
+
+
+def relatorio_memoria(df):
+    """
+    Memória ocupada por coluna (bytes, contando o conteúdo dos textos).
+    Para colunas categóricas, estima também quanto ocupariam como texto (object),
+    a partir da contagem de cada código e do tamanho de cada categoria.
+    """
+    linhas = []
+    for col in df.columns:
+        serie = df[col]
+        memoria = int(serie.memory_usage(index=False, deep=True))
+        como_texto = memoria
+        categorias = None
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            categorias = len(serie.cat.categories)
+            contagem = np.bincount(codigos[codigos >= 0], minlength=categorias)
+            tamanhos = np.array([sys.getsizeof(c) for c in serie.cat.categories], dtype=np.int64)
+            # Um ponteiro por linha + o objeto de cada valor (vazios apontam para o mesmo None)
+            como_texto = int(8 * len(serie) + (contagem * tamanhos).sum())
+        linhas.append({
+            'Coluna': col,
+            'Tipo': str(serie.dtype),
+            'Categorias': categorias,
+            'Memória (MB)': memoria / 1024 ** 2,
+            'Como texto (MB)': como_texto / 1024 ** 2,
+        })
+    return pd.DataFrame(linhas).set_index('Coluna').astype({'Categorias': 'Int64'})
@@ -0,0 +1,117 @@
+"""
+Instrumentação das etapas de cada execução do dashboard.
+
+Cada execução (rerun) do script cria um Medidor. As etapas são medidas com
+`with medidor.etapa(nome):` ou com o par `iniciar(nome)` / `encerrar(nome)`
+(útil em blocos longos, como a montagem de um gráfico) e podem ser aninhadas. Para
+cada etapa ficam registrados o início, a duração e a memória do processo (RSS) ao
+final, com a variação em relação ao início. O perfil pode ser exportado em JSON
+ou CSV para anexar a um chamado.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COLUNAS_PERFIL = ['Etapa', 'Nível', 'Início (ms)', 'Duração (ms)', 'Memória (MB)', 'Δ Memória (MB)']
+
+
+def memoria_processo():
+    """
+    Memória residente (RSS) atual do processo, em bytes.
+    Fora do Linux, usa o pico de memória do processo; None se não houver como medir.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss é informado em bytes no macOS e em KB nos demais sistemas
+        return pico if os.uname().sysname == 'Darwin' else pico * 1024
+    return None
+
+
+def _mb(valor):
+    return None if valor is None else round(valor / 1024 ** 2, 1)
+
+
+class Medidor:
+    """Cronômetros nomeados e contadores de memória das etapas de uma execução"""
+
+    def __init__(self, execucao=None):
+        self.execucao = execucao
+        self.iniciado_em = datetime.now()
+        self._origem = time.perf_counter()
+        self._abertas = []
+        self.etapas = []
+
+    def iniciar(self, nome):
+        """Começa a medir uma etapa (encerrada por `encerrar`)"""
+        registro = {
+            'Etapa': nome,
+            'Nível': len(self._abertas),
+            'Início (ms)': (time.perf_counter() - self._origem) * 1000,
+            'Duração (ms)': None,
+            'Memória (MB)': None,
+            'Δ Memória (MB)': None,
+        }
+        self.etapas.append(registro)
+        self._abertas.append((nome, registro, time.perf_counter(), memoria_processo()))
+
+    def encerrar(self, nome=None):
+        """
+        Encerra a etapa aberta mais recente (ou a de nome `nome`, encerrando também
+        as etapas internas que ficaram abertas)
+        """
+        if nome is not None and all(aberta != nome for aberta, *_ in self._abertas):
+            return
+        while self._abertas:
+            aberta, registro, inicio, memoria_inicial = self._abertas.pop()
+            memoria_final = memoria_processo()
+            registro['Duração (ms)'] = (time.perf_counter() - inicio) * 1000
+            registro['Memória (MB)'] = _mb(memoria_final)
+            if memoria_inicial is not None and memoria_final is not None:
+                registro['Δ Memória (MB)'] = _mb(memoria_final - memoria_inicial)
+            if nome is None or aberta == nome:
+                return
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco `with` como uma etapa"""
+        self.iniciar(nome)
+        try:
+            yield self
+        finally:
+            self.encerrar(nome)
+
+    def duracao_total(self):
+        """Tempo decorrido desde o início da execução, em ms"""
+        return (time.perf_counter() - self._origem) * 1000
+
+    def como_dataframe(self):
+        """Etapas medidas, na ordem em que começaram (Nível indica o aninhamento)"""
+        return pd.DataFrame(self.etapas, columns=COLUNAS_PERFIL)
+
+    def como_json(self):
+        """Perfil da execução em JSON"""
+        return json.dumps({
+            'execucao': self.execucao,
+            'iniciado_em': self.iniciado_em.isoformat(timespec='seconds'),
+            'duracao_total_ms': round(self.duracao_total(), 2),
+            'memoria_mb': _mb(memoria_processo()),
+            'etapas': self.etapas,
+        }, ensure_ascii=False, indent=2, default=str)
+
+    def como_csv(self):
+        """Etapas medidas em CSV"""
+        return self.como_dataframe().to_csv(index=False)
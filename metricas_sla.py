@@ -0,0 +1,118 @@
+"""
+API de métricas de SLA independente do Streamlit.
+
+Recebe a base (planilha já lida ou histórico) e uma especificação de filtros e
+devolve os resultados tipados de cada seção do dashboard. O app apenas exibe
+esses resultados; relatórios em lote e benchmarks usam as mesmas funções, sem
+precisar de uma sessão do Streamlit.
+
+Exemplo:
+    filtro = FiltroBase.criar({'Unid Negoc': ['BU 010']}, date(2024, 1, 1), date(2024, 3, 31))
+    resultado = calcular_metricas(base, filtro)
+    resultado.dashboard.taxa_sla
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from agregados import (AGREGADORES, ContagemNotas, Insights, MetricasDashboard, Pendencias, PerformanceSla,
+                       Rankings, chave_filtros)
+from cubo import AGREGADORES_CUBO, COLUNA_NFS, cubo_responde, fatiar_cubo
+from filtros import aplicar_mascara, construir_mascara, preparar_filtros
+from preprocessamento import aplicar_regra_sla, normalizar_base
+
+# Regra de SLA padrão: (tolerância em dias, tolerância em dias úteis, comparação apenas por dia)
+REGRA_SLA_PADRAO = (0, False, False)
+
+
+@dataclass(frozen=True)
+class FiltroBase:
+    """
+    Filtros aplicados à base: valores selecionados por coluna, período de faturamento
+    (inclusivo) e regra de SLA. Colunas sem seleção não filtram.
+    """
+    selecoes: tuple = ()
+    data_inicio: Optional[date] = None
+    data_fim: Optional[date] = None
+    regra_sla: tuple = REGRA_SLA_PADRAO
+
+    @classmethod
+    def criar(cls, selecoes=None, data_inicio=None, data_fim=None, regra_sla=REGRA_SLA_PADRAO):
+        """Monta o filtro a partir de um dicionário coluna -> valores (ordem dos valores indiferente)"""
+        selecoes = tuple(
+            (col, tuple(sorted(valores, key=str)))
+            for col, valores in sorted((selecoes or {}).items())
+            if valores is not None
+        )
+        return cls(selecoes, data_inicio, data_fim, tuple(regra_sla))
+
+    def como_dicionario(self):
+        """Seleções no formato coluna -> lista de valores"""
+        return {col: list(valores) for col, valores in self.selecoes}
+
+    def chave(self, hash_arquivo):
+        """Chave do cache de agregados para esta base + filtros"""
+        return chave_filtros(hash_arquivo, self.como_dicionario(), self.data_inicio, self.data_fim, self.regra_sla)
+
+
+@dataclass(frozen=True)
+class ResultadoMetricas:
+    """Resultados das seções calculadas (None nas seções não pedidas ou sem as colunas necessárias)"""
+    registros: int
+    insights: Optional[Insights] = None
+    dashboard: Optional[MetricasDashboard] = None
+    rankings: Optional[Rankings] = None
+    contagem_notas: Optional[ContagemNotas] = None
+    performance_sla: Optional[PerformanceSla] = None
+    pendencias: Optional[Pendencias] = None
+
+
+def preparar_base(df, regra_sla=REGRA_SLA_PADRAO):
+    """
+    Normaliza a base, se ainda não estiver normalizada, e recalcula os indicadores
+    de prazo quando a regra de SLA não é a padrão
+    """
+    if 'No Prazo' not in df.columns:
+        df = normalizar_base(df)
+    if tuple(regra_sla) == REGRA_SLA_PADRAO:
+        return df
+    tolerancia_dias, tolerancia_em_dias_uteis, por_dia = regra_sla
+    return aplicar_regra_sla(
+        df,
+        tolerancia_dias=tolerancia_dias,
+        por_dia=por_dia,
+        tolerancia_em_dias_uteis=tolerancia_em_dias_uteis
+    )
+
+
+def aplicar_filtro(df, filtro, filtros_preparados=None):
+    """
+    Aplica as seleções e o período à base (a regra de SLA é aplicada por `preparar_base`).
+    `filtros_preparados` (de filtros.preparar_filtros) evita recalcular os códigos a cada chamada.
+    """
+    if not filtro.selecoes and (filtro.data_inicio is None or filtro.data_fim is None):
+        return df
+    if filtros_preparados is None:
+        filtros_preparados = preparar_filtros(df)
+    mascara = construir_mascara(filtros_preparados, filtro.como_dicionario(), filtro.data_inicio, filtro.data_fim)
+    return aplicar_mascara(df, mascara)
+
+
+def calcular_metricas(df, filtro=None, secoes=None, filtros_preparados=None, cubo=None):
+    """
+    Calcula as métricas das seções pedidas (todas por padrão) sobre a base filtrada.
+    `df` pode ser a planilha lida ou a base já normalizada. Com `cubo` (de cubo.construir_cubo,
+    montado com a mesma regra de SLA), filtros em meses inteiros são respondidos pelas células do cubo.
+    """
+    filtro = filtro or FiltroBase()
+    secoes = list(AGREGADORES) if secoes is None else secoes
+    if cubo is not None and cubo_responde(cubo, filtro):
+        return ResultadoMetricas(
+            registros=int(fatiar_cubo(cubo, filtro)[COLUNA_NFS].sum()),
+            **{secao: AGREGADORES_CUBO[secao](cubo, filtro) for secao in secoes}
+        )
+    base = aplicar_filtro(preparar_base(df, filtro.regra_sla), filtro, filtros_preparados)
+    return ResultadoMetricas(
+        registros=len(base),
+        **{secao: AGREGADORES[secao](base) for secao in secoes}
+    )
@@ -0,0 +1,109 @@
+"""
+Núcleos (kernels) de agregação sobre códigos inteiros de categorias.
+
+As dimensões da base são categóricas: os códigos inteiros de cada linha já
+existem (`cat.codes`) e contagens, tabelas cruzadas e rankings saem de um
+`np.bincount` sobre eles, sem materializar a base filtrada nem montar o índice de
+um groupby. Os resultados são idênticos aos das chamadas do pandas que substituem
+(value_counts, crosstab, nlargest): a ordenação por volume é estável (empates na
+ordem das categorias) e os rankings usam seleção parcial (argpartition) antes de
+ordenar apenas os k maiores.
+
+Somas de valores decimais são feitas por groupby sobre os códigos, que usa a mesma
+soma compensada do pandas; um bincount com pesos difere na última casa binária.
+"""
+import numpy as np
+import pandas as pd
+
+
+def codificar(serie):
+    """Códigos inteiros (-1 = vazio) e categorias (Index) de uma coluna; ordenadas quando não categórica"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    return pd.factorize(serie, sort=True)
+
+
+def deslocar(codigos):
+    """Códigos + 1 (intp), para o bincount: o vazio (-1) cai na posição 0, descartada depois"""
+    return codigos.astype(np.intp) + 1
+
+
+def contar(codigos, n_categorias, mascara=None):
+    """Quantidade de linhas por código (códigos -1 ignorados), opcionalmente só nas linhas da máscara"""
+    if mascara is None:
+        return np.bincount(deslocar(codigos), minlength=n_categorias + 1)[1:]
+    if np.count_nonzero(mascara) < len(mascara) // 8:
+        return np.bincount(deslocar(codigos[mascara]), minlength=n_categorias + 1)[1:]
+    # Máscara densa: código e máscara em um único índice (2 * código + máscara), sem seleção booleana
+    return np.bincount(deslocar(codigos) * 2 + mascara, minlength=2 * (n_categorias + 1))[3::2]
+
+
+def somar_exatos(codigos, n_categorias, valores):
+    """
+    Soma e quantidade de valores preenchidos por código, com bincount ponderado. Exata apenas
+    para valores inteiros (somas abaixo de 2**53); decimais devem usar `somar`.
+    """
+    deslocados = deslocar(codigos)
+    preenchidos = ~np.isnan(valores)
+    soma = np.bincount(deslocados, weights=np.where(preenchidos, valores, 0), minlength=n_categorias + 1)[1:]
+    quantidade = np.bincount(deslocados, weights=preenchidos, minlength=n_categorias + 1)[1:]
+    return soma, quantidade.astype(np.int64)
+
+
+def tabela_cruzada(codigos_linhas, n_linhas, codigos_colunas, n_colunas, mascara=None):
+    """Contagem por par (linha, coluna) em uma matriz n_linhas x n_colunas; pares com vazio ficam fora"""
+    validos = (codigos_linhas >= 0) & (codigos_colunas >= 0)
+    if mascara is not None:
+        validos &= mascara
+    celulas = codigos_linhas[validos].astype(np.int64) * n_colunas + codigos_colunas[validos]
+    return np.bincount(celulas, minlength=n_linhas * n_colunas).reshape(n_linhas, n_colunas)
+
+
+def somar(codigos, valores, mascara=None):
+    """Soma de `valores` por código (Series indexada pelo código; vazios ignorados), com a soma do pandas"""
+    validos = codigos >= 0 if mascara is None else mascara & (codigos >= 0)
+    return pd.Series(valores[validos]).groupby(codigos[validos]).sum()
+
+
+def ordenar_por_volume(contagens):
+    """Posições com contagem > 0, da maior para a menor; empates na ordem das posições (ordenação estável)"""
+    presentes = np.flatnonzero(contagens > 0)
+    return presentes[np.argsort(-contagens[presentes], kind='stable')]
+
+
+def maiores(valores, k):
+    """
+    Posições dos k maiores valores, em ordem decrescente, com empates pela posição e valores
+    ausentes por último (como nlargest). Seleção parcial: apenas os candidatos acima do
+    k-ésimo valor são ordenados.
+    """
+    valores = np.asarray(valores)
+    ausentes = pd.isna(valores)
+    validos = np.flatnonzero(~ausentes)
+    if k >= len(validos):
+        ordenados = validos[np.argsort(-valores[validos], kind='stable')]
+        return np.concatenate([ordenados, np.flatnonzero(ausentes)])[:max(k, 0)]
+    if k <= 0:
+        return validos[:0]
+
+    corte = np.partition(valores[validos], len(validos) - k)[len(validos) - k]
+    acima = validos[valores[validos] > corte]
+    empatados = validos[valores[validos] == corte][:k - len(acima)]
+    candidatos = np.concatenate([acima, empatados])
+    return candidatos[np.lexsort((candidatos, -valores[candidatos]))]
+
+
+def serie_por_volume(contagens, dtype, nome):
+    """Contagens por código de uma coluna categórica como Series ordenada por volume (formato do value_counts)"""
+    ordem = ordenar_por_volume(contagens)
+    indice = pd.CategoricalIndex(pd.Categorical.from_codes(ordem, dtype=dtype), name=nome)
+    return pd.Series(contagens[ordem], index=indice, name='count')
+
+
+def contar_serie(serie, mascara=None):
+    """
+    Contagem por valor de uma coluna categórica, ordenada por volume e sem categorias
+    zeradas: o mesmo resultado de `serie[mascara].value_counts()` sem os zeros
+    """
+    codigos, categorias = codificar(serie)
+    return serie_por_volume(contar(codigos, len(categorias), mascara), serie.dtype, serie.name)
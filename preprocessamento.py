@@ -0,0 +1,131 @@
+"""
+Normalização única da base logo após o carregamento.
+
+Garante as colunas de data tipadas e deriva os indicadores de entrega usados
+pelas abas do dashboard, para que nenhuma aba precise converter datas ou copiar
+a base novamente.
+"""
+import numpy as np
+import pandas as pd
+
+from classificacao_sla import classificar_entregas
+from dias_uteis import anos_das_datas, dias_uteis_por_estado, montar_calendarios_por_estado
+from ingestao import ESQUEMA_BASE
+
+COLUNAS_DATA = [col for col, tipo in ESQUEMA_BASE.items() if tipo == 'data']
+
+# Durações de cada etapa da entrega, calculadas para todas as NFs
+COLUNAS_ETAPAS = ['Dias Implantação', 'Dias Despacho', 'Dias Transporte', 'Dias Úteis Entrega']
+
+# Indicadores derivados adicionados à base (não fazem parte da planilha original)
+COLUNAS_DERIVADAS = ['Entregue', 'No Prazo', 'Atrasada', 'Pendente'] + COLUNAS_ETAPAS + ['Dias Corridos Entrega', 'Tempo Total']
+
+
+def _dias_corridos(df, inicio, fim):
+    """Diferença em dias corridos entre duas colunas de data (nulo se alguma estiver ausente)"""
+    if inicio not in df.columns or fim not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype='Int64')
+    return (df[fim] - df[inicio]).dt.days.astype('Int64')
+
+
+def _estados(df):
+    """UF de destino de cada linha (vazia quando a base não tem a coluna)"""
+    if 'Estado Destino' in df.columns:
+        return df['Estado Destino']
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def calendarios_da_base(df):
+    """
+    Calendários de dias úteis (feriados nacionais + estaduais) de cada UF de destino da base,
+    cobrindo os anos das datas de emissão, previsão e entrega
+    """
+    datas = [df[col] for col in ['Dt Nota Fiscal', 'Previsão de Entrega', 'Data de Entrega'] if col in df.columns]
+    anos = anos_das_datas(*datas) if datas else range(0)
+    return montar_calendarios_por_estado(anos, _estados(df))
+
+
+def adicionar_timeline(df, calendarios=None):
+    """
+    Calcula de uma vez, para todas as NFs, as durações exibidas na timeline da Busca NF:
+    - Dias Implantação: implantação do pedido até a emissão da NF (dias corridos)
+    - Dias Despacho: emissão da NF até a saída (dias corridos)
+    - Dias Transporte: saída até a entrega (dias corridos)
+    - Dias Úteis Entrega: emissão da NF até a entrega (dias úteis no calendário da UF de destino)
+    - Dias Corridos Entrega: emissão da NF até a entrega (dias corridos)
+    - Tempo Total: Dias Faturamento + Dias Despacho + Dias Corridos Entrega
+    """
+    df['Dias Implantação'] = _dias_corridos(df, 'Dt Implant Ped', 'Dt Nota Fiscal')
+    df['Dias Despacho'] = _dias_corridos(df, 'Dt Nota Fiscal', 'Data de Saída')
+    df['Dias Transporte'] = _dias_corridos(df, 'Data de Saída', 'Data de Entrega')
+    df['Dias Corridos Entrega'] = _dias_corridos(df, 'Dt Nota Fiscal', 'Data de Entrega')
+
+    if 'Dt Nota Fiscal' in df.columns and 'Data de Entrega' in df.columns:
+        if calendarios is None:
+            calendarios = calendarios_da_base(df)
+        dias_uteis = dias_uteis_por_estado(df['Dt Nota Fiscal'], df['Data de Entrega'], _estados(df), calendarios=calendarios)
+        df['Dias Úteis Entrega'] = pd.Series(dias_uteis, index=df.index).astype('Int64')
+    else:
+        df['Dias Úteis Entrega'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    if 'Dias Faturamento' in df.columns:
+        dias_faturamento = pd.Series(np.trunc(df['Dias Faturamento']), index=df.index).astype('Int64')
+        df['Tempo Total'] = dias_faturamento + df['Dias Despacho'] + df['Dias Corridos Entrega']
+    else:
+        df['Tempo Total'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    return df
+
+
+def aplicar_regra_sla(df, tolerancia_dias=0, por_dia=False, tolerancia_em_dias_uteis=False, calendarios=None):
+    """
+    Retorna a base com os indicadores No Prazo / Atrasada calculados pela regra de SLA
+    informada (ver classificar_entregas). A tolerância em dias úteis usa o calendário da
+    UF de destino de cada NF (`calendarios`; montados a partir da base quando ausentes).
+    A base recebida não é alterada; com Copy-on-Write, as demais colunas do resultado
+    continuam compartilhadas com ela.
+    """
+    if 'Data de Entrega' not in df.columns or 'Previsão de Entrega' not in df.columns:
+        return df
+
+    calendarios_tolerancia = estados = None
+    if tolerancia_em_dias_uteis:
+        calendarios_tolerancia = calendarios if calendarios is not None else calendarios_da_base(df)
+        estados = _estados(df)
+
+    no_prazo, atrasada = classificar_entregas(
+        df['Data de Entrega'], df['Previsão de Entrega'],
+        tolerancia_dias, por_dia, calendarios_tolerancia, estados
+    )
+    return df.assign(**{'No Prazo': no_prazo, 'Atrasada': atrasada})
+
+
+def normalizar_base(df, calendarios=None, tolerancia_dias=0, por_dia=False, tolerancia_em_dias_uteis=False):
+    """
+    Retorna a base com datas tipadas e os indicadores de entrega:
+    - Entregue: possui Data de Entrega
+    - No Prazo: entregue com Data de Entrega <= Previsão de Entrega + tolerância
+    - Atrasada: entregue com Data de Entrega > Previsão de Entrega + tolerância
+    - Pendente: sem Data de Entrega
+    Entregas sem previsão não são classificadas como no prazo nem como atrasadas.
+    A regra de SLA (tolerância, dias úteis, comparação por dia) segue classificar_entregas.
+    Também adiciona as durações da timeline (ver adicionar_timeline). Os dias úteis usam
+    os calendários por UF de destino (`calendarios`; montados uma vez a partir da base quando ausentes).
+    """
+    df = df.copy()
+
+    for col in COLUNAS_DATA:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    if calendarios is None:
+        calendarios = calendarios_da_base(df)
+
+    if 'Data de Entrega' in df.columns:
+        entregue = df['Data de Entrega'].notna()
+        df['Entregue'] = entregue
+        df['Pendente'] = ~entregue
+
+        df = aplicar_regra_sla(df, tolerancia_dias, por_dia, tolerancia_em_dias_uteis, calendarios)
+
+    return adicionar_timeline(df, calendarios)
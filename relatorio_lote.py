@@ -0,0 +1,263 @@
+"""
+Relatório de SLA em lote, pela linha de comando (ex.: execução agendada todas as noites).
+
+Lê a aba 'Base' das planilhas informadas (usando a cópia colunar em cache quando
+existir) ou o histórico local e gera, sem abrir o navegador, os mesmos números do
+Dashboard Geral, da Performance SLA, da Gestão de Pendências e da Contagem de
+Notas, em Excel, CSV ou Parquet. Com --por bu e/ou --por mes, um relatório é
+gerado para cada BU/mês, distribuídos entre processos paralelos.
+
+Exemplos:
+    python relatorio_lote.py base_janeiro.xlsx base_fevereiro.xlsx --saida relatorios
+    python relatorio_lote.py --historico --por bu --por mes --formato parquet --processos 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+from cache_colunar import carregar_com_cache, gravar_parquet_atomico, tipar_para_parquet
+from filtros import COLUNA_DATA_FILTRO, preparar_filtros
+from historico import CHAVE_DEDUPLICACAO, ler_historico
+from ingestao import aplicar_esquema, ler_planilha
+from metricas_sla import REGRA_SLA_PADRAO, FiltroBase, aplicar_filtro, calcular_metricas, preparar_base
+
+FORMATOS = ['excel', 'csv', 'parquet']
+DIVISOES = ['bu', 'mes']
+
+SECOES_RELATORIO = ['insights', 'dashboard', 'performance_sla', 'pendencias', 'contagem_notas']
+
+# Colunas da lista de notas pendentes (as que existirem na base)
+COLUNAS_PENDENTES = [
+    'Numero', 'Seq. De Fat', 'Unid Negoc', 'Transportador', 'Estado Destino', 'Status',
+    'Dt Nota Fiscal', 'Previsão de Entrega', 'Data de Entrega',
+]
+
+# Base e filtros preparados de cada processo de trabalho (carregados uma única vez por processo)
+_BASE = None
+_FILTROS_PREPARADOS = None
+
+
+def carregar_base(arquivos=None, usar_historico=False):
+    """
+    Lê o histórico local ou a aba 'Base' das planilhas (via cache colunar), juntando os arquivos.
+    Como no histórico, cada NF (Numero + Seq. De Fat) é contada uma única vez, na versão do último arquivo.
+    """
+    if usar_historico:
+        return ler_historico()
+    partes = [carregar_com_cache(arquivo, ler_planilha) for arquivo in arquivos]
+    # As categorias de cada arquivo são unificadas pelo esquema
+    df = partes[0] if len(partes) == 1 else aplicar_esquema(pd.concat(partes, ignore_index=True))
+    colunas_chave = [col for col in CHAVE_DEDUPLICACAO if col in df.columns]
+    if colunas_chave:
+        df = df[~df.duplicated(subset=colunas_chave, keep='last').to_numpy()]
+    return df
+
+
+def montar_relatorios(base, divisoes=(), data_inicio=None, data_fim=None):
+    """
+    Lista os relatórios a gerar: (nome, filtro). Sempre inclui o geral; cada divisão
+    acrescenta um relatório por BU ou por mês de faturamento presente na base.
+    """
+    relatorios = [('geral', FiltroBase.criar(data_inicio=data_inicio, data_fim=data_fim))]
+
+    if 'bu' in divisoes and 'Unid Negoc' in base.columns:
+        for bu in preparar_filtros(base, colunas=['Unid Negoc'], coluna_data=None)['dimensoes']['Unid Negoc']['opcoes']:
+            filtro = FiltroBase.criar({'Unid Negoc': [bu]}, data_inicio, data_fim)
+            relatorios.append((f"bu_{bu}", filtro))
+
+    if 'mes' in divisoes and COLUNA_DATA_FILTRO in base.columns:
+        meses = base[COLUNA_DATA_FILTRO].dropna().dt.to_period('M').unique()
+        for mes in sorted(meses):
+            inicio, fim = mes.start_time.date(), mes.end_time.date()
+            if data_inicio is not None:
+                inicio = max(inicio, data_inicio)
+            if data_fim is not None:
+                fim = min(fim, data_fim)
+            if inicio <= fim:
+                relatorios.append((f"mes_{mes}", FiltroBase.criar(data_inicio=inicio, data_fim=fim)))
+
+    return relatorios
+
+
+def _notas_pendentes(df):
+    """NFs sem data de entrega ou entregues após o prazo, com a situação de cada uma"""
+    if not all(col in df.columns for col in ['Pendente', 'Atrasada']):
+        return pd.DataFrame()
+    pendentes = df[(df['Pendente'] | df['Atrasada']).to_numpy()]
+    lista = pendentes[[col for col in COLUNAS_PENDENTES if col in pendentes.columns]]
+    return lista.assign(Situação=pendentes['Pendente'].map({True: 'Sem Data Entrega', False: 'Entregue Atrasada'}))
+
+
+def montar_tabelas(resultado, pendentes):
+    """Tabelas do relatório (nome da tabela -> DataFrame), a partir das métricas calculadas"""
+    kpis = {'Registros': resultado.registros}
+    if resultado.dashboard is not None:
+        kpis.update(asdict(resultado.dashboard))
+    if resultado.insights is not None:
+        kpis.update({f"receita_{campo}": valor for campo, valor in asdict(resultado.insights).items()})
+    if resultado.pendencias is not None:
+        kpis.update({
+            'pendencias_sem_data': resultado.pendencias.sem_data,
+            'pendencias_atrasadas': resultado.pendencias.atrasadas,
+            'pendencias_total': resultado.pendencias.total,
+        })
+
+    tabelas = {'KPIs': pd.DataFrame([kpis])}
+
+    performance = resultado.performance_sla
+    if performance is not None:
+        if performance.performance_transp is not None:
+            tabelas['SLA Transportadoras'] = performance.performance_transp.reset_index()
+        for coluna, tabela in performance.tempo_etapas.items():
+            tabelas[f"Etapas por {coluna}"] = tabela.reset_index()
+
+    if resultado.pendencias is not None:
+        tabelas['Pendências Transportadora'] = resultado.pendencias.por_transportador.rename('Notas Pendentes').reset_index()
+        tabelas['Notas Pendentes'] = pendentes
+
+    contagem = resultado.contagem_notas
+    if contagem is not None and contagem.registros > 0:
+        tabelas['Contagem Notas'] = contagem.contagem.reset_index()
+        tabelas['Contagem Percentual'] = contagem.percentual.reset_index()
+        tabelas['Contagem Valor'] = contagem.valor.reset_index()
+
+    return tabelas
+
+
+def _nome_arquivo(texto):
+    """Nome seguro para arquivos e diretórios"""
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(texto))
+
+
+def gravar_tabelas(tabelas, diretorio, nome, formato):
+    """Grava as tabelas de um relatório; retorna o caminho gerado (arquivo Excel ou diretório)"""
+    diretorio = Path(diretorio)
+    tabelas = {titulo: tabela.rename(columns=str) for titulo, tabela in tabelas.items()}
+
+    if formato == 'excel':
+        caminho = diretorio / f"{_nome_arquivo(nome)}.xlsx"
+        with pd.ExcelWriter(caminho, engine='openpyxl') as escritor:
+            for titulo, tabela in tabelas.items():
+                tabela.to_excel(escritor, sheet_name=titulo[:31], index=False)
+        return caminho
+
+    caminho = diretorio / _nome_arquivo(nome)
+    caminho.mkdir(parents=True, exist_ok=True)
+    for titulo, tabela in tabelas.items():
+        if formato == 'csv':
+            tabela.to_csv(caminho / f"{_nome_arquivo(titulo)}.csv", index=False, encoding='utf-8-sig')
+        else:
+            gravar_parquet_atomico(tipar_para_parquet(tabela), caminho / f"{_nome_arquivo(titulo)}.parquet")
+    return caminho
+
+
+def _iniciar_processo(caminho_base):
+    """Carrega (com memory-map) a base normalizada e os filtros uma única vez no processo"""
+    global _BASE, _FILTROS_PREPARADOS
+    _BASE = pd.read_parquet(caminho_base, memory_map=True)
+    _FILTROS_PREPARADOS = preparar_filtros(_BASE)
+
+
+def _gerar_relatorio(nome, filtro, diretorio, formato):
+    """Calcula e grava um relatório no processo atual (a regra de SLA já está aplicada na base)"""
+    filtrada = aplicar_filtro(_BASE, filtro, _FILTROS_PREPARADOS)
+    resultado = calcular_metricas(filtrada, secoes=SECOES_RELATORIO)
+    return gravar_tabelas(montar_tabelas(resultado, _notas_pendentes(filtrada)), diretorio, nome, formato)
+
+
+def gerar_relatorios(base, diretorio, formato='excel', divisoes=(), data_inicio=None, data_fim=None,
+                     regra_sla=REGRA_SLA_PADRAO, processos=1, progresso=None):
+    """
+    Gera o relatório geral e os de cada divisão, em até `processos` processos paralelos.
+    A base é normalizada (com a regra de SLA) uma única vez e compartilhada com os processos
+    por uma cópia Parquet temporária. Retorna os caminhos gerados, na ordem dos relatórios.
+    """
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    # Tipada antes de montar os relatórios: as divisões usam os mesmos valores que os processos leem do Parquet
+    base = tipar_para_parquet(preparar_base(base, regra_sla))
+    relatorios = montar_relatorios(base, divisoes, data_inicio, data_fim)
+
+    with tempfile.TemporaryDirectory() as temporario:
+        caminho_base = Path(temporario) / 'base.parquet'
+        gravar_parquet_atomico(base, caminho_base)
+
+        if processos <= 1 or len(relatorios) == 1:
+            _iniciar_processo(caminho_base)
+            caminhos = []
+            for nome, filtro in relatorios:
+                caminhos.append(_gerar_relatorio(nome, filtro, diretorio, formato))
+                if progresso:
+                    progresso(nome, caminhos[-1])
+            return caminhos
+
+        with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo,
+                                 initargs=(caminho_base,)) as executor:
+            futuros = [executor.submit(_gerar_relatorio, nome, filtro, diretorio, formato) for nome, filtro in relatorios]
+            caminhos = []
+            for (nome, _), futuro in zip(relatorios, futuros):
+                caminhos.append(futuro.result())
+                if progresso:
+                    progresso(nome, caminhos[-1])
+            return caminhos
+
+
+def _data(texto):
+    """Data no formato AAAA-MM-DD (argumento da linha de comando)"""
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: {texto} (use AAAA-MM-DD)")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Gera o relatório de SLA sem abrir o dashboard.")
+    parser.add_argument('arquivos', nargs='*', help="Planilhas Excel com a aba 'Base'")
+    parser.add_argument('--historico', action='store_true', help="Usar o histórico local em vez de planilhas")
+    parser.add_argument('--saida', default='relatorios', help="Diretório de saída (padrão: relatorios)")
+    parser.add_argument('--formato', choices=FORMATOS, default='excel', help="Formato dos relatórios (padrão: excel)")
+    parser.add_argument('--por', choices=DIVISOES, action='append', default=[],
+                        help="Gerar também um relatório por BU e/ou por mês de faturamento (pode repetir)")
+    parser.add_argument('--inicio', type=_data, help="Início do período de faturamento (AAAA-MM-DD)")
+    parser.add_argument('--fim', type=_data, help="Fim do período de faturamento (AAAA-MM-DD)")
+    parser.add_argument('--tolerancia', type=int, default=0, help="Tolerância do SLA em dias (padrão: 0)")
+    parser.add_argument('--dias-uteis', action='store_true', help="Contar a tolerância em dias úteis")
+    parser.add_argument('--por-dia', action='store_true', help="Comparar apenas as datas, ignorando o horário")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                        help="Processos paralelos (padrão: número de CPUs)")
+    args = parser.parse_args(argumentos)
+
+    if not args.historico and not args.arquivos:
+        parser.error("informe as planilhas ou use --historico")
+    if (args.inicio is None) != (args.fim is None):
+        parser.error("informe --inicio e --fim juntos")
+
+    base = carregar_base(args.arquivos, args.historico)
+    if base is None or base.empty:
+        print("❌ Nenhum registro encontrado.", file=sys.stderr)
+        return 1
+
+    caminhos = gerar_relatorios(
+        base,
+        args.saida,
+        formato=args.formato,
+        divisoes=args.por,
+        data_inicio=args.inicio,
+        data_fim=args.fim,
+        regra_sla=(args.tolerancia, args.dias_uteis, args.por_dia),
+        processos=args.processos,
+        progresso=lambda nome, caminho: print(f"✅ {nome}: {caminho}")
+    )
+    print(f"📦 {len(caminhos)} relatório(s) gerado(s) em {args.saida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
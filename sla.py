@@ -1,9 +1,25 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+from agregados import AGRUPAMENTOS_ETAPAS, calcular_agregado, contar_valores
+from banco_analitico import (buscar_nf_sql, calcular_agregado_sql, caminho_banco, conectar, consultar_linhas, motor_disponivel,
+                              resumir_base, sincronizar_historico, suporta_regra, totais_sql)
+from busca_nf import MODOS_BUSCA, buscar_nf, construir_indice_nf
+from cubo import calcular_agregado_cubo, construir_cubo, cubo_responde
+from filtros import preparar_filtros
+from graficos import LIMITE_TRANSPORTADORAS_PERFORMANCE, classificar_sla, construir_grafico
+from historico import calcular_hash_historico, incorporar_arquivo, ler_historico, ler_manifesto, limpar_historico
+from indice_diario import totais_periodo
+from ingestao import ler_planilha, relatorio_memoria
+from instrumentacao import Medidor
+from metricas_sla import REGRA_SLA_PADRAO, FiltroBase, aplicar_filtro, preparar_base
+from preprocessamento import COLUNAS_DERIVADAS, normalizar_base
+
+# Copy-on-Write (padrão a partir do pandas 3): seleções e colunas derivadas nunca alteram
+# a base compartilhada entre as sessões
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # Configuração da página
 st.set_page_config(
@@ -12,18 +28,26 @@ st.set_page_config(
     layout="wide"
 )
 
+# Medição das etapas desta execução (exibida no painel de performance do sidebar)
+st.session_state['execucao'] = st.session_state.get('execucao', 0) + 1
+medidor = Medidor(st.session_state['execucao'])
+
+# Interrompe a execução no lugar de st.stop(), que descartaria o painel de performance desenhado no finally
+class ExecucaoInterrompida(Exception):
+    pass
+
 # Título da aplicação
 st.title("📦 Dashboard Transportes")
 st.markdown("---")
 
-# Função para ordenar meses cronologicamente
-def ordenar_meses(data_series):
-    """Ordena uma série de dados por meses na ordem cronológica correta"""
-    ordem_meses = ['JANEIRO', 'FEVEREIRO', 'MARÇO', 'ABRIL', 'MAIO', 'JUNHO', 
-                   'JULHO', 'AGOSTO', 'SETEMBRO', 'OUTUBRO', 'NOVEMBRO', 'DEZEMBRO']
-    
-    meses_presentes = [mes for mes in ordem_meses if mes in data_series.index]
-    return data_series.reindex(meses_presentes)
+# Seções principais do dashboard (apenas a selecionada é calculada a cada interação)
+SECOES = [
+    "📊 Dashboard Geral",
+    "📦 Volumetria",
+    "🎯 Performance SLA",
+    "🚨 Gestão de Pendências",
+    "🔍 Busca NF"
+]
 
 def ordenar_dataframe_por_meses(dataframe):
     """Ordena um DataFrame por meses na ordem cronológica correta"""
@@ -33,48 +57,29 @@ def ordenar_dataframe_por_meses(dataframe):
     meses_presentes = [mes for mes in ordem_meses if mes in dataframe.index]
     return dataframe.reindex(meses_presentes)
 
-def ajustar_posicao_texto(valores, threshold_percent=5):
-    """
-    Determina a posição e cor do texto baseado no tamanho dos valores.
-    Valores pequenos (< threshold_percent do máximo) ficam fora da barra em preto.
-    """
-    max_valor = max(valores) if valores else 1
-    threshold = max_valor * (threshold_percent / 100)
-    
-    posicoes = []
-    cores = []
-    
-    for valor in valores:
-        if valor < threshold:
-            posicoes.append('outside')
-            cores.append('black')
-        else:
-            posicoes.append('inside')
-            cores.append('white')
-    
-    return posicoes, cores
+# Formatos de exibição das tabelas (aplicados pelo navegador; os dados continuam numéricos)
+FORMATO_PERCENTUAL = "%.2f%%"
+FORMATO_MOEDA = "R$ %,.2f"
+FORMATO_QUANTIDADE = "%,d"
+
+def formatos_colunas(colunas, formato):
+    """column_config com o mesmo formato numérico para todas as colunas informadas"""
+    return {str(col): st.column_config.NumberColumn(format=formato) for col in colunas}
 
-def calcular_dias_uteis(data_inicio, data_fim):
+def resumos_por_bu(pivot, pivot_valor, coluna):
     """
-    Calcula o número de dias úteis entre duas datas
+    Resumo de cada BU do pivot (Sequência, `coluna` e Valor NF), montado a partir de uma
+    única cópia dos valores alinhada às linhas e colunas do pivot
     """
-    if pd.isna(data_inicio) or pd.isna(data_fim):
-        return None
-    
-    try:
-        # Converter para datetime se necessário
-        if isinstance(data_inicio, str):
-            data_inicio = pd.to_datetime(data_inicio, errors='coerce')
-        if isinstance(data_fim, str):
-            data_fim = pd.to_datetime(data_fim, errors='coerce')
-        
-        if pd.isna(data_inicio) or pd.isna(data_fim):
-            return None
-        
-        # Usar pandas para calcular dias úteis (excluindo sábados e domingos)
-        return pd.bdate_range(start=data_inicio, end=data_fim).shape[0] - 1
-    except:
-        return None
+    valores = pivot_valor.reindex(index=pivot.index, columns=pivot.columns).fillna(0)
+    return {
+        bu: pd.DataFrame({
+            'Sequência': pivot.index,
+            coluna: pivot[bu].to_numpy(),
+            'Valor NF': valores[bu].to_numpy()
+        })
+        for bu in pivot.columns if bu != 'Total Geral'
+    }
 
 def criar_timeline_entrega(row):
     """
@@ -97,23 +102,6 @@ def criar_timeline_entrega(row):
         except:
             return None
     
-    # Função para calcular diferença em dias corridos
-    def calcular_dias_corridos(data_inicio, data_fim):
-        if pd.isna(data_inicio) or pd.isna(data_fim):
-            return None
-        try:
-            if isinstance(data_inicio, str):
-                data_inicio = pd.to_datetime(data_inicio, errors='coerce')
-            if isinstance(data_fim, str):
-                data_fim = pd.to_datetime(data_fim, errors='coerce')
-            
-            if pd.isna(data_inicio) or pd.isna(data_fim):
-                return None
-            
-            return (data_fim - data_inicio).days
-        except:
-            return None
-    
     # Extrair e formatar as datas
     dt_implant = format_date_timeline(row.get('Dt Implant Ped'))
     dt_nota = format_date_timeline(row.get('Dt Nota Fiscal'))
@@ -121,43 +109,26 @@ def criar_timeline_entrega(row):
     dt_previsao = format_date_timeline(row.get('Previsão de Entrega'))
     dt_entrega = format_date_timeline(row.get('Data de Entrega'))
     
-    # Extrair datas para cálculos (sem formatação)
-    dt_nota_calc = pd.to_datetime(row.get('Dt Nota Fiscal'), errors='coerce')
-    dt_saida_calc = pd.to_datetime(row.get('Data de Saída'), errors='coerce')
-    dt_entrega_calc = pd.to_datetime(row.get('Data de Entrega'), errors='coerce')
-    
-    # Calcular durações
+    # Durações já calculadas para toda a base na normalização (adicionar_timeline)
     # 1. Nota Fiscal Emitida - usar coluna Dias Faturamento
     dias_faturamento = row.get('Dias Faturamento', None)
     duracao_nota = f"{int(dias_faturamento)} dias" if pd.notna(dias_faturamento) else None
     
     # 2. Mercadoria Despachada - Data da emissão da nota fiscal x data de saída
-    if pd.notna(dt_nota_calc) and pd.notna(dt_saida_calc):
-        dias_despacho = calcular_dias_corridos(dt_nota_calc, dt_saida_calc)
-        duracao_despacho = f"{dias_despacho} dias" if dias_despacho is not None else None
-    else:
-        dias_despacho = None
-        duracao_despacho = None
+    dias_despacho = row.get('Dias Despacho', None)
+    duracao_despacho = f"{int(dias_despacho)} dias" if pd.notna(dias_despacho) else None
     
     # 3. Previsão de Entrega - usar coluna Lead Time
     lead_time = row.get('Lead Time', None)
     duracao_previsao = f"{int(lead_time)} dias úteis" if pd.notna(lead_time) else None
     
     # 4. Entrega Realizada - Nota Fiscal Emitida até Entrega Realizada (DIAS ÚTEIS)
-    if pd.notna(dt_nota_calc) and pd.notna(dt_entrega_calc):
-        dias_uteis_total = calcular_dias_uteis(dt_nota_calc, dt_entrega_calc)
-        duracao_entrega = f"{dias_uteis_total} dias úteis" if dias_uteis_total is not None else None
-        
-        # Calcular também em dias corridos para a soma total
-        dias_corridos_entrega = calcular_dias_corridos(dt_nota_calc, dt_entrega_calc)
-    else:
-        duracao_entrega = None
-        dias_corridos_entrega = None
+    dias_uteis_total = row.get('Dias Úteis Entrega', None)
+    duracao_entrega = f"{int(dias_uteis_total)} dias úteis" if pd.notna(dias_uteis_total) else None
     
-    # Calcular soma total real (dias corridos)
-    soma_real_dias = None
-    if pd.notna(dias_faturamento) and dias_despacho is not None and dias_corridos_entrega is not None:
-        soma_real_dias = int(dias_faturamento) + dias_despacho + dias_corridos_entrega
+    # Soma total real (dias corridos): Faturamento + Despacho + Entrega
+    tempo_total = row.get('Tempo Total', None)
+    soma_real_dias = int(tempo_total) if pd.notna(tempo_total) else None
     
     # Definir etapas da timeline com durações
     etapas = [
@@ -200,1104 +171,1048 @@ def criar_timeline_entrega(row):
     
     return etapas, soma_real_dias
 
-# Função para carregar dados do arquivo carregado
-@st.cache_data
-def load_data_from_upload(uploaded_file):
+# Base normalizada do histórico, compartilhada (somente leitura) por todas as sessões
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_data_from_historico(hash_historico):
     try:
-        df = pd.read_excel(uploaded_file, sheet_name='Base')
-        return df
+        # Lê as partes colunares do histórico (planilhas já incorporadas não são lidas de novo)
+        df = ler_historico()
+        # Normalização única: datas tipadas e indicadores de entrega usados por todas as abas
+        return normalizar_base(df)
     except Exception as e:
-        st.error(f"Erro ao carregar o arquivo: {e}")
+        st.error(f"Erro ao carregar o histórico: {e}")
         return None
 
+# Base com os indicadores de prazo pela regra de SLA escolhida; as demais colunas
+# continuam compartilhadas com a base normalizada (Copy-on-Write)
+@st.cache_resource(max_entries=8, show_spinner=False)
+def obter_base_com_regra(hash_historico, regra_sla=REGRA_SLA_PADRAO):
+    base = load_data_from_historico(hash_historico)
+    if base is None:
+        return base
+    return preparar_base(base, regra_sla)
+
+# Índice de busca de NFs, construído uma única vez por arquivo carregado
+@st.cache_resource(max_entries=4)
+def obter_indice_nf(hash_arquivo, _sla):
+    return construir_indice_nf(_sla)
+
+# Códigos das dimensões e datas em dias usados pelos filtros globais, preparados uma vez por arquivo
+@st.cache_resource(max_entries=4)
+def obter_filtros_preparados(hash_arquivo, _sla):
+    return preparar_filtros(_sla)
+
+# Uso de memória por coluna da base carregada (exibido no preview)
+@st.cache_data(max_entries=4, show_spinner=False)
+def obter_relatorio_memoria(hash_arquivo, _sla):
+    return relatorio_memoria(_sla)
+
+# Cubo pré-agregado da base, montado uma vez por arquivo e regra de SLA
+@st.cache_resource(max_entries=4, show_spinner=False)
+def obter_cubo(hash_arquivo, regra_sla, _sla):
+    return construir_cubo(_sla)
+
+# Agregados de cada seção, memorizados por base + estado dos filtros (LRU: descarta os menos usados).
+# Filtros em meses inteiros são respondidos pelo cubo; os demais, pelas linhas filtradas
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_agregado(secao, chave, _sla, _cubo=None, _filtro=None):
+    if _cubo is not None and cubo_responde(_cubo, _filtro):
+        return calcular_agregado_cubo(secao, _cubo, _filtro)
+    return calcular_agregado(secao, _sla)
+
+# Banco analítico local, sincronizado com o histórico uma vez por conteúdo do histórico
+@st.cache_resource(max_entries=1)
+def obter_banco_analitico(hash_historico):
+    caminho = caminho_banco()
+    conexao = conectar(caminho)
+    try:
+        sincronizar_historico(conexao)
+    finally:
+        conexao.close()
+    return caminho
+
+# Agregados calculados por SQL no banco analítico (filtros aplicados no WHERE)
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_agregado_sql(secao, chave, _caminho, _filtro):
+    return calcular_agregado_sql(
+        secao, _caminho, _filtro.como_dicionario(), _filtro.data_inicio, _filtro.data_fim, _filtro.regra_sla
+    )
+
+# Resumo da base no banco analítico (colunas, opções dos filtros, período), uma vez por conteúdo do histórico
+@st.cache_data(max_entries=4, show_spinner=False)
+def obter_resumo_sql(hash_historico, _caminho):
+    return resumir_base(_caminho)
+
+# Quantidade de NFs e Valor NF por SQL, memorizados por base + estado dos filtros
+@st.cache_data(max_entries=64, show_spinner=False)
+def obter_totais_sql(chave, _caminho, _filtro):
+    return totais_sql(_caminho, _filtro.como_dicionario(), _filtro.data_inicio, _filtro.data_fim)
+
+# Figuras Plotly memorizadas por agregado (base + filtros) e opções do gráfico: um gráfico
+# sem mudanças reaproveita a figura já montada e validada
+@st.cache_resource(max_entries=64, show_spinner=False)
+def obter_grafico(nome, chave, opcoes, _dados):
+    return construir_grafico(nome, _dados, **dict(opcoes))
+
 # ===== SISTEMA DE UPLOAD DE ARQUIVO (SIDEBAR) =====
 st.sidebar.header("📁 Carregamento de Dados")
-st.sidebar.markdown("Faça upload do arquivo Excel:")
+st.sidebar.markdown("Faça upload dos arquivos Excel (um ou mais meses):")
 
-uploaded_file = st.sidebar.file_uploader(
-    "Selecione o arquivo Excel (.xlsx)",
+uploaded_files = st.sidebar.file_uploader(
+    "Selecione os arquivos Excel (.xlsx)",
     type=['xlsx', 'xls'],
-    help="Arquivo deve conter uma planilha chamada 'Base' com os dados de SLA"
+    accept_multiple_files=True,
+    key=f"uploader_{st.session_state.get('versao_uploader', 0)}",
+    help="Cada arquivo deve conter uma planilha chamada 'Base' com os dados de SLA. "
+         "Os arquivos são acumulados no histórico; uma NF repetida (Numero + Seq. De Fat) passa a valer na versão do último arquivo enviado."
 )
 
-# Inicializar variável sla
-sla = None
+# Regra de classificação das entregas no prazo / atrasadas
+with st.sidebar.expander("⏱️ Regra de SLA"):
+    tolerancia_sla = st.number_input(
+        "Tolerância após a previsão (dias):",
+        min_value=0,
+        max_value=10,
+        value=0,
+        step=1,
+        help="Ex.: 1 = entregas até D+1 da Previsão de Entrega contam como no prazo"
+    )
+    tolerancia_dias_uteis = st.checkbox(
+        "Contar tolerância em dias úteis",
+        value=False,
+        help="Desconsidera fins de semana e os feriados nacionais e estaduais (UF de destino da NF) ao somar a tolerância"
+    )
+    comparar_por_dia = st.checkbox(
+        "Comparar apenas a data (ignorar horário)",
+        value=False,
+        help="Entregas no mesmo dia da previsão contam como no prazo, independente do horário"
+    )
+regra_sla = (int(tolerancia_sla), tolerancia_dias_uteis, comparar_por_dia)
 
-if uploaded_file is not None:
-    # Carregar dados com spinner
-    with st.spinner("Processando arquivo... Por favor, aguarde."):
-        sla = load_data_from_upload(uploaded_file)
+# Motor dos agregados: pandas (em memória) ou banco analítico local
+usar_banco_analitico = st.sidebar.checkbox(
+    f"🗄️ Calcular agregados no banco local ({motor_disponivel()})",
+    value=False,
+    help="Filtros, KPIs, rankings, contagens, performance, pendências e a Busca NF são consultados por SQL "
+         "sobre o histórico, sem carregar a base em memória. Tolerância em dias úteis usa sempre o pandas."
+)
+
+# Tempo e memória de cada etapa desta execução, exportáveis para anexar a chamados
+mostrar_performance = st.sidebar.checkbox(
+    "⏱️ Painel de performance",
+    value=False,
+    help="Mostra quanto tempo e memória cada etapa (leitura, filtros, agregados, gráficos) consumiu nesta execução"
+)
+# Placeholder do painel: redesenhado ao fim de cada execução e pelas reexecuções do fragmento da Busca NF
+painel_performance = st.sidebar.empty()
+
+# ===== PAINEL DE PERFORMANCE (SIDEBAR) =====
+def mostrar_painel_performance(medidor_execucao):
+    if not mostrar_performance:
+        return
+    with painel_performance.container(), st.expander("⏱️ Performance desta execução", expanded=True):
+        st.metric("⏱️ Tempo total", f"{medidor_execucao.duracao_total():,.0f} ms")
+        perfil = medidor_execucao.como_dataframe()
+        perfil['Etapa'] = ['\u2003' * nivel + etapa for etapa, nivel in zip(perfil['Etapa'], perfil['Nível'])]
+        st.dataframe(
+            perfil.drop(columns='Nível'),
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                'Início (ms)': st.column_config.NumberColumn(format="%.0f"),
+                'Duração (ms)': st.column_config.NumberColumn(format="%.1f"),
+            }
+        )
+        col_json, col_csv = st.columns(2)
+        with col_json:
+            st.download_button(
+                "📄 JSON",
+                medidor_execucao.como_json(),
+                file_name=f"perfil_execucao_{medidor_execucao.execucao}.json",
+                mime="application/json"
+            )
+        with col_csv:
+            st.download_button(
+                "📊 CSV",
+                medidor_execucao.como_csv(),
+                file_name=f"perfil_execucao_{medidor_execucao.execucao}.csv",
+                mime="text/csv"
+            )
+
+# Execuções interrompidas (sem histórico, filtros sem registros) também exibem o painel
+execucao_concluida = False
+try:
+    # Inicializar variável sla (base em memória) e o banco analítico (quando os dados são consultados por SQL)
+    sla = None
+    caminho_banco_analitico = None
+    resumo_sql = None
+
+    # Incorporar ao histórico apenas os arquivos ainda não processados
+    arquivos_com_erro = []
+    if uploaded_files:
+        barra_leitura = st.empty()
+        for arquivo in uploaded_files:
+            def mostrar_progresso(linhas_lidas, total_estimado, nome=arquivo.name):
+                # Planilhas grandes são lidas em blocos: a barra avança a cada bloco
+                fracao = min(linhas_lidas / total_estimado, 1.0) if total_estimado else 1.0
+                barra_leitura.progress(fracao, text=f"📥 Lendo {nome}: {linhas_lidas:,} linhas")
+
+            try:
+                with st.spinner("Processando arquivo... Por favor, aguarde."), medidor.etapa(f"📥 Ingestão: {arquivo.name}"):
+                    incorporar_arquivo(arquivo, lambda a: ler_planilha(a, progresso=mostrar_progresso))
+            except Exception as e:
+                arquivos_com_erro.append(arquivo.name)
+                st.error(f"Erro ao carregar o arquivo {arquivo.name}: {e}")
+        barra_leitura.empty()
+
+    manifesto_historico = ler_manifesto()
+
+    if manifesto_historico['arquivos']:
+        hash_historico = calcular_hash_historico(manifesto_historico)
+        if usar_banco_analitico and suporta_regra(regra_sla):
+            # Banco analítico: o histórico fica no banco e só resumos, agregados e linhas com LIMIT chegam ao pandas
+            with st.spinner("Sincronizando banco analítico... Por favor, aguarde."), medidor.etapa("🗄️ Sincronizar banco"):
+                caminho_banco_analitico = obter_banco_analitico(hash_historico)
+                resumo_sql = obter_resumo_sql(hash_historico, caminho_banco_analitico)
+        else:
+            # Carregar dados com spinner
+            with st.spinner("Carregando histórico... Por favor, aguarde."), medidor.etapa("📚 Carregar base"):
+                sla = obter_base_com_regra(hash_historico, regra_sla)
     
-    if sla is not None:
-        # Mostrar validação no sidebar
-        st.sidebar.markdown("---")
-        st.sidebar.success("✅ Dados carregados!")
-        st.sidebar.metric("📊 Registros", f"{len(sla):,}")
+        base_disponivel = sla is not None or resumo_sql is not None
+        if base_disponivel:
+            colunas_base = list(sla.columns) if sla is not None else resumo_sql['colunas']
+            total_registros = len(sla) if sla is not None else resumo_sql['total']
         
-        # Mostrar preview e validação completa no main
-        with st.expander("👀 Visualizar Preview e Validação dos Dados"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("📊 Total de Registros", f"{len(sla):,}")
-            with col2:
-                st.metric("📋 Total de Colunas", len(sla.columns))
-            with col3:
-                # Verificar período dos dados
-                if 'Dt Nota Fiscal' in sla.columns:
-                    try:
-                        sla_temp = sla.copy()
-                        sla_temp['Dt Nota Fiscal'] = pd.to_datetime(sla_temp['Dt Nota Fiscal'], errors='coerce')
-                        periodo = f"{sla_temp['Dt Nota Fiscal'].min().strftime('%m/%Y')} - {sla_temp['Dt Nota Fiscal'].max().strftime('%m/%Y')}"
-                        st.metric("📅 Período", periodo)
-                    except:
-                        st.metric("📅 Período", "N/A")
+            # Mostrar validação no sidebar
+            st.sidebar.markdown("---")
+            st.sidebar.success("✅ Dados carregados!")
+            st.sidebar.metric("📊 Registros", f"{total_registros:,}")
+        
+            # Arquivos que compõem o histórico
+            with st.sidebar.expander(f"📚 Histórico ({len(manifesto_historico['arquivos'])} arquivo(s))"):
+                for registro in manifesto_historico['arquivos']:
+                    atualizados = registro.get('linhas_atualizadas', 0)
+                    st.markdown(
+                        f"• **{registro['nome']}**: {registro['linhas_novas']:,} de {registro['linhas_lidas']:,} registros novos"
+                        + (f" · {atualizados:,} atualizados" if atualizados else '')
+                    )
+                st.caption("⚠️ O histórico é único no servidor e compartilhado por todos os usuários do dashboard.")
+                if not st.session_state.get('confirmar_limpeza'):
+                    if st.button("🗑️ Limpar histórico", help="Remove todos os arquivos acumulados, para todos os usuários"):
+                        st.session_state['confirmar_limpeza'] = True
+                        st.rerun()
+                else:
+                    st.warning("Remover o histórico de todos os usuários? Os arquivos precisarão ser enviados de novo.")
+                    col_confirmar, col_cancelar = st.columns(2)
+                    if col_confirmar.button("✅ Confirmar", type="primary"):
+                        limpar_historico()
+                        # Só os caches do histórico; os derivados (filtros, cubo, agregados) usam o hash dele na chave e expiram pelo LRU
+                        load_data_from_historico.clear()
+                        obter_base_com_regra.clear()
+                        obter_banco_analitico.clear()
+                        st.session_state['confirmar_limpeza'] = False
+                        st.session_state['versao_uploader'] = st.session_state.get('versao_uploader', 0) + 1
+                        st.rerun()
+                    if col_cancelar.button("❌ Cancelar"):
+                        st.session_state['confirmar_limpeza'] = False
+                        st.rerun()
+        
+            # Mostrar preview e validação completa no main
+            with st.expander("👀 Visualizar Preview e Validação dos Dados"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("📊 Total de Registros", f"{total_registros:,}")
+                with col2:
+                    st.metric("📋 Total de Colunas", len([col for col in colunas_base if col not in COLUNAS_DERIVADAS]))
+                with col3:
+                    # Verificar período dos dados
+                    if 'Dt Nota Fiscal' in colunas_base:
+                        try:
+                            if sla is not None:
+                                inicio_base, fim_base = sla['Dt Nota Fiscal'].min(), sla['Dt Nota Fiscal'].max()
+                            else:
+                                inicio_base, fim_base = resumo_sql['data_min'], resumo_sql['data_max']
+                            periodo = f"{inicio_base.strftime('%m/%Y')} - {fim_base.strftime('%m/%Y')}"
+                            st.metric("📅 Período", periodo)
+                        except:
+                            st.metric("📅 Período", "N/A")
             
-            # Validação das colunas essenciais
-            st.markdown("### 🔍 Validação das Colunas")
-            colunas_essenciais = [
-                'Numero', 'Status', 'Transportador', 'Data de Entrega', 
-                'Previsão de Entrega', 'Dt Nota Fiscal', 'Unid Negoc',
-                'Receita', 'Seq. De Fat', 'Valor NF'
-            ]
+                # Validação das colunas essenciais
+                st.markdown("### 🔍 Validação das Colunas")
+                colunas_essenciais = [
+                    'Numero', 'Status', 'Transportador', 'Data de Entrega', 
+                    'Previsão de Entrega', 'Dt Nota Fiscal', 'Unid Negoc',
+                    'Receita', 'Seq. De Fat', 'Valor NF'
+                ]
             
-            col_val1, col_val2 = st.columns(2)
+                col_val1, col_val2 = st.columns(2)
             
-            with col_val1:
-                st.markdown("**✅ Colunas Encontradas:**")
-                colunas_encontradas = [col for col in colunas_essenciais if col in sla.columns]
-                for col in colunas_encontradas:
-                    st.markdown(f"✅ {col}")
+                with col_val1:
+                    st.markdown("**✅ Colunas Encontradas:**")
+                    colunas_encontradas = [col for col in colunas_essenciais if col in colunas_base]
+                    for col in colunas_encontradas:
+                        st.markdown(f"✅ {col}")
             
-            with col_val2:
-                st.markdown("**⚠️ Colunas Faltantes:**")
-                colunas_faltantes = [col for col in colunas_essenciais if col not in sla.columns]
-                if colunas_faltantes:
-                    for col in colunas_faltantes:
-                        st.markdown(f"⚠️ {col}")
+                with col_val2:
+                    st.markdown("**⚠️ Colunas Faltantes:**")
+                    colunas_faltantes = [col for col in colunas_essenciais if col not in colunas_base]
+                    if colunas_faltantes:
+                        for col in colunas_faltantes:
+                            st.markdown(f"⚠️ {col}")
+                    else:
+                        st.markdown("🎯 Todas as colunas essenciais estão presentes!")
+            
+                # Preview dos dados
+                st.markdown("### 📋 Preview dos Dados")
+                if sla is not None:
+                    st.dataframe(sla.head(), use_container_width=True)
                 else:
-                    st.markdown("🎯 Todas as colunas essenciais estão presentes!")
+                    st.dataframe(consultar_linhas(caminho_banco_analitico, limite=5), use_container_width=True)
             
-            # Preview dos dados
-            st.markdown("### 📋 Preview dos Dados")
-            st.dataframe(sla.head(), use_container_width=True)
+                # Memória ocupada pela base (colunas categóricas guardam códigos inteiros)
+                st.markdown("### 🧠 Uso de Memória")
+                if sla is not None:
+                    memoria = obter_relatorio_memoria(sla.attrs.get('hash_arquivo'), sla)
+                    col_mem1, col_mem2 = st.columns(2)
+                    with col_mem1:
+                        st.metric("💾 Memória da Base", f"{memoria['Memória (MB)'].sum():,.1f} MB")
+                    with col_mem2:
+                        st.metric(
+                            "🗜️ Economia das Categorias",
+                            f"{memoria['Como texto (MB)'].sum() - memoria['Memória (MB)'].sum():,.1f} MB"
+                        )
+                    st.dataframe(
+                        memoria.sort_values('Memória (MB)', ascending=False),
+                        use_container_width=True,
+                        column_config={
+                            'Memória (MB)': st.column_config.NumberColumn(format="%.2f"),
+                            'Como texto (MB)': st.column_config.NumberColumn(format="%.2f"),
+                        }
+                    )
+                else:
+                    st.info(f"🗄️ A base é consultada no banco local ({motor_disponivel()}): o histórico não é carregado em memória.")
             
-            # Lista todas as colunas disponíveis
-            st.markdown("### 📋 Todas as Colunas Disponíveis")
-            cols_per_row = 3
-            colunas_lista = list(sla.columns)
-            for i in range(0, len(colunas_lista), cols_per_row):
-                cols = st.columns(cols_per_row)
-                for j, col_name in enumerate(colunas_lista[i:i+cols_per_row]):
-                    if j < len(cols):
-                        cols[j].markdown(f"• **{col_name}**")
+                # Lista todas as colunas disponíveis
+                st.markdown("### 📋 Todas as Colunas Disponíveis")
+                cols_per_row = 3
+                colunas_lista = [col for col in colunas_base if col not in COLUNAS_DERIVADAS]
+                for i in range(0, len(colunas_lista), cols_per_row):
+                    cols = st.columns(cols_per_row)
+                    for j, col_name in enumerate(colunas_lista[i:i+cols_per_row]):
+                        if j < len(cols):
+                            cols[j].markdown(f"• **{col_name}**")
         
-        st.markdown("---")
-    else:
+            st.markdown("---")
+        else:
+            st.error("❌ Não foi possível processar o arquivo. Verifique se:")
+            st.markdown("""
+            - O arquivo é um Excel válido (.xlsx ou .xls)
+            - Existe uma planilha chamada **'Base'**
+            - A planilha contém dados no formato esperado
+            """)
+            raise ExecucaoInterrompida
+    elif arquivos_com_erro:
         st.error("❌ Não foi possível processar o arquivo. Verifique se:")
         st.markdown("""
         - O arquivo é um Excel válido (.xlsx ou .xls)
         - Existe uma planilha chamada **'Base'**
         - A planilha contém dados no formato esperado
         """)
-        st.stop()
-else:
-    # Instruções para o usuário
-    st.info("👈 Faça upload do arquivo Excel no menu lateral para começar a análise")
-    st.stop()
+        raise ExecucaoInterrompida
+    else:
+        # Instruções para o usuário
+        st.info("👈 Faça upload do arquivo Excel no menu lateral para começar a análise")
+        raise ExecucaoInterrompida
 
-if sla is not None:
-    # ===== FILTROS GLOBAIS NO SIDEBAR =====
-    st.sidebar.markdown("---")
-    st.sidebar.header("🔧 Filtros Globais")
-    st.sidebar.markdown("Filtros aplicados a todas as análises:")
+    if base_disponivel:
+        # ===== FILTROS GLOBAIS NO SIDEBAR =====
+        st.sidebar.markdown("---")
+        st.sidebar.header("🔧 Filtros Globais")
+        st.sidebar.markdown("Filtros aplicados a todas as análises:")
     
-    # Converter coluna de data para datetime se necessário
-    try:
-        sla['Dt Nota Fiscal'] = pd.to_datetime(sla['Dt Nota Fiscal'], errors='coerce')
-    except:
-        pass
+        if resumo_sql is not None:
+            # Opções e período já consultados no banco (mesmo formato de preparar_filtros)
+            hash_arquivo = hash_historico
+            filtros_preparados = resumo_sql
+        else:
+            hash_arquivo = sla.attrs.get('hash_arquivo')
+            with medidor.etapa("🔧 Preparar filtros"):
+                filtros_preparados = obter_filtros_preparados(hash_arquivo, sla) if hash_arquivo else preparar_filtros(sla)
+        dimensoes_filtro = filtros_preparados['dimensoes']
     
-    # Filtro por BU (multiselect)
-    if 'Unid Negoc' in sla.columns:
-        # Remover BUs específicas da análise (070, 080, 720)
-        bus_excluidas = []
-        todas_bus = sla['Unid Negoc'].dropna().unique().tolist()
-        bus_disponiveis = sorted([bu for bu in todas_bus if str(bu) not in bus_excluidas])
-        bus_selecionadas = st.sidebar.multiselect(
-            "🏢 Unidade de Negócio (BU):",
-            options=bus_disponiveis,
-            default=[],  # Todas selecionadas por padrão (exceto as excluídas)
-            help="Selecione uma ou mais BUs. Vazio = todas as BUs. BUs 070, 080 e 720 foram excluídas da análise."
-        )
-        # Se nenhuma selecionada, usar todas
-        if not bus_selecionadas:
-            bus_selecionadas = bus_disponiveis
-    else:
-        bus_selecionadas = []
+        # Filtro por BU (multiselect)
+        if 'Unid Negoc' in colunas_base:
+            # Remover BUs específicas da análise (070, 080, 720)
+            bus_excluidas = []
+            todas_bus = dimensoes_filtro['Unid Negoc']['opcoes']
+            bus_disponiveis = [bu for bu in todas_bus if str(bu) not in bus_excluidas]
+            bus_selecionadas = st.sidebar.multiselect(
+                "🏢 Unidade de Negócio (BU):",
+                options=bus_disponiveis,
+                default=[],  # Todas selecionadas por padrão (exceto as excluídas)
+                help="Selecione uma ou mais BUs. Vazio = todas as BUs. BUs 070, 080 e 720 foram excluídas da análise."
+            )
+            # Se nenhuma selecionada, usar todas
+            if not bus_selecionadas:
+                bus_selecionadas = bus_disponiveis
+        else:
+            bus_selecionadas = []
     
-    # Filtro por Data de Faturamento
-    if 'Dt Nota Fiscal' in sla.columns and sla['Dt Nota Fiscal'].notna().any():
-        # Obter datas mínima e máxima
-        data_min = sla['Dt Nota Fiscal'].min().date()
-        data_max = sla['Dt Nota Fiscal'].max().date()
+        # Filtro por Data de Faturamento
+        if filtros_preparados['data_min'] is not None:
+            # Obter datas mínima e máxima
+            data_min = filtros_preparados['data_min']
+            data_max = filtros_preparados['data_max']
         
-        # Date range picker
-        st.sidebar.markdown("📅 **Período de Faturamento:**")
-        data_inicio = st.sidebar.date_input(
-            "Data inicial:",
-            value=data_min,
-            min_value=data_min,
-            max_value=data_max
-        )
-        data_fim = st.sidebar.date_input(
-            "Data final:",
-            value=data_max,
-            min_value=data_min,
-            max_value=data_max
-        )
+            # Date range picker
+            st.sidebar.markdown("📅 **Período de Faturamento:**")
+            data_inicio = st.sidebar.date_input(
+                "Data inicial:",
+                value=data_min,
+                min_value=data_min,
+                max_value=data_max
+            )
+            data_fim = st.sidebar.date_input(
+                "Data final:",
+                value=data_max,
+                min_value=data_min,
+                max_value=data_max
+            )
         
-        # Validar se data_inicio <= data_fim
-        if data_inicio > data_fim:
-            st.sidebar.error("❌ Data inicial deve ser menor ou igual à data final!")
-            data_inicio = data_min
-            data_fim = data_max
-    else:
-        data_inicio = None
-        data_fim = None
-    
-    # Filtro por Transportadora (multiselect)
-    if 'Transportador' in sla.columns:
-        transportadoras_disponiveis = sorted(sla['Transportador'].dropna().unique().tolist())
-        transportadoras_selecionadas = st.sidebar.multiselect(
-            "🚚 Transportadora:",
-            options=transportadoras_disponiveis,
-            default=[],  # Todas selecionadas por padrão
-            help="Selecione uma ou mais transportadoras. Vazio = todas as transportadoras."
-        )
-        # Se nenhuma selecionada, usar todas
-        if not transportadoras_selecionadas:
-            transportadoras_selecionadas = transportadoras_disponiveis
-    else:
-        transportadoras_selecionadas = []
-    
-    # Filtro por Status (multiselect)
-    if 'Status' in sla.columns:
-        status_disponiveis = sorted(sla['Status'].dropna().unique().tolist())
-        status_selecionados = st.sidebar.multiselect(
-            "📋 Status:",
-            options=status_disponiveis,
-            default=[],  # Todos selecionados por padrão
-            help="Selecione um ou mais status. Vazio = todos os status."
-        )
-        # Se nenhum selecionado, usar todos
-        if not status_selecionados:
-            status_selecionados = status_disponiveis
-    else:
-        status_selecionados = []
+            # Validar se data_inicio <= data_fim
+            if data_inicio > data_fim:
+                st.sidebar.error("❌ Data inicial deve ser menor ou igual à data final!")
+                data_inicio = data_min
+                data_fim = data_max
+        
+            # Totais do período direto do índice diário (sem varrer a base) ou do banco
+            if resumo_sql is not None:
+                filtro_periodo = FiltroBase.criar(None, data_inicio, data_fim)
+                totais_periodo_selecionado = obter_totais_sql(filtro_periodo.chave(hash_arquivo), caminho_banco_analitico, filtro_periodo)
+            else:
+                totais_periodo_selecionado = totais_periodo(filtros_preparados['indice_diario'], data_inicio, data_fim)
+            st.sidebar.caption(
+                f"🧾 {totais_periodo_selecionado['registros']:,} NFs no período".replace(",", ".")
+                + (f" · 💰 R$ {totais_periodo_selecionado['somas']['Valor NF']:,.2f}"
+                   if 'Valor NF' in totais_periodo_selecionado['somas'] else "")
+            )
+        else:
+            data_inicio = None
+            data_fim = None
     
-    # Aplicar filtros aos dados
-    # Manter uma cópia dos dados originais para a busca de nota fiscal
-    sla_original = sla.copy()
-    sla_filtrado = sla.copy()
+        # Filtro por Transportadora (multiselect)
+        if 'Transportador' in colunas_base:
+            transportadoras_disponiveis = dimensoes_filtro['Transportador']['opcoes']
+            transportadoras_selecionadas = st.sidebar.multiselect(
+                "🚚 Transportadora:",
+                options=transportadoras_disponiveis,
+                default=[],  # Todas selecionadas por padrão
+                help="Selecione uma ou mais transportadoras. Vazio = todas as transportadoras."
+            )
+            # Se nenhuma selecionada, usar todas
+            if not transportadoras_selecionadas:
+                transportadoras_selecionadas = transportadoras_disponiveis
+        else:
+            transportadoras_selecionadas = []
     
-    # Aplicar filtro de BU (multiselect)
-    if bus_selecionadas and len(bus_selecionadas) < len(bus_disponiveis if 'Unid Negoc' in sla.columns else []):
-        sla_filtrado = sla_filtrado[sla_filtrado['Unid Negoc'].isin(bus_selecionadas)]
+        # Filtro por Status (multiselect)
+        if 'Status' in colunas_base:
+            status_disponiveis = dimensoes_filtro['Status']['opcoes']
+            status_selecionados = st.sidebar.multiselect(
+                "📋 Status:",
+                options=status_disponiveis,
+                default=[],  # Todos selecionados por padrão
+                help="Selecione um ou mais status. Vazio = todos os status."
+            )
+            # Se nenhum selecionado, usar todos
+            if not status_selecionados:
+                status_selecionados = status_disponiveis
+        else:
+            status_selecionados = []
     
-    # Aplicar filtro de data
-    if data_inicio is not None and data_fim is not None:
-        sla_filtrado = sla_filtrado[
-            (sla_filtrado['Dt Nota Fiscal'].dt.date >= data_inicio) &
-            (sla_filtrado['Dt Nota Fiscal'].dt.date <= data_fim)
-        ]
+        # Aplicar filtros aos dados
+        # Os dados originais (sem filtros) continuam disponíveis para a busca de nota fiscal
+        sla_original = sla
     
-    # Aplicar filtro de transportadora (multiselect)
-    if transportadoras_selecionadas and len(transportadoras_selecionadas) < len(transportadoras_disponiveis if 'Transportador' in sla.columns else []):
-        sla_filtrado = sla_filtrado[sla_filtrado['Transportador'].isin(transportadoras_selecionadas)]
+        # Apenas seleções parciais filtram (seleção vazia = todos os valores)
+        selecoes = {}
+        if bus_selecionadas and len(bus_selecionadas) < len(bus_disponiveis if 'Unid Negoc' in colunas_base else []):
+            selecoes['Unid Negoc'] = bus_selecionadas
+        if transportadoras_selecionadas and len(transportadoras_selecionadas) < len(transportadoras_disponiveis if 'Transportador' in colunas_base else []):
+            selecoes['Transportador'] = transportadoras_selecionadas
+        if status_selecionados and len(status_selecionados) < len(status_disponiveis if 'Status' in colunas_base else []):
+            selecoes['Status'] = status_selecionados
     
-    # Aplicar filtro de status (multiselect)
-    if status_selecionados and len(status_selecionados) < len(status_disponiveis if 'Status' in sla.columns else []):
-        sla_filtrado = sla_filtrado[sla_filtrado['Status'].isin(status_selecionados)]
+        # Uma única máscara combinando BU, período, transportadora e status
+        filtro = FiltroBase.criar(selecoes, data_inicio, data_fim, regra_sla)
+        with medidor.etapa("🔧 Aplicar filtros"):
+            if resumo_sql is not None:
+                # No banco, os filtros viram o WHERE de cada consulta; aqui basta a quantidade de registros
+                sla_filtrado = None
+                registros_filtrados = obter_totais_sql(filtro.chave(hash_arquivo), caminho_banco_analitico, filtro)['registros']
+            else:
+                sla_filtrado = aplicar_filtro(sla, filtro, filtros_preparados)
+                registros_filtrados = len(sla_filtrado)
     
-    # Mostrar informações dos dados filtrados
-    registros_filtrados = len(sla_filtrado)
-    if registros_filtrados != len(sla):
-        st.sidebar.markdown("---")
-        st.sidebar.markdown("📊 **Dados Filtrados:**")
-        st.sidebar.metric("📋 Registros", f"{registros_filtrados:,}".replace(",", "."))
-        st.sidebar.metric("📉 Redução", f"{((len(sla) - registros_filtrados) / len(sla) * 100):.1f}%")
+        # Mostrar informações dos dados filtrados
+        if registros_filtrados != total_registros:
+            st.sidebar.markdown("---")
+            st.sidebar.markdown("📊 **Dados Filtrados:**")
+            st.sidebar.metric("📋 Registros", f"{registros_filtrados:,}".replace(",", "."))
+            st.sidebar.metric("📉 Redução", f"{((total_registros - registros_filtrados) / total_registros * 100):.1f}%")
         
-        # Mostrar filtros ativos
-        st.sidebar.markdown("**🔍 Filtros Ativos:**")
+            # Mostrar filtros ativos
+            st.sidebar.markdown("**🔍 Filtros Ativos:**")
         
-        # BUs selecionadas
-        if bus_selecionadas and len(bus_selecionadas) < len(bus_disponiveis if 'Unid Negoc' in sla.columns else []):
-            if len(bus_selecionadas) <= 3:
-                st.sidebar.markdown(f"🏢 **BUs:** {', '.join(bus_selecionadas)}")
-            else:
-                st.sidebar.markdown(f"🏢 **BUs:** {len(bus_selecionadas)} selecionadas")
+            # BUs selecionadas
+            if bus_selecionadas and len(bus_selecionadas) < len(bus_disponiveis if 'Unid Negoc' in colunas_base else []):
+                if len(bus_selecionadas) <= 3:
+                    st.sidebar.markdown(f"🏢 **BUs:** {', '.join(bus_selecionadas)}")
+                else:
+                    st.sidebar.markdown(f"🏢 **BUs:** {len(bus_selecionadas)} selecionadas")
         
-        # Período selecionado
-        if data_inicio and data_fim:
-            st.sidebar.markdown(f"📅 **Período:** {data_inicio.strftime('%d/%m/%Y')} - {data_fim.strftime('%d/%m/%Y')}")
+            # Período selecionado
+            if data_inicio and data_fim:
+                st.sidebar.markdown(f"📅 **Período:** {data_inicio.strftime('%d/%m/%Y')} - {data_fim.strftime('%d/%m/%Y')}")
         
-        # Transportadoras selecionadas
-        if transportadoras_selecionadas and len(transportadoras_selecionadas) < len(transportadoras_disponiveis if 'Transportador' in sla.columns else []):
-            if len(transportadoras_selecionadas) <= 3:
-                st.sidebar.markdown(f"🚚 **Transportadoras:** {', '.join(transportadoras_selecionadas)}")
-            else:
-                st.sidebar.markdown(f"🚚 **Transportadoras:** {len(transportadoras_selecionadas)} selecionadas")
+            # Transportadoras selecionadas
+            if transportadoras_selecionadas and len(transportadoras_selecionadas) < len(transportadoras_disponiveis if 'Transportador' in colunas_base else []):
+                if len(transportadoras_selecionadas) <= 3:
+                    st.sidebar.markdown(f"🚚 **Transportadoras:** {', '.join(transportadoras_selecionadas)}")
+                else:
+                    st.sidebar.markdown(f"🚚 **Transportadoras:** {len(transportadoras_selecionadas)} selecionadas")
         
-        # Status selecionados
-        if status_selecionados and len(status_selecionados) < len(status_disponiveis if 'Status' in sla.columns else []):
-            if len(status_selecionados) <= 3:
-                st.sidebar.markdown(f"📋 **Status:** {', '.join(status_selecionados)}")
-            else:
-                st.sidebar.markdown(f"📋 **Status:** {len(status_selecionados)} selecionados")
+            # Status selecionados
+            if status_selecionados and len(status_selecionados) < len(status_disponiveis if 'Status' in colunas_base else []):
+                if len(status_selecionados) <= 3:
+                    st.sidebar.markdown(f"📋 **Status:** {', '.join(status_selecionados)}")
+                else:
+                    st.sidebar.markdown(f"📋 **Status:** {len(status_selecionados)} selecionados")
         
-        if registros_filtrados == 0:
-            st.warning("⚠️ Nenhum registro encontrado com os filtros aplicados. Ajuste os filtros para visualizar dados.")
-            st.stop()
+            if registros_filtrados == 0:
+                st.warning("⚠️ Nenhum registro encontrado com os filtros aplicados. Ajuste os filtros para visualizar dados.")
+                raise ExecucaoInterrompida
     
-    # Substituir sla pelos dados filtrados para uso em todas as abas
-    sla = sla_filtrado
+        # Substituir sla pelos dados filtrados para uso em todas as abas
+        sla = sla_filtrado
     
-    # ===== PRINCIPAIS INSIGHTS (TOPO DA PÁGINA) =====
-    st.markdown("## 💡 Principais Insights")
-    st.markdown("---")
+        # Agregados das seções: recalculados apenas para combinações de filtros ainda não vistas
+        chave_agregados = filtro.chave(hash_arquivo)
     
-    # Calcular insights a partir dos dados filtrados
-    if not sla.empty and all(col in sla.columns for col in ['Receita', 'Seq. De Fat', 'Valor NF']):
-        # Filtrar apenas registros com Receita = Sim para cálculo dos insights
-        dados_receita_insights = sla[sla['Receita'] == 'Sim'].copy()
-        
-        if not dados_receita_insights.empty:
-            # Calcular métricas de sequência e valores
-            pivot_percentual_insights = pd.crosstab(
-                dados_receita_insights['Seq. De Fat'], 
-                ['Total'], 
-                normalize='columns',
-                margins=True, 
-                margins_name='Total Geral'
-            ) * 100
-            
-            pivot_contagem_insights = pd.crosstab(
-                dados_receita_insights['Seq. De Fat'], 
-                ['Total'], 
-                margins=True, 
-                margins_name='Total Geral'
-            )
-            
-            pivot_valor_insights = dados_receita_insights.groupby('Seq. De Fat')['Valor NF'].sum()
-            total_valor_insights = dados_receita_insights['Valor NF'].sum()
+        cubo = None
+        if caminho_banco_analitico is None and hash_arquivo is not None:
+            with medidor.etapa("🧊 Cubo pré-agregado"):
+                cubo = obter_cubo(hash_arquivo, regra_sla, sla_original)
+    
+        def agregado(secao):
+            with medidor.etapa(f"🧮 Agregado: {secao}"):
+                if caminho_banco_analitico is not None:
+                    return obter_agregado_sql(secao, chave_agregados + ('sql',), caminho_banco_analitico, filtro)
+                if hash_arquivo is None:
+                    return calcular_agregado(secao, sla)
+                return obter_agregado(secao, chave_agregados, sla, cubo, filtro)
+
+        # Gráficos: `dados` vem dos agregados desta chave, então chave + opções identificam a figura
+        chave_graficos = chave_agregados + (('sql',) if caminho_banco_analitico is not None else ())
+
+        def grafico(nome, dados, **opcoes):
+            if hash_arquivo is None:
+                return construir_grafico(nome, dados, **opcoes)
+            return obter_grafico(nome, chave_graficos, tuple(sorted(opcoes.items())), dados)
+
+        # ===== PRINCIPAIS INSIGHTS (TOPO DA PÁGINA) =====
+        st.markdown("## 💡 Principais Insights")
+        st.markdown("---")
+    
+        # Calcular insights a partir dos dados filtrados
+        insights = agregado('insights')
+        if insights is not None:
+            if insights.registros > 0:
+                total_valor_insights = insights.total_valor
             
-            # Exibir métricas principais
-            col1, col2, col3 = st.columns(3)
+                # Exibir métricas principais
+                col1, col2, col3 = st.columns(3)
             
-            with col1:
-                seq_1_perc = pivot_percentual_insights.loc[1, 'Total'] if 1 in pivot_percentual_insights.index else 0
-                st.metric("🎯 Sequência 1 (Ideal)", f"{seq_1_perc:.1f}%", 
-                         help="Quanto maior, melhor - menos retrabalho")
+                with col1:
+                    seq_1_perc = insights.seq_1_perc
+                    st.metric("🎯 Sequência 1 (Ideal)", f"{seq_1_perc:.1f}%", 
+                             help="Quanto maior, melhor - menos retrabalho")
             
-            with col2:
-                st.metric("💰 Valor Total", f"R$ {total_valor_insights:,.2f}")
+                with col2:
+                    st.metric("💰 Valor Total", f"R$ {total_valor_insights:,.2f}")
             
-            with col3:
-                total_notas_insights = pivot_contagem_insights.loc['Total Geral', 'Total']
-                st.metric("📄 Total de Notas", f"{total_notas_insights:,}")
+                with col3:
+                    total_notas_insights = insights.total_notas
+                    st.metric("📄 Total de Notas", f"{total_notas_insights:,}")
             
-            # Análise de eficiência
-            if seq_1_perc >= 70:
-                st.success(f"✅ **Excelente eficiência:** {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez")
-            elif seq_1_perc >= 60:
-                st.info(f"📊 **Boa eficiência:** {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez")
+                # Análise de eficiência
+                if seq_1_perc >= 70:
+                    st.success(f"✅ **Excelente eficiência:** {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez")
+                elif seq_1_perc >= 60:
+                    st.info(f"📊 **Boa eficiência:** {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez")
+                else:
+                    st.warning(f"⚠️ **Atenção:** Apenas {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez - muitos retrabalhos")
             else:
-                st.warning(f"⚠️ **Atenção:** Apenas {seq_1_perc:.1f}% dos pedidos são faturados de uma só vez - muitos retrabalhos")
+                st.info("📊 Nenhum registro com Receita = Sim encontrado para cálculo dos insights")
         else:
-            st.info("📊 Nenhum registro com Receita = Sim encontrado para cálculo dos insights")
-    else:
-        # Métricas básicas quando não há dados completos
-        col1, col2, col3 = st.columns(3)
+            # Métricas básicas quando não há dados completos
+            col1, col2, col3 = st.columns(3)
         
-        with col1:
-            st.metric("📄 Total de Registros", f"{len(sla):,}")
+            with col1:
+                st.metric("📄 Total de Registros", f"{registros_filtrados:,}")
         
-        with col2:
-            valor_total_basico = sla['Valor NF'].sum() if 'Valor NF' in sla.columns else 0
-            st.metric("💰 Valor Total", f"R$ {valor_total_basico:,.2f}")
+            with col2:
+                valor_total_basico = agregado('dashboard').valor_total
+                st.metric("💰 Valor Total", f"R$ {valor_total_basico:,.2f}")
         
-        with col3:
-            transportadoras_unicas = sla['Transportador'].nunique() if 'Transportador' in sla.columns else 0
-            st.metric("🚚 Transportadoras", transportadoras_unicas)
+            with col3:
+                transportadoras_unicas = agregado('rankings').qtd_transportadores
+                st.metric("🚚 Transportadoras", transportadoras_unicas)
         
-        st.info("💡 Para insights completos de eficiência, certifique-se de que as colunas 'Receita', 'Seq. De Fat' e 'Valor NF' estejam presentes")
+            st.info("💡 Para insights completos de eficiência, certifique-se de que as colunas 'Receita', 'Seq. De Fat' e 'Valor NF' estejam presentes")
     
-    st.markdown("---")
+        st.markdown("---")
     
-    # ===== ABAS PRINCIPAIS =====
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-        "📊 Dashboard Geral", 
-        "📦 Volumetria",
-        "🎯 Performance SLA", 
-        "🚨 Gestão de Pendências", 
-        "🔍 Busca NF"
-    ])
+        # ===== SEÇÕES PRINCIPAIS =====
+        secao_ativa = st.radio(
+            "Seção:",
+            options=SECOES,
+            horizontal=True,
+            label_visibility="collapsed",
+            key="secao_ativa"
+        )
+        medidor.iniciar(f"Seção: {secao_ativa}")
     
-    # ===== ABA 1: DASHBOARD GERAL =====
-    with tab1:
-        st.header("📊 Dashboard Geral")
-        st.markdown("Visão geral do negócio e principais métricas operacionais.")
+        # ===== ABA 1: DASHBOARD GERAL =====
+        if secao_ativa == SECOES[0]:
+            st.header("📊 Dashboard Geral")
+            st.markdown("Visão geral do negócio e principais métricas operacionais.")
         
-        if not sla.empty:
-            # Calcular métricas principais
-            total_nfs = len(sla)
+            if registros_filtrados > 0:
+                # Calcular métricas principais
+                metricas = agregado('dashboard')
+                total_nfs = metricas.total_nfs
             
-            # Taxa de SLA (assumindo que entregas no prazo são as que têm data de entrega <= previsão)
-            try:
-                sla['Data de Entrega'] = pd.to_datetime(sla['Data de Entrega'], errors='coerce')
-                sla['Previsão de Entrega'] = pd.to_datetime(sla['Previsão de Entrega'], errors='coerce')
-                
-                entregas_realizadas = sla.dropna(subset=['Data de Entrega', 'Previsão de Entrega'])
-                entregas_no_prazo = len(entregas_realizadas[entregas_realizadas['Data de Entrega'] <= entregas_realizadas['Previsão de Entrega']])
-                taxa_sla = (entregas_no_prazo / len(entregas_realizadas) * 100) if len(entregas_realizadas) > 0 else 0
-            except:
-                taxa_sla = 0
-                
-            # Lead Time médio
-            try:
-                lead_time_medio = sla['Lead Time'].mean() if 'Lead Time' in sla.columns else 0
-            except:
-                lead_time_medio = 0
-                
-            # Valor total
-            try:
-                valor_total = sla['Valor NF'].sum() if 'Valor NF' in sla.columns else 0
-            except:
-                valor_total = 0
-                
-            # Nova linha de métricas de peso
-            peso_total = sla['Peso Bruto NF'].sum() if 'Peso Bruto NF' in sla.columns else 0
-            peso_medio = sla['Peso Bruto NF'].mean() if 'Peso Bruto NF' in sla.columns and sla['Peso Bruto NF'].notna().any() else 0
+                # Taxa de SLA (entregas no prazo sobre as entregas com data de entrega e previsão)
+                total_realizadas = metricas.total_realizadas
+                taxa_sla = metricas.taxa_sla
+                valor_total = metricas.valor_total
+                peso_total = metricas.peso_total
+                peso_medio = metricas.peso_medio
             
-            # Primeira linha - Métricas principais
-            col1, col2, col3, col4 = st.columns(4)
+                # Primeira linha - Métricas principais
+                col1, col2, col3, col4 = st.columns(4)
             
-            with col1:
-                st.metric("📦 Total de NFs", f"{total_nfs:,}".replace(",", "."))
+                with col1:
+                    st.metric("📦 Total de NFs", f"{total_nfs:,}".replace(",", "."))
                 
-            with col2:
-                st.metric("⚖️ Peso Total", f"{peso_total/1000000:.1f}t" if peso_total > 1000000 else f"{peso_total/1000:.0f}kg")
+                with col2:
+                    st.metric("⚖️ Peso Total", f"{peso_total/1000000:.1f}t" if peso_total > 1000000 else f"{peso_total/1000:.0f}kg")
                 
-            with col3:
-                st.metric("📊 Peso Médio", f"{peso_medio:.1f} kg")
+                with col3:
+                    st.metric("📊 Peso Médio", f"{peso_medio:.1f} kg")
                 
-            with col4:
-                valor_formatado = f"R$ {valor_total/1000000:.1f}M" if valor_total > 1000000 else f"R$ {valor_total/1000:.0f}K"
-                st.metric("💰 Valor Total", valor_formatado)
-            
-            # Segunda linha - Gráfico de SLA
-            st.markdown("###")  # Espaçamento
-            
-            # Gráfico gauge para Taxa de SLA
-            fig_sla = go.Figure(go.Indicator(
-                mode = "gauge+number+delta",
-                value = taxa_sla,
-                domain = {'x': [0, 1], 'y': [0, 1]},
-                title = {'text': "🎯 Taxa de SLA (%)"},
-                delta = {'reference': 95},
-                gauge = {
-                    'axis': {'range': [None, 100]},
-                    'bar': {'color': "darkblue"},
-                    'steps': [
-                        {'range': [0, 50], 'color': "lightgray"},
-                        {'range': [50, 85], 'color': "yellow"},
-                        {'range': [85, 95], 'color': "orange"},
-                        {'range': [95, 100], 'color': "green"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': 95
-                    }
-                }
-            ))
+                with col4:
+                    valor_formatado = f"R$ {valor_total/1000000:.1f}M" if valor_total > 1000000 else f"R$ {valor_total/1000:.0f}K"
+                    st.metric("💰 Valor Total", valor_formatado)
             
-            # Adicionar anotações com insights
-            entregas_atrasadas = 100 - taxa_sla
+                # Segunda linha - Gráfico de SLA
+                st.markdown("###")  # Espaçamento
             
-            # Determinar status da performance
-            if taxa_sla >= 95:
-                status = "EXCELENTE"
-                cor_status = "green"
-                emoji_status = "🟢"
-            elif taxa_sla >= 85:
-                status = "BOM"
-                cor_status = "orange"
-                emoji_status = "🟡"
-            elif taxa_sla >= 70:
-                status = "ATENÇÃO"
-                cor_status = "orange"
-                emoji_status = "🟠"
-            else:
-                status = "CRÍTICO"
-                cor_status = "red"
-                emoji_status = "🔴"
-            
-            fig_sla.add_annotation(
-                x=0.5, y=0.15,
-                text=f"{emoji_status} Status: <b>{status}</b>",
-                showarrow=False,
-                font=dict(size=14, color=cor_status),
-                bgcolor="rgba(255,255,255,0.8)",
-                bordercolor=cor_status,
-                borderwidth=2
-            )
-            
-            fig_sla.add_annotation(
-                x=0.5, y=0.05,
-                text=f"📊 {entregas_atrasadas:.1f}% das entregas estão atrasadas",
-                showarrow=False,
-                font=dict(size=11, color="darkred"),
-                bgcolor="rgba(255,255,255,0.8)"
-            )
-            
-            fig_sla.update_layout(
-                height=350,
-                annotations=[
-                    dict(
-                        x=0.5, y=-0.1,
-                        text="Meta: 95% | Crítico: <50% | Atenção: 50-85% | Bom: 85-95% | Excelente: ≥95%",
-                        showarrow=False,
-                        font=dict(size=10, color="gray"),
-                        xref="paper", yref="paper"
-                    )
-                ]
-            )
+                # Gráfico gauge para Taxa de SLA
+                medidor.iniciar("📊 Gráfico: Gauge SLA")
+                fig_sla = grafico('gauge_sla', taxa_sla)
+                st.plotly_chart(fig_sla, use_container_width=True, key="sla_gauge_dashboard")
+                medidor.encerrar("📊 Gráfico: Gauge SLA")
             
-            st.plotly_chart(fig_sla, use_container_width=True, key="sla_gauge_dashboard")
+                entregas_atrasadas = 100 - taxa_sla
+                status, _, emoji_status = classificar_sla(taxa_sla)
             
-            # Insights específicos abaixo do gráfico
-            if taxa_sla < 95:
-                gap_necessario = 95 - taxa_sla
-                entregas_necessarias = int((gap_necessario / 100) * len(entregas_realizadas)) if len(entregas_realizadas) > 0 else 0
+                # Insights específicos abaixo do gráfico
+                if taxa_sla < 95:
+                    gap_necessario = 95 - taxa_sla
+                    entregas_necessarias = int((gap_necessario / 100) * total_realizadas) if total_realizadas > 0 else 0
                 
-                st.warning(f"""
-                **🚨 Ações Necessárias:**
-                - Melhorar **{gap_necessario:.1f} pontos percentuais** para atingir a meta
-                - Reduzir aproximadamente **{entregas_necessarias} entregas atrasadas**
-                - Foco nas transportadoras com pior performance
-                """)
-            else:
-                st.success(f"""
-                **🏆 Parabéns!**
-                - Meta de SLA atingida com sucesso!
-                - Performance {taxa_sla - 95:.1f} pontos acima da meta
-                """)
+                    st.warning(f"""
+                    **🚨 Ações Necessárias:**
+                    - Melhorar **{gap_necessario:.1f} pontos percentuais** para atingir a meta
+                    - Reduzir aproximadamente **{entregas_necessarias} entregas atrasadas**
+                    - Foco nas transportadoras com pior performance
+                    """)
+                else:
+                    st.success(f"""
+                    **🏆 Parabéns!**
+                    - Meta de SLA atingida com sucesso!
+                    - Performance {taxa_sla - 95:.1f} pontos acima da meta
+                    """)
             
-            # Interpretação rápida
-            with st.expander("💡 Como interpretar este gráfico"):
-                st.markdown(f"""
-                **📊 Situação Atual:**
-                - **{taxa_sla:.1f}%** das entregas chegam no prazo
-                - **{entregas_atrasadas:.1f}%** das entregas estão atrasadas
-                - Status: **{status}** {emoji_status}
+                # Interpretação rápida
+                with st.expander("💡 Como interpretar este gráfico"):
+                    st.markdown(f"""
+                    **📊 Situação Atual:**
+                    - **{taxa_sla:.1f}%** das entregas chegam no prazo
+                    - **{entregas_atrasadas:.1f}%** das entregas estão atrasadas
+                    - Status: **{status}** {emoji_status}
                 
-                **🎯 Significado Prático:**
-                - De cada 100 entregas → **{int(taxa_sla)} no prazo** e **{int(entregas_atrasadas)} atrasadas**
-                - Meta ideal: 95 no prazo e apenas 5 atrasadas
+                    **🎯 Significado Prático:**
+                    - De cada 100 entregas → **{int(taxa_sla)} no prazo** e **{int(entregas_atrasadas)} atrasadas**
+                    - Meta ideal: 95 no prazo e apenas 5 atrasadas
                 
-                **📈 Faixas de Performance:**
-                - 🟢 **Excelente** (≥95%): Meta atingida
-                - 🟡 **Bom** (85-94%): Próximo da meta
-                - 🟠 **Atenção** (70-84%): Precisa melhorar
-                - 🔴 **Crítico** (<70%): Ação urgente necessária
-                """)
+                    **📈 Faixas de Performance:**
+                    - 🟢 **Excelente** (≥95%): Meta atingida
+                    - 🟡 **Bom** (85-94%): Próximo da meta
+                    - 🟠 **Atenção** (70-84%): Precisa melhorar
+                    - 🔴 **Crítico** (<70%): Ação urgente necessária
+                    """)
             
-            # Terceira linha - Análise de Volume Reformulada
-            st.subheader("📊 Análise de Volume por Transportadora e Estado")
+                # Terceira linha - Análise de Volume Reformulada
+                st.subheader("📊 Análise de Volume por Transportadora e Estado")
             
-            # Criar abas para a análise de volume
-            tab_transp, tab_geo = st.tabs(["🚚 Ranking de Transportadores", "🗺️ Distribuição Geográfica"])
+                # Seletor da análise de volume (somente a visão escolhida é calculada)
+                visao_volume = st.radio(
+                    "Visão:",
+                    options=["🚚 Ranking de Transportadores", "🗺️ Distribuição Geográfica"],
+                    horizontal=True,
+                    label_visibility="collapsed",
+                    key="visao_volume_dashboard"
+                )
+            
+                rankings = agregado('rankings')
             
-            with tab_transp:
-                st.markdown("### 🚚 Ranking de Transportadores")
-                if 'Transportador' in sla.columns:
-                    top_transportadores = sla['Transportador'].value_counts().head(8)
-                    total_nfs = len(sla)
+                if visao_volume == "🚚 Ranking de Transportadores":
+                    st.markdown("### 🚚 Ranking de Transportadores")
+                    if rankings.transportadores is not None:
+                        top_transportadores = rankings.transportadores.head(8)
                     
-                    if len(top_transportadores) > 0:
-                        # Criar gráfico melhorado
-                        fig_transp = go.Figure()
-                        
-                        # Calcular percentuais
-                        percentuais = (top_transportadores.values / total_nfs * 100).round(1)
-                        
-                        # Cores gradientes personalizadas
-                        cores = ['#1f77b4', '#2ca02c', '#ff7f0e', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
-                        
-                        fig_transp.add_trace(go.Bar(
-                            x=top_transportadores.values,
-                            y=top_transportadores.index,
-                            orientation='h',
-                            text=[f'{val:,} ({pct}%)'.replace(',', '.') for val, pct in zip(top_transportadores.values, percentuais)],
-                            textposition='inside',
-                            textfont=dict(color='white', size=10, family='Arial Black'),
-                            marker=dict(
-                                color=cores[:len(top_transportadores)],
-                                line=dict(color='rgba(50,50,50,0.8)', width=1)
-                            ),
-                            hovertemplate='<b>%{y}</b><br>' +
-                                          'Volume: %{x:,} NFs<br>' +
-                                          'Percentual: %{text}<br>' +
-                                          '<extra></extra>'
-                        ))
-                        
-                        fig_transp.update_layout(
-                            title=dict(
-                                text="🏆 Ranking por Volume de NFs",
-                                x=0.5,
-                                font=dict(size=14, family="Arial Black")
-                            ),
-                            xaxis_title="Quantidade de NFs",
-                            yaxis_title="",
-                            height=500,
-                            showlegend=False,
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            xaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGray'),
-                            yaxis=dict(showgrid=False),
-                            margin=dict(l=20, r=20, t=60, b=20)
-                        )
+                        if len(top_transportadores) > 0:
+                            # Criar gráfico melhorado
+                            medidor.iniciar("📊 Gráfico: Top transportadoras")
+                            fig_transp = grafico(
+                                'ranking', rankings.transportadores, total_nfs=total_nfs, top_n=8,
+                                titulo="🏆 Ranking por Volume de NFs", eixo_x="Quantidade de NFs", unidade="NFs",
+                                cores=('#1f77b4', '#2ca02c', '#ff7f0e', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f')
+                            )
+                            st.plotly_chart(fig_transp, use_container_width=True, key="transportadores_ranking_tab")
+                            medidor.encerrar("📊 Gráfico: Top transportadoras")
                         
-                        st.plotly_chart(fig_transp, use_container_width=True, key="transportadores_ranking_tab")
+                            percentuais = (top_transportadores.values / total_nfs * 100).round(1)
                         
-                        # Insights da transportadora
-                        lider = top_transportadores.index[0]
-                        vol_lider = top_transportadores.iloc[0]
-                        pct_lider = percentuais[0]
+                            # Insights da transportadora
+                            lider = top_transportadores.index[0]
+                            vol_lider = top_transportadores.iloc[0]
+                            pct_lider = percentuais[0]
                         
-                        # Métricas detalhadas
-                        col1, col2, col3 = st.columns(3)
+                            # Métricas detalhadas
+                            col1, col2, col3 = st.columns(3)
                         
-                        with col1:
-                            st.metric("🥇 Líder", lider)
+                            with col1:
+                                st.metric("🥇 Líder", lider)
                             
-                        with col2:
-                            st.metric("📦 Volume Líder", f"{vol_lider:,} NFs".replace(",", "."))
+                            with col2:
+                                st.metric("📦 Volume Líder", f"{vol_lider:,} NFs".replace(",", "."))
                             
-                        with col3:
-                            st.metric("📊 Participação", f"{pct_lider:.1f}%")
+                            with col3:
+                                st.metric("📊 Participação", f"{pct_lider:.1f}%")
                         
-                        # Insights detalhados
-                        st.info(f"""
-                        **📈 Análise do Líder:**
-                        - **{lider}** domina com **{vol_lider:,} NFs** ({pct_lider}% do total)
-                        - Representa **1 em cada {int(100/pct_lider)} entregas**
-                        - Total de **{len(top_transportadores)} transportadoras** principais
-                        """.replace(',', '.'))
+                            # Insights detalhados
+                            st.info(f"""
+                            **📈 Análise do Líder:**
+                            - **{lider}** domina com **{vol_lider:,} NFs** ({pct_lider}% do total)
+                            - Representa **1 em cada {int(100/pct_lider)} entregas**
+                            - Total de **{len(top_transportadores)} transportadoras** principais
+                            """.replace(',', '.'))
+                        else:
+                            st.warning("Nenhum dado de transportadora disponível")
                     else:
-                        st.warning("Nenhum dado de transportadora disponível")
-                else:
-                    st.info("Dados de transportador não disponíveis")
+                        st.info("Dados de transportador não disponíveis")
                     
-            with tab_geo:
-                st.markdown("### 🗺️ Distribuição Geográfica")
-                if 'Estado Destino' in sla.columns:
-                    top_estados = sla['Estado Destino'].value_counts().head(8)
-                    total_nfs = len(sla)
+                else:
+                    st.markdown("### 🗺️ Distribuição Geográfica")
+                    if rankings.estados is not None:
+                        top_estados = rankings.estados.head(8)
                     
-                    if len(top_estados) > 0:
-                        # Criar gráfico melhorado
-                        fig_estados = go.Figure()
-                        
-                        # Calcular percentuais
-                        percentuais_est = (top_estados.values / total_nfs * 100).round(1)
-                        
-                        # Cores regionais do Brasil (tons mais escuros para legibilidade)
-                        cores_estados = ['#006400', '#228B22', '#2E8B57', '#3CB371', '#20B2AA', '#4682B4', '#4169E1', '#6A5ACD']
-                        
-                        fig_estados.add_trace(go.Bar(
-                            x=top_estados.values,
-                            y=top_estados.index,
-                            orientation='h',
-                            text=[f'{val:,} ({pct}%)'.replace(',', '.') for val, pct in zip(top_estados.values, percentuais_est)],
-                            textposition='inside',
-                            textfont=dict(color='white', size=10, family='Arial Black'),
-                            marker=dict(
-                                color=cores_estados[:len(top_estados)],
-                                line=dict(color='rgba(50,50,50,0.8)', width=1)
-                            ),
-                            hovertemplate='<b>%{y}</b><br>' +
-                                          'Volume: %{x:,} entregas<br>' +
-                                          'Percentual: %{text}<br>' +
-                                          '<extra></extra>'
-                        ))
-                        
-                        fig_estados.update_layout(
-                            title=dict(
-                                text="🌎 Distribuição por Estados",
-                                x=0.5,
-                                font=dict(size=14, family="Arial Black")
-                            ),
-                            xaxis_title="Quantidade de Entregas",
-                            yaxis_title="",
-                            height=500,
-                            showlegend=False,
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            xaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGray'),
-                            yaxis=dict(showgrid=False),
-                            margin=dict(l=20, r=20, t=60, b=20)
-                        )
+                        if len(top_estados) > 0:
+                            # Criar gráfico melhorado
+                            medidor.iniciar("📊 Gráfico: Distribuição por estado")
+                            fig_estados = grafico(
+                                'ranking', rankings.estados, total_nfs=total_nfs, top_n=8,
+                                titulo="🌎 Distribuição por Estados", eixo_x="Quantidade de Entregas", unidade="entregas",
+                                cores=('#006400', '#228B22', '#2E8B57', '#3CB371', '#20B2AA', '#4682B4', '#4169E1', '#6A5ACD')
+                            )
+                            st.plotly_chart(fig_estados, use_container_width=True, key="estados_distribuicao_tab")
+                            medidor.encerrar("📊 Gráfico: Distribuição por estado")
                         
-                        st.plotly_chart(fig_estados, use_container_width=True, key="estados_distribuicao_tab")
+                            percentuais_est = (top_estados.values / total_nfs * 100).round(1)
                         
-                        # Insights do estado
-                        estado_lider = top_estados.index[0]
-                        vol_estado = top_estados.iloc[0]
-                        pct_estado = percentuais_est[0]
+                            # Insights do estado
+                            estado_lider = top_estados.index[0]
+                            vol_estado = top_estados.iloc[0]
+                            pct_estado = percentuais_est[0]
                         
-                        # Calcular concentração (top 3)
-                        concentracao_top3 = sum(percentuais_est[:3])
+                            # Calcular concentração (top 3)
+                            concentracao_top3 = sum(percentuais_est[:3])
                         
-                        # Métricas detalhadas
-                        col1, col2, col3 = st.columns(3)
+                            # Métricas detalhadas
+                            col1, col2, col3 = st.columns(3)
                         
-                        with col1:
-                            st.metric("🥇 Estado Líder", estado_lider)
+                            with col1:
+                                st.metric("🥇 Estado Líder", estado_lider)
                             
-                        with col2:
-                            st.metric("📦 Volume Líder", f"{vol_estado:,} entregas".replace(",", "."))
+                            with col2:
+                                st.metric("📦 Volume Líder", f"{vol_estado:,} entregas".replace(",", "."))
                             
-                        with col3:
-                            st.metric("📊 Top 3 Estados", f"{concentracao_top3:.1f}%")
+                            with col3:
+                                st.metric("📊 Top 3 Estados", f"{concentracao_top3:.1f}%")
                         
-                        # Insights detalhados
-                        st.info(f"""
-                        **🌎 Análise Geográfica:**
-                        - **{estado_lider}** lidera com **{vol_estado:,} entregas** ({pct_estado}% do total)
-                        - Top 3 estados concentram **{concentracao_top3:.1f}%** das entregas
-                        - Cobertura de **{len(top_estados)} estados** principais
-                        """.replace(',', '.'))
+                            # Insights detalhados
+                            st.info(f"""
+                            **🌎 Análise Geográfica:**
+                            - **{estado_lider}** lidera com **{vol_estado:,} entregas** ({pct_estado}% do total)
+                            - Top 3 estados concentram **{concentracao_top3:.1f}%** das entregas
+                            - Cobertura de **{len(top_estados)} estados** principais
+                            """.replace(',', '.'))
+                        else:
+                            st.warning("Nenhum dado de estado disponível")
                     else:
-                        st.warning("Nenhum dado de estado disponível")
-                else:
-                    st.info("Dados de estado não disponíveis")
+                        st.info("Dados de estado não disponíveis")
             
-            # Resumo comparativo geral
-            if 'Transportador' in sla.columns and 'Estado Destino' in sla.columns:
-                st.markdown("### 📊 Resumo Comparativo")
-                col1, col2, col3 = st.columns(3)
+                # Resumo comparativo geral
+                if 'Transportador' in colunas_base and 'Estado Destino' in colunas_base:
+                    st.markdown("### 📊 Resumo Comparativo")
+                    col1, col2, col3 = st.columns(3)
                 
-                with col1:
-                    qtd_transportadores = sla['Transportador'].nunique()
-                    st.metric("🚚 Total Transportadores", qtd_transportadores)
+                    with col1:
+                        qtd_transportadores = rankings.qtd_transportadores
+                        st.metric("🚚 Total Transportadores", qtd_transportadores)
                     
-                with col2:
-                    qtd_estados = sla['Estado Destino'].nunique()
-                    st.metric("🗺️ Estados Atendidos", qtd_estados)
+                    with col2:
+                        qtd_estados = rankings.qtd_estados
+                        st.metric("🗺️ Estados Atendidos", qtd_estados)
                     
-                with col3:
-                    # Índice de concentração (% do top 1 em cada categoria)
-                    top_transportadores_calc = sla['Transportador'].value_counts()
-                    top_estados_calc = sla['Estado Destino'].value_counts()
-                    if len(top_transportadores_calc) > 0 and len(top_estados_calc) > 0:
-                        concentracao = ((top_transportadores_calc.iloc[0] + top_estados_calc.iloc[0]) / (2 * total_nfs) * 100).round(1)
-                        st.metric("📊 Índice Concentração", f"{concentracao}%")
+                    with col3:
+                        # Índice de concentração (% do top 1 em cada categoria)
+                        top_transportadores_calc = rankings.transportadores
+                        top_estados_calc = rankings.estados
+                        if len(top_transportadores_calc) > 0 and len(top_estados_calc) > 0:
+                            concentracao = ((top_transportadores_calc.iloc[0] + top_estados_calc.iloc[0]) / (2 * total_nfs) * 100).round(1)
+                            st.metric("📊 Índice Concentração", f"{concentracao}%")
             
-            # Quarta linha - Status e Ocorrências
-            col1, col2 = st.columns(2)
+                # Quarta linha - Status e Ocorrências
+                col1, col2 = st.columns(2)
             
-            with col1:
-                st.subheader("📊 Distribuição por Status")
-                if 'Status' in sla.columns:
-                    status_counts = sla['Status'].value_counts()
-                    
-                    # Ajustar posição do texto baseado no tamanho dos valores
-                    posicoes, cores_texto = ajustar_posicao_texto(status_counts.values.tolist())
-                    
-                    # Criar gráfico personalizado para controlar posição de texto individualmente
-                    fig_status = go.Figure()
-                    
-                    # Cores do gradiente Viridis
-                    import plotly.colors as pc
-                    viridis_colors = pc.sequential.Viridis
-                    min_val = min(status_counts.values)
-                    max_val = max(status_counts.values)
-                    range_val = max_val - min_val if max_val != min_val else 1
-                    norm_values = [(v - min_val) / range_val for v in status_counts.values]
-                    bar_colors = [viridis_colors[int(norm * (len(viridis_colors) - 1))] for norm in norm_values]
-                    
-                    fig_status.add_trace(go.Bar(
-                        x=status_counts.index,
-                        y=status_counts.values,
-                        text=[str(v) for v in status_counts.values],
-                        textposition=posicoes,
-                        textfont=dict(color=cores_texto, size=12, family='Arial Black'),
-                        marker_color=bar_colors,
-                        hovertemplate='<b>%{x}</b><br>Quantidade: %{y}<extra></extra>'
-                    ))
-                    
-                    fig_status.update_layout(
-                        title="Quantidade por Status",
-                        xaxis_title="Status",
-                        yaxis_title="Quantidade",
-                        height=400,
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig_status, use_container_width=True, key="status_distribuicao")
-                else:
-                    st.info("Dados de status não disponíveis")
+                with col1:
+                    st.subheader("📊 Distribuição por Status")
+                    if rankings.status is not None:
+                        # Cores do gradiente Viridis; texto fora da barra nos valores pequenos
+                        medidor.iniciar("📊 Gráfico: Status")
+                        fig_status = grafico('status', rankings.status)
+                        st.plotly_chart(fig_status, use_container_width=True, key="status_distribuicao")
+                        medidor.encerrar("📊 Gráfico: Status")
+                    else:
+                        st.info("Dados de status não disponíveis")
                     
-            with col2:
-                st.subheader("⚠️ Top Ocorrências")
-                if 'Ocorrência' in sla.columns:
-                    # Filtrar apenas ocorrências não nulas e não vazias
-                    ocorrencias_filtradas = sla[sla['Ocorrência'].notna() & (sla['Ocorrência'] != '')]
-                    if not ocorrencias_filtradas.empty:
-                        top_ocorrencias = ocorrencias_filtradas['Ocorrência'].value_counts().head(8)
-                        
-                        # Ajustar posição do texto baseado no tamanho dos valores
-                        posicoes, cores_texto = ajustar_posicao_texto(top_ocorrencias.values.tolist())
-                        
-                        # Criar DataFrame para o gráfico de ocorrências
-                        df_ocorr = pd.DataFrame({
-                            'Ocorrência': [str(x)[:30] + "..." if len(str(x)) > 30 else str(x) for x in top_ocorrencias.index],
-                            'Quantidade': top_ocorrencias.values
-                        })
-                        
-                        fig_ocorr = px.bar(
-                            df_ocorr,
-                            x='Quantidade',
-                            y='Ocorrência',
-                            orientation='h',
-                            title="Principais Ocorrências",
-                            labels={'Quantidade': 'Quantidade', 'Ocorrência': 'Ocorrência'},
-                            color='Quantidade',
-                            color_continuous_scale='Reds',
-                            text='Quantidade'
-                        )
-                        fig_ocorr.update_layout(height=400, showlegend=False, coloraxis_showscale=False)
-                        
-                        # Aplicar posições de texto inteligentes
-                        if len(set(posicoes)) == 1:  # Se todas têm a mesma posição
-                            fig_ocorr.update_traces(
-                                textposition=posicoes[0],
-                                textfont=dict(color=cores_texto[0], size=11, family='Arial Black'),
-                                hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<extra></extra>'
-                            )
-                        else:  # Posições mistas - usar outside para todos valores pequenos
-                            fig_ocorr.update_traces(
-                                textposition='auto',
-                                textfont=dict(color='black', size=11, family='Arial Black'),
-                                hovertemplate='<b>%{y}</b><br>Quantidade: %{x}<extra></extra>'
-                            )
-                        st.plotly_chart(fig_ocorr, use_container_width=True, key="ocorrencias_top")
+                with col2:
+                    st.subheader("⚠️ Top Ocorrências")
+                    if rankings.ocorrencias is not None:
+                        # Apenas ocorrências não nulas e não vazias
+                        if not rankings.ocorrencias.empty:
+                            medidor.iniciar("📊 Gráfico: Ocorrências")
+                            fig_ocorr = grafico('ocorrencias', rankings.ocorrencias, top_n=8)
+                            st.plotly_chart(fig_ocorr, use_container_width=True, key="ocorrencias_top")
+                            medidor.encerrar("📊 Gráfico: Ocorrências")
+                        else:
+                            st.success("✅ Nenhuma ocorrência registrada!")
                     else:
-                        st.success("✅ Nenhuma ocorrência registrada!")
-                else:
-                    st.info("Dados de ocorrência não disponíveis")
+                        st.info("Dados de ocorrência não disponíveis")
             
-            # Volume mensal geral
-            if 'Mês Nota' in sla.columns:
-                st.subheader("📊 Volume Geral de Entregas por Mês")
-                
-                mensal = sla['Mês Nota'].value_counts()
-                mensal_ordenado = ordenar_meses(mensal)
-                
-                # Ajustar posição do texto baseado no tamanho dos valores
-                posicoes, cores_texto = ajustar_posicao_texto(mensal_ordenado.values.tolist())
-                
-                # Criar DataFrame para o gráfico
-                df_mensal = pd.DataFrame({
-                    'Mês': mensal_ordenado.index,
-                    'Quantidade': mensal_ordenado.values
-                })
+                # Volume mensal geral
+                if rankings.meses is not None:
+                    st.subheader("📊 Volume Geral de Entregas por Mês")
                 
-                fig_mensal = px.bar(
-                    df_mensal,
-                    x='Mês',
-                    y='Quantidade',
-                    title="Volume Total de NFs por Mês",
-                    labels={'Mês': 'Mês', 'Quantidade': 'Quantidade de NFs'},
-                    color='Quantidade',
-                    color_continuous_scale='Blues',
-                    text='Quantidade'
-                )
-                fig_mensal.update_layout(height=300, showlegend=False, coloraxis_showscale=False)
-                
-                # Aplicar posições de texto inteligentes
-                if len(set(posicoes)) == 1:  # Se todas têm a mesma posição
-                    fig_mensal.update_traces(
-                        textposition=posicoes[0],
-                        textfont=dict(color=cores_texto[0], size=11, family='Arial Black'),
-                        hovertemplate='<b>%{x}</b><br>Volume: %{y} NFs<extra></extra>'
-                    )
-                else:  # Posições mistas - usar auto
-                    fig_mensal.update_traces(
-                        textposition='auto',
-                        textfont=dict(color='black', size=11, family='Arial Black'),
-                        hovertemplate='<b>%{x}</b><br>Volume: %{y} NFs<extra></extra>'
-                    )
-                st.plotly_chart(fig_mensal, use_container_width=True, key="volume_mensal_dashboard")
+                    medidor.iniciar("📊 Gráfico: Volume mensal")
+                    fig_mensal = grafico('mensal', rankings.meses)
+                    st.plotly_chart(fig_mensal, use_container_width=True, key="volume_mensal_dashboard")
+                    medidor.encerrar("📊 Gráfico: Volume mensal")
     
-    # ===== ABA 2: VOLUMETRIA =====
-    with tab2:
-        st.header("📦 Volumetria")
-        st.markdown("Análise de volume de entregas por transportadora, estado e região.")
+        # ===== ABA 2: VOLUMETRIA =====
+        elif secao_ativa == SECOES[1]:
+            st.header("📦 Volumetria")
+            st.markdown("Análise de volume de entregas por transportadora, estado e região.")
         
-        if sla is not None:
-            # Exibir informações básicas dos dados
-            st.success(f"✅ Dados carregados com sucesso! Total de {len(sla)} registros")
+            if registros_filtrados > 0:
+                # Exibir informações básicas dos dados
+                st.success(f"✅ Dados carregados com sucesso! Total de {registros_filtrados} registros")
             
-            # ===== ABAS DE VOLUMETRIA =====
-            tab_estado, tab_regiao, tab_contagem = st.tabs(["🗺️ Por Estado", "🌎 Por Região", "📊 Contagem de Notas"])
+                # ===== VISÕES DE VOLUMETRIA =====
+                visao_volumetria = st.radio(
+                    "Visão:",
+                    options=["🗺️ Por Estado", "🌎 Por Região", "📊 Contagem de Notas"],
+                    horizontal=True,
+                    label_visibility="collapsed",
+                    key="visao_volumetria"
+                )
             
-            with tab_estado:
-                st.markdown("### 📍 Análise por Estado")
+                if visao_volumetria == "🗺️ Por Estado":
+                    st.markdown("### 📍 Análise por Estado")
                 
-                if 'Estado Destino' in sla.columns:
-                    # Análise de volume por estado
-                    volume_estados = sla['Estado Destino'].value_counts().head(10)
+                    if 'Estado Destino' in colunas_base:
+                        # Análise de volume por estado
+                        volume_estados = agregado('rankings').estados.head(10)
                     
-                    if not volume_estados.empty:
-                        # Criar DataFrame para o gráfico de estados
-                        df_estados = pd.DataFrame({
-                            'Estado': volume_estados.index,
-                            'Quantidade': volume_estados.values
-                        })
-                        
-                        fig_estados = px.bar(
-                            df_estados,
-                            x='Quantidade',
-                            y='Estado',
-                            orientation='h',
-                            title="📍 Top 10 Estados por Volume",
-                            labels={'Quantidade': 'Quantidade de Entregas', 'Estado': 'Estado'}
-                        )
-                        fig_estados.update_layout(height=500)
-                        st.plotly_chart(fig_estados, use_container_width=True)
+                        if not volume_estados.empty:
+                            medidor.iniciar("📊 Gráfico: Volumetria por estado")
+                            fig_estados = grafico(
+                                'volume', volume_estados, top_n=10, dimensao='Estado', titulo="📍 Top 10 Estados por Volume"
+                            )
+                            st.plotly_chart(fig_estados, use_container_width=True)
+                            medidor.encerrar("📊 Gráfico: Volumetria por estado")
                         
-                        # Tabela detalhada
-                        st.dataframe(volume_estados.to_frame(name='Volume de Entregas'), use_container_width=True)
+                            # Tabela detalhada
+                            st.dataframe(volume_estados.to_frame(name='Volume de Entregas'), use_container_width=True)
+                        else:
+                            st.info("📊 Dados de Estado Destino não disponíveis")
                     else:
-                        st.info("📊 Dados de Estado Destino não disponíveis")
-                else:
-                    st.info("📊 Coluna Estado Destino não encontrada")
+                        st.info("📊 Coluna Estado Destino não encontrada")
                     
-            with tab_regiao:
-                st.markdown("### 🌎 Análise por Região")
+                elif visao_volumetria == "🌎 Por Região":
+                    st.markdown("### 🌎 Análise por Região")
                 
-                if 'Transportador' in sla.columns:
-                    # Análise de volume por transportadora
-                    volume_transp = sla['Transportador'].value_counts().head(10)
+                    if 'Transportador' in colunas_base:
+                        # Análise de volume por transportadora
+                        volume_transp = agregado('rankings').transportadores.head(10)
                     
-                    if not volume_transp.empty:
-                        # Criar DataFrame para o gráfico de transportadoras
-                        df_transp = pd.DataFrame({
-                            'Transportadora': volume_transp.index,
-                            'Quantidade': volume_transp.values
-                        })
-                        
-                        fig_transp = px.bar(
-                            df_transp,
-                            x='Quantidade',
-                            y='Transportadora',
-                            orientation='h',
-                            title="🚚 Top 10 Transportadoras por Volume",
-                            labels={'Quantidade': 'Quantidade de Entregas', 'Transportadora': 'Transportadora'}
-                        )
-                        fig_transp.update_layout(height=500)
-                        st.plotly_chart(fig_transp, use_container_width=True)
+                        if not volume_transp.empty:
+                            medidor.iniciar("📊 Gráfico: Volumetria por transportadora")
+                            fig_transp = grafico(
+                                'volume', volume_transp, top_n=10, dimensao='Transportadora',
+                                titulo="🚚 Top 10 Transportadoras por Volume"
+                            )
+                            st.plotly_chart(fig_transp, use_container_width=True)
+                            medidor.encerrar("📊 Gráfico: Volumetria por transportadora")
                         
-                        # Tabela detalhada
-                        st.dataframe(volume_transp.to_frame(name='Volume de Entregas'), use_container_width=True)
+                            # Tabela detalhada
+                            st.dataframe(volume_transp.to_frame(name='Volume de Entregas'), use_container_width=True)
+                        else:
+                            st.info("📊 Dados de Transportador não disponíveis")
                     else:
-                        st.info("📊 Dados de Transportador não disponíveis")
-                else:
-                    st.info("📊 Coluna Transportador não encontrada")
+                        st.info("📊 Coluna Transportador não encontrada")
                     
-            with tab_contagem:
-                st.markdown("### 📊 Contagem de Notas")
-                st.markdown("**💡 Conceito:** Quanto menos vezes um mesmo pedido é faturado, melhor (menos gastos com frete)")
+                else:
+                    st.markdown("### 📊 Contagem de Notas")
+                    st.markdown("**💡 Conceito:** Quanto menos vezes um mesmo pedido é faturado, melhor (menos gastos com frete)")
                 
-                # Verificar se as colunas necessárias existem
-                if all(col in sla.columns for col in ['Receita', 'Seq. De Fat', 'Unid Negoc', 'Valor NF']):
-                    # Filtrar apenas registros com Receita = Sim
-                    dados_receita = sla[sla['Receita'] == 'Sim'].copy()
-                    
-                    if not dados_receita.empty:
-                        st.success(f"✅ Encontrados {len(dados_receita):,} registros com Receita = Sim")
-                        
-                        # Preparar dados para ambas as análises
-                        # Contar quantidade de notas (registros)
-                        pivot_contagem = pd.crosstab(
-                            dados_receita['Seq. De Fat'], 
-                            dados_receita['Unid Negoc'], 
-                            margins=True, 
-                            margins_name='Total Geral'
-                        )
+                    # Verificar se as colunas necessárias existem
+                    contagem_notas = agregado('contagem_notas')
+                    if contagem_notas is not None:
+                        if contagem_notas.registros > 0:
+                            st.success(f"✅ Encontrados {contagem_notas.registros:,} registros com Receita = Sim")
                         
-                        # Calcular percentuais por coluna (BU)
-                        pivot_percentual = pd.crosstab(
-                            dados_receita['Seq. De Fat'], 
-                            dados_receita['Unid Negoc'], 
-                            normalize='columns',
-                            margins=True, 
-                            margins_name='Total Geral'
-                        ) * 100
+                            # Pivots Sequência x BU: quantidade de notas, percentual por BU e soma dos valores de NF
+                            pivot_contagem = contagem_notas.contagem
+                            pivot_percentual = contagem_notas.percentual
+                            pivot_valor = contagem_notas.valor
+                            formatos_valor = formatos_colunas(pivot_valor.columns, FORMATO_MOEDA)
                         
-                        # Somar valores de NF
-                        pivot_valor = dados_receita.pivot_table(
-                            index='Seq. De Fat',
-                            columns='Unid Negoc',
-                            values='Valor NF',
-                            aggfunc='sum',
-                            fill_value=0,
-                            margins=True,
-                            margins_name='Total Geral'
-                        )
-                        
-                        # Criar sub-tabs
-                        subtab_percentual, subtab_absoluto = st.tabs(["📊 Percentual", "🔢 Números Absolutos"])
+                            # Seletor de exibição: percentual ou números absolutos
+                            visao_contagem = st.radio(
+                                "Exibir:",
+                                options=["📊 Percentual", "🔢 Números Absolutos"],
+                                horizontal=True,
+                                label_visibility="collapsed",
+                                key="visao_contagem_notas"
+                            )
                         
-                        # ===== SUB-TAB PERCENTUAL =====
-                        with subtab_percentual:
-                            st.markdown("#### 📊 Distribuição por Sequência e BU - Percentuais")
-                            
-                            # Formatar percentuais para exibição
-                            def formatar_percentual(df):
-                                df_formatado = df.copy()
-                                for col in df_formatado.columns:
-                                    df_formatado[col] = df_formatado[col].apply(lambda x: f"{x:.2f}%")
-                                return df_formatado
-                            
-                            tabela_perc_formatada = formatar_percentual(pivot_percentual.round(2))
-                            st.dataframe(tabela_perc_formatada, use_container_width=True)
+                            # ===== PERCENTUAL =====
+                            if visao_contagem == "📊 Percentual":
+                                st.markdown("#### 📊 Distribuição por Sequência e BU - Percentuais")
                             
-                            # Tabela de valores de NF com percentuais
-                            st.markdown("#### 💰 Valores de NF por Sequência e BU")
+                                st.dataframe(
+                                    pivot_percentual, use_container_width=True,
+                                    column_config=formatos_colunas(pivot_percentual.columns, FORMATO_PERCENTUAL)
+                                )
                             
-                            # Formatar valores monetários
-                            def formatar_moeda(df):
-                                df_formatado = df.copy()
-                                for col in df_formatado.columns:
-                                    df_formatado[col] = df_formatado[col].apply(lambda x: f"R$ {x:,.2f}" if pd.notnull(x) and x != 0 else "R$ 0,00")
-                                return df_formatado
+                                # Tabela de valores de NF com percentuais
+                                st.markdown("#### 💰 Valores de NF por Sequência e BU")
                             
-                            tabela_valor_formatada = formatar_moeda(pivot_valor)
-                            st.dataframe(tabela_valor_formatada, use_container_width=True)
+                                st.dataframe(pivot_valor, use_container_width=True, column_config=formatos_valor)
                             
-                            # Resumo por BU - Percentual
-                            st.markdown("#### 📋 Resumo por BU - Percentual e Valor")
+                                # Resumo por BU - Percentual
+                                st.markdown("#### 📋 Resumo por BU - Percentual e Valor")
                             
-                            for bu in pivot_percentual.columns:
-                                if bu != 'Total Geral':
+                                formatos_resumo = {
+                                    'Percentual': st.column_config.NumberColumn(format=FORMATO_PERCENTUAL),
+                                    'Valor NF': st.column_config.NumberColumn(format=FORMATO_MOEDA)
+                                }
+                                for bu, resumo_bu in resumos_por_bu(pivot_percentual, pivot_valor, 'Percentual').items():
                                     with st.expander(f"🏢 {bu}"):
-                                        resumo_bu = pd.DataFrame({
-                                            'Sequência': pivot_percentual.index,
-                                            'Percentual': [f"{val:.2f}%" for val in pivot_percentual[bu]],
-                                            'Valor NF': [f"R$ {pivot_valor[bu][idx]:,.2f}" for idx in pivot_percentual.index]
-                                        })
-                                        
-                                        st.dataframe(resumo_bu, use_container_width=True, hide_index=True)
+                                        st.dataframe(resumo_bu, use_container_width=True, hide_index=True,
+                                                     column_config=formatos_resumo)
                         
-                        # ===== SUB-TAB NÚMEROS ABSOLUTOS =====
-                        with subtab_absoluto:
-                            st.markdown("#### 🔢 Quantidade de Notas por Sequência e BU")
+                            # ===== NÚMEROS ABSOLUTOS =====
+                            else:
+                                st.markdown("#### 🔢 Quantidade de Notas por Sequência e BU")
                             
-                            # Mostrar tabela de contagem (números absolutos)
-                            st.dataframe(pivot_contagem, use_container_width=True)
+                                # Mostrar tabela de contagem (números absolutos)
+                                st.dataframe(pivot_contagem, use_container_width=True)
                             
-                            # Tabela de valores de NF com números absolutos
-                            st.markdown("#### 💰 Valores de NF por Sequência e BU")
+                                # Tabela de valores de NF com números absolutos
+                                st.markdown("#### 💰 Valores de NF por Sequência e BU")
                             
-                            tabela_valor_formatada_abs = formatar_moeda(pivot_valor)
-                            st.dataframe(tabela_valor_formatada_abs, use_container_width=True)
+                                st.dataframe(pivot_valor, use_container_width=True, column_config=formatos_valor)
                             
-                            # Resumo por BU - Números Absolutos
-                            st.markdown("#### 📋 Resumo por BU - Quantidade e Valor")
+                                # Resumo por BU - Números Absolutos
+                                st.markdown("#### 📋 Resumo por BU - Quantidade e Valor")
                             
-                            for bu in pivot_contagem.columns:
-                                if bu != 'Total Geral':
+                                formatos_resumo_abs = {
+                                    'Quantidade de Notas': st.column_config.NumberColumn(format=FORMATO_QUANTIDADE),
+                                    'Valor NF': st.column_config.NumberColumn(format=FORMATO_MOEDA)
+                                }
+                                for bu, resumo_bu_abs in resumos_por_bu(pivot_contagem, pivot_valor, 'Quantidade de Notas').items():
                                     with st.expander(f"🏢 {bu}"):
-                                        resumo_bu_abs = pd.DataFrame({
-                                            'Sequência': pivot_contagem.index,
-                                            'Quantidade de Notas': [f"{val:,}" for val in pivot_contagem[bu]],
-                                            'Valor NF': [f"R$ {pivot_valor[bu][idx]:,.2f}" for idx in pivot_contagem.index]
-                                        })
-                                        
-                                        st.dataframe(resumo_bu_abs, use_container_width=True, hide_index=True)
+                                        st.dataframe(resumo_bu_abs, use_container_width=True, hide_index=True,
+                                                     column_config=formatos_resumo_abs)
                             
+                        else:
+                            st.warning("⚠️ Nenhum registro encontrado com Receita = Sim")
                     else:
-                        st.warning("⚠️ Nenhum registro encontrado com Receita = Sim")
-                else:
-                    # Verificar quais colunas estão faltando
-                    colunas_necessarias = ['Receita', 'Seq. De Fat', 'Unid Negoc', 'Valor NF']
-                    colunas_faltantes = [col for col in colunas_necessarias if col not in sla.columns]
+                        # Verificar quais colunas estão faltando
+                        colunas_necessarias = ['Receita', 'Seq. De Fat', 'Unid Negoc', 'Valor NF']
+                        colunas_faltantes = [col for col in colunas_necessarias if col not in colunas_base]
                     
-                    st.error(f"❌ Colunas necessárias não encontradas: {', '.join(colunas_faltantes)}")
-                    st.info("💡 Colunas necessárias: Receita, Seq. De Fat, Unid Negoc, Valor NF")
-        else:
-            st.info("📊 Dados não disponíveis para análise de volumetria")
+                        st.error(f"❌ Colunas necessárias não encontradas: {', '.join(colunas_faltantes)}")
+                        st.info("💡 Colunas necessárias: Receita, Seq. De Fat, Unid Negoc, Valor NF")
+            else:
+                st.info("📊 Dados não disponíveis para análise de volumetria")
     
-    # ===== ABA 3: PERFORMANCE SLA =====
-    with tab3:
-        st.header("🎯 Performance de SLA")
-        st.markdown("Análise detalhada da performance de entrega por transportadora e status.")
+        # ===== ABA 3: PERFORMANCE SLA =====
+        elif secao_ativa == SECOES[2]:
+            st.header("🎯 Performance de SLA")
+            st.markdown("Análise detalhada da performance de entrega por transportadora e status.")
         
-        if all(col in sla.columns for col in ['Transportador', 'Data de Entrega', 'Previsão de Entrega']):
-            # Filtrar apenas entregas realizadas (com data de entrega)
-            entregas_realizadas = sla.dropna(subset=['Data de Entrega', 'Previsão de Entrega', 'Transportador'])
+            performance_sla = agregado('performance_sla')
+            if performance_sla is not None:
+                # Entregas realizadas (com data de entrega e previsão) classificadas por transportadora
+                performance_transp = performance_sla.performance_transp
             
-            if not entregas_realizadas.empty:
-                # Garantir que as datas estão no formato correto
-                entregas_realizadas = entregas_realizadas.copy()
-                entregas_realizadas['Data de Entrega'] = pd.to_datetime(entregas_realizadas['Data de Entrega'], errors='coerce')
-                entregas_realizadas['Previsão de Entrega'] = pd.to_datetime(entregas_realizadas['Previsão de Entrega'], errors='coerce')
-                
-                # Classificar entregas como no prazo ou atrasadas
-                entregas_realizadas['Status_Entrega'] = entregas_realizadas.apply(
-                    lambda row: 'Entregue no Prazo' if row['Data de Entrega'] <= row['Previsão de Entrega'] else 'Entregue Atrasada',
-                    axis=1
-                )
-                
-                # Performance por transportadora
-                performance_transp = entregas_realizadas.groupby(['Transportador', 'Status_Entrega']).size().unstack(fill_value=0)
-                
-                if 'Entregue no Prazo' in performance_transp.columns:
-                    performance_transp['Total'] = performance_transp.sum(axis=1)
-                    performance_transp['% SLA'] = (performance_transp['Entregue no Prazo'] / performance_transp['Total'] * 100).round(1)
-                    
+                if performance_transp is not None:
                     # Filtrar transportadoras com pelo menos 10 entregas
                     transp_relevantes = performance_transp[performance_transp['Total'] >= 10]
-                    
+                
                     if not transp_relevantes.empty:
                         # Gráfico de performance
                         transp_ordenada = transp_relevantes.sort_values('% SLA', ascending=True)
-                        
-                        # Criar DataFrame para o gráfico de performance SLA
-                        df_performance = pd.DataFrame({
-                            'Transportadora': transp_ordenada.index,
-                            '% SLA': transp_ordenada['% SLA']
-                        })
-                        
-                        fig = px.bar(
-                            df_performance,
-                            x='% SLA',
-                            y='Transportadora',
-                            orientation='h',
-                            title="🎯 Performance SLA por Transportadora",
-                            labels={'% SLA': '% SLA Atingido', 'Transportadora': 'Transportadora'},
-                            color='% SLA',
-                            color_continuous_scale='RdYlGn'
-                        )
-                        fig.update_traces(
-                            hovertemplate='<b>%{y}</b><br>% SLA Atingido: %{x:.1f}%<extra></extra>'
-                        )
-                        fig.update_layout(height=500, showlegend=False, coloraxis_showscale=False)
+                    
+                        medidor.iniciar("📊 Gráfico: Performance por transportadora")
+                        fig = grafico('performance', performance_transp, minimo_entregas=10)
                         st.plotly_chart(fig, use_container_width=True)
-                        
+                        if len(transp_ordenada) > LIMITE_TRANSPORTADORAS_PERFORMANCE:
+                            st.caption(
+                                f"Gráfico com as {LIMITE_TRANSPORTADORAS_PERFORMANCE} transportadoras de maior volume; "
+                                f"a tabela abaixo traz todas as {len(transp_ordenada)}."
+                            )
+                        medidor.encerrar("📊 Gráfico: Performance por transportadora")
+                    
                         # Tabela de performance
                         tabela_exibir = transp_ordenada[['Entregue no Prazo', 'Entregue Atrasada', 'Total', '% SLA']].copy()
                         tabela_exibir = tabela_exibir.rename(columns={
@@ -1307,406 +1222,419 @@ if sla is not None:
                             '% SLA': '🎯 % SLA'
                         })
                         st.dataframe(tabela_exibir.sort_values('🎯 % SLA', ascending=False), use_container_width=True)
+                    
+                        # Tempo médio de cada etapa da entrega (colunas pré-calculadas na normalização)
+                        st.markdown("#### ⏱️ Tempo Médio por Etapa (dias)")
+                        agrupar_etapas_por = st.radio(
+                            "Agrupar por:",
+                            options=AGRUPAMENTOS_ETAPAS,
+                            horizontal=True,
+                            key="agrupar_etapas_por"
+                        )
+                    
+                        if agrupar_etapas_por in performance_sla.tempo_etapas:
+                            st.dataframe(performance_sla.tempo_etapas[agrupar_etapas_por], use_container_width=True)
+                        else:
+                            st.info(f"📊 Coluna {agrupar_etapas_por} não encontrada")
                     else:
                         st.info("📊 Nenhuma transportadora com volume suficiente (min. 10 entregas)")
                 else:
-                    st.info("📊 Dados insuficientes para calcular performance")
+                    st.info("📊 Não há dados suficientes de entregas realizadas")
             else:
-                st.info("📊 Não há dados suficientes de entregas realizadas")
-        else:
-            st.info("📊 Dados necessários para análise de performance não disponíveis")
+                st.info("📊 Dados necessários para análise de performance não disponíveis")
     
-    # ===== ABA 4: GESTÃO DE PENDÊNCIAS =====
-    with tab4:
-        st.header("🚨 Gestão de Pendências")
-        st.markdown("Análise e gerenciamento de notas fiscais pendentes de entrega.")
+        # ===== ABA 4: GESTÃO DE PENDÊNCIAS =====
+        elif secao_ativa == SECOES[3]:
+            st.header("🚨 Gestão de Pendências")
+            st.markdown("Análise e gerenciamento de notas fiscais pendentes de entrega.")
         
-        if all(col in sla.columns for col in ['Data de Entrega', 'Previsão de Entrega', 'Transportador']):
-            # Identificar notas pendentes
-            notas_pendentes = sla[sla['Data de Entrega'].isna()].copy()
-            
-            # Notas atrasadas (entregues após a previsão)
-            sla_temp = sla.copy()
-            sla_temp['Data de Entrega'] = pd.to_datetime(sla_temp['Data de Entrega'], errors='coerce')
-            sla_temp['Previsão de Entrega'] = pd.to_datetime(sla_temp['Previsão de Entrega'], errors='coerce')
-            
-            notas_atrasadas = sla_temp[
-                (sla_temp['Data de Entrega'].notna()) & 
-                (sla_temp['Previsão de Entrega'].notna()) &
-                (sla_temp['Data de Entrega'] > sla_temp['Previsão de Entrega'])
-            ].copy()
-            
-            # Combinar pendentes + atrasadas
-            todas_pendentes = pd.concat([notas_pendentes, notas_atrasadas], ignore_index=True)
-            
-            if not todas_pendentes.empty:
-                # Métricas principais
-                col1, col2, col3 = st.columns(3)
+            pendencias = agregado('pendencias')
+            if pendencias is not None:
+                # Pendentes (sem data de entrega) + entregues após a previsão
+                if pendencias.total > 0:
+                    # Métricas principais
+                    col1, col2, col3 = st.columns(3)
                 
-                with col1:
-                    st.metric("🔴 Total Pendentes", len(todas_pendentes))
+                    with col1:
+                        st.metric("🔴 Total Pendentes", pendencias.total)
                 
-                with col2:
-                    st.metric("⏰ Sem Data Entrega", len(notas_pendentes))
+                    with col2:
+                        st.metric("⏰ Sem Data Entrega", pendencias.sem_data)
                 
-                with col3:
-                    st.metric("📅 Entregues Atrasadas", len(notas_atrasadas))
+                    with col3:
+                        st.metric("📅 Entregues Atrasadas", pendencias.atrasadas)
+                
+                    # Gráfico por transportadora
+                    pendentes_transp = pendencias.por_transportador.head(10)
                 
-                # Gráfico por transportadora
-                if 'Transportador' in todas_pendentes.columns:
-                    pendentes_transp = todas_pendentes['Transportador'].value_counts().head(10)
-                    
                     if not pendentes_transp.empty:
-                        # Criar DataFrame para o gráfico de notas pendentes
-                        df_pendentes = pd.DataFrame({
-                            'Transportadora': pendentes_transp.index,
-                            'Quantidade': pendentes_transp.values
-                        })
-                        
-                        fig = px.bar(
-                            df_pendentes,
-                            x='Quantidade',
-                            y='Transportadora',
-                            orientation='h',
-                            title="🚚 Notas Pendentes por Transportadora",
-                            labels={'Quantidade': 'Quantidade', 'Transportadora': 'Transportadora'},
-                            color='Quantidade',
-                            color_continuous_scale='Reds'
-                        )
-                        fig.update_traces(
-                            hovertemplate='<b>%{y}</b><br>Notas Pendentes: %{x}<extra></extra>'
-                        )
-                        fig.update_layout(height=500, showlegend=False, coloraxis_showscale=False)
+                        medidor.iniciar("📊 Gráfico: Pendências por transportadora")
+                        fig = grafico('pendencias', pendencias.por_transportador, top_n=10)
                         st.plotly_chart(fig, use_container_width=True)
-                        
+                        medidor.encerrar("📊 Gráfico: Pendências por transportadora")
+                    
                         # Tabela detalhada
                         st.dataframe(pendentes_transp.to_frame(name='Notas Pendentes'), use_container_width=True)
                     else:
                         st.info("📊 Dados de transportadora não disponíveis")
                 else:
-                    st.info("📊 Coluna Transportador não encontrada")
+                    st.success("🎉 Parabéns! Não há notas pendentes de entrega no momento!")
             else:
-                st.success("🎉 Parabéns! Não há notas pendentes de entrega no momento!")
-        else:
-            st.info("📊 Dados necessários para análise de pendências não disponíveis")
+                st.info("📊 Dados necessários para análise de pendências não disponíveis")
                 
-    # ===== ABA 5: BUSCA NF =====
-    with tab5:
-        st.header("🔍 Buscar Nota Fiscal")
-        st.markdown("Utilize esta ferramenta para localizar informações específicas de uma nota fiscal.")
+        # ===== ABA 5: BUSCA NF =====
+        # Fragmento: digitar uma busca reexecuta apenas esta seção, sem refazer filtros e insights
+        @st.fragment
+        def secao_busca_nf():
+            st.header("🔍 Buscar Nota Fiscal")
+            st.markdown("Utilize esta ferramenta para localizar informações específicas de uma nota fiscal.")
         
-        numero_nf = st.text_input("Digite o número da Nota Fiscal:", placeholder="Ex: 123456")
+            # Reexecução só do fragmento: a busca é medida à parte e redesenha o painel de performance,
+            # cuja posição o fragmento reserva na execução completa
+            if execucao_concluida:
+                medidor_busca = Medidor(medidor.execucao)
+            else:
+                medidor_busca = medidor
+                painel_performance.empty()
+            
+            numero_nf = st.text_input("Digite o número da Nota Fiscal:", placeholder="Ex: 123456")
         
-        if numero_nf:
-            # Converter para string para comparação
-            numero_nf_str = str(numero_nf)
+            col_modo, col_romaneio = st.columns([2, 1])
+            with col_modo:
+                modo_busca = st.radio(
+                    "Tipo de busca:",
+                    options=list(MODOS_BUSCA),
+                    format_func=MODOS_BUSCA.get,
+                    horizontal=True
+                )
+            with col_romaneio:
+                incluir_romaneio = st.checkbox("Buscar também por Nr Romaneio", value=False)
+        
+            if numero_nf:
+                # Converter para string para comparação
+                numero_nf_str = str(numero_nf)
             
-            # Filtrar dados baseado no número da NF (usar dados originais, não filtrados)
-            resultado = sla_original[sla_original['Numero'].astype(str).str.contains(numero_nf_str, case=False, na=False)]
+                # Buscar na base completa (usar dados originais, não filtrados): no índice ou no banco
+                colunas_busca = ['Numero', 'Nr Romaneio'] if incluir_romaneio else ['Numero']
+                with medidor_busca.etapa("🔍 Busca NF"):
+                    if resumo_sql is not None:
+                        resultado, encontradas = buscar_nf_sql(
+                            caminho_banco_analitico, numero_nf_str, modo=modo_busca, colunas=colunas_busca, regra_sla=regra_sla
+                        )
+                    else:
+                        hash_arquivo = sla_original.attrs.get('hash_arquivo')
+                        indice_nf = obter_indice_nf(hash_arquivo, sla_original) if hash_arquivo else construir_indice_nf(sla_original)
+                        posicoes = buscar_nf(indice_nf, numero_nf_str, modo=modo_busca, colunas=colunas_busca)
+                        resultado = sla_original.iloc[posicoes]
+                        encontradas = len(resultado)
             
-            if not resultado.empty:
-                st.success(f"🎯 Encontradas {len(resultado)} nota(s) fiscal(is)")
+                if not resultado.empty:
+                    st.success(f"🎯 Encontradas {encontradas} nota(s) fiscal(is)")
+                    if encontradas > len(resultado):
+                        st.caption(f"Exibindo as {len(resultado)} primeiras; refine a busca para ver as demais.")
                 
-                # Para cada resultado encontrado
-                for idx, row in resultado.iterrows():
-                    st.markdown(f"### 📋 Nota Fiscal: {row['Numero']}")
+                    # Para cada resultado encontrado
+                    for idx, row in resultado.iterrows():
+                        st.markdown(f"### 📋 Nota Fiscal: {row['Numero']}")
                     
-                    # Função para formatar datas (mantida para as métricas)
-                    def format_date(date_value):
-                        if pd.isna(date_value) or date_value == '' or str(date_value) == 'N/A':
-                            return 'N/A'
-                        try:
-                            if isinstance(date_value, str):
-                                # Se já é string, tentar converter
-                                date_obj = pd.to_datetime(date_value, errors='coerce')
-                            else:
-                                date_obj = date_value
+                        # Função para formatar datas (mantida para as métricas)
+                        def format_date(date_value):
+                            if pd.isna(date_value) or date_value == '' or str(date_value) == 'N/A':
+                                return 'N/A'
+                            try:
+                                if isinstance(date_value, str):
+                                    # Se já é string, tentar converter
+                                    date_obj = pd.to_datetime(date_value, errors='coerce')
+                                else:
+                                    date_obj = date_value
                             
-                            if pd.isna(date_obj):
-                                return str(date_value)
+                                if pd.isna(date_obj):
+                                    return str(date_value)
                             
-                            return date_obj.strftime('%d-%m-%Y')
-                        except:
-                            return str(date_value)
+                                return date_obj.strftime('%d-%m-%Y')
+                            except:
+                                return str(date_value)
                     
-                    # Função para formatar romaneio
-                    def format_romaneio(romaneio_value):
-                        if pd.isna(romaneio_value) or romaneio_value == '':
-                            return 'N/A'
-                        try:
-                            # Se é float, converter para int para remover .0
-                            if isinstance(romaneio_value, float):
-                                return str(int(romaneio_value))
-                            return str(romaneio_value)
-                        except:
-                            return str(romaneio_value)
+                        # Função para formatar romaneio
+                        def format_romaneio(romaneio_value):
+                            if pd.isna(romaneio_value) or romaneio_value == '':
+                                return 'N/A'
+                            try:
+                                # Se é float, converter para int para remover .0
+                                if isinstance(romaneio_value, float):
+                                    return str(int(romaneio_value))
+                                return str(romaneio_value)
+                            except:
+                                return str(romaneio_value)
                     
-                    # Layout principal: Timeline + Métricas
-                    col_metricas, col_timeline = st.columns([1, 1])
+                        # Layout principal: Timeline + Métricas
+                        col_metricas, col_timeline = st.columns([1, 1])
                     
-                    with col_timeline:
-                        st.markdown("#### 🚛 Rastreamento da Entrega")
+                        with col_timeline:
+                            st.markdown("#### 🚛 Rastreamento da Entrega")
                         
-                        # Exibir timeline usando componentes nativos do Streamlit
-                        etapas, soma_real_dias = criar_timeline_entrega(row)
+                            # Exibir timeline usando componentes nativos do Streamlit
+                            etapas, soma_real_dias = criar_timeline_entrega(row)
                         
-                        for i, etapa in enumerate(etapas):
-                            # Definir cores baseadas no status
-                            if etapa['status'] == 'concluido':
-                                cor_fundo = "#d4edda"  # Verde claro
-                                cor_borda = "#28a745"  # Verde
-                                cor_texto = "#155724"  # Verde escuro
-                            else:
-                                cor_fundo = "#f8f9fa"  # Cinza claro
-                                cor_borda = "#dee2e6"  # Cinza
-                                cor_texto = "#6c757d"  # Cinza escuro
+                            for i, etapa in enumerate(etapas):
+                                # Definir cores baseadas no status
+                                if etapa['status'] == 'concluido':
+                                    cor_fundo = "#d4edda"  # Verde claro
+                                    cor_borda = "#28a745"  # Verde
+                                    cor_texto = "#155724"  # Verde escuro
+                                else:
+                                    cor_fundo = "#f8f9fa"  # Cinza claro
+                                    cor_borda = "#dee2e6"  # Cinza
+                                    cor_texto = "#6c757d"  # Cinza escuro
                             
-                            # Container para cada etapa
-                            container = st.container()
-                            with container:
-                                # Usar HTML simples para melhor controle visual
-                                data_texto = etapa['data'] if etapa['data'] else 'Não informado'
-                                duracao_texto = etapa.get('duracao', None)
+                                # Container para cada etapa
+                                container = st.container()
+                                with container:
+                                    # Usar HTML simples para melhor controle visual
+                                    data_texto = etapa['data'] if etapa['data'] else 'Não informado'
+                                    duracao_texto = etapa.get('duracao', None)
                                 
-                                # Criar texto da duração se disponível
-                                info_adicional = []
-                                if data_texto != 'Não informado':
-                                    info_adicional.append(data_texto)
-                                if duracao_texto and duracao_texto != 'None':
-                                    info_adicional.append(f"⏱️ {duracao_texto}")
+                                    # Criar texto da duração se disponível
+                                    info_adicional = []
+                                    if data_texto != 'Não informado':
+                                        info_adicional.append(data_texto)
+                                    if duracao_texto and duracao_texto != 'None':
+                                        info_adicional.append(f"⏱️ {duracao_texto}")
                                 
-                                texto_completo = " • ".join(info_adicional) if info_adicional else "Não informado"
+                                    texto_completo = " • ".join(info_adicional) if info_adicional else "Não informado"
                                 
-                                etapa_html = f"""
-                                <div style="
-                                    display: flex;
-                                    align-items: center;
-                                    margin: 10px 0;
-                                    padding: 12px;
-                                    background-color: {cor_fundo};
-                                    border-left: 4px solid {cor_borda};
-                                    border-radius: 8px;
-                                    font-family: 'Source Sans Pro', sans-serif;
-                                ">
+                                    etapa_html = f"""
                                     <div style="
-                                        font-size: 24px;
-                                        margin-right: 12px;
-                                        min-width: 30px;
+                                        display: flex;
+                                        align-items: center;
+                                        margin: 10px 0;
+                                        padding: 12px;
+                                        background-color: {cor_fundo};
+                                        border-left: 4px solid {cor_borda};
+                                        border-radius: 8px;
+                                        font-family: 'Source Sans Pro', sans-serif;
                                     ">
-                                        {etapa['icon']}
-                                    </div>
-                                    <div style="flex-grow: 1;">
                                         <div style="
-                                            font-weight: 600;
-                                            color: {cor_texto};
-                                            font-size: 14px;
-                                            margin-bottom: 4px;
+                                            font-size: 24px;
+                                            margin-right: 12px;
+                                            min-width: 30px;
                                         ">
-                                            {etapa['titulo']}
+                                            {etapa['icon']}
                                         </div>
-                                        <div style="
-                                            color: {cor_texto};
-                                            font-size: 13px;
-                                            opacity: 0.8;
-                                        ">
-                                            {texto_completo}
+                                        <div style="flex-grow: 1;">
+                                            <div style="
+                                                font-weight: 600;
+                                                color: {cor_texto};
+                                                font-size: 14px;
+                                                margin-bottom: 4px;
+                                            ">
+                                                {etapa['titulo']}
+                                            </div>
+                                            <div style="
+                                                color: {cor_texto};
+                                                font-size: 13px;
+                                                opacity: 0.8;
+                                            ">
+                                                {texto_completo}
+                                            </div>
                                         </div>
                                     </div>
-                                </div>
-                                """
+                                    """
                                 
-                                st.markdown(etapa_html, unsafe_allow_html=True)
+                                    st.markdown(etapa_html, unsafe_allow_html=True)
                                 
-                                # Adicionar linha conectora (exceto para o último item)
-                                if i < len(etapas) - 1:
-                                    st.markdown("""
-                                    <div style="
-                                        margin-left: 15px;
-                                        width: 2px;
-                                        height: 10px;
-                                        background-color: #dee2e6;
-                                    "></div>
-                                    """, unsafe_allow_html=True)
+                                    # Adicionar linha conectora (exceto para o último item)
+                                    if i < len(etapas) - 1:
+                                        st.markdown("""
+                                        <div style="
+                                            margin-left: 15px;
+                                            width: 2px;
+                                            height: 10px;
+                                            background-color: #dee2e6;
+                                        "></div>
+                                        """, unsafe_allow_html=True)
                     
-                    with col_metricas:
-                        st.markdown("#### 📊 Informações Detalhadas")
+                        with col_metricas:
+                            st.markdown("#### 📊 Informações Detalhadas")
                         
-                        # Organizar métricas em sub-colunas
-                        subcol1, subcol2 = st.columns(2)
+                            # Organizar métricas em sub-colunas
+                            subcol1, subcol2 = st.columns(2)
                         
-                        with subcol1:
-                            st.metric(
-                                label="🏢 BU",
-                                value=str(row.get('Unid Negoc', 'N/A'))
-                            )
+                            with subcol1:
+                                st.metric(
+                                    label="🏢 BU",
+                                    value=str(row.get('Unid Negoc', 'N/A'))
+                                )
                             
-                            st.metric(
-                                label="📦 Romaneio",
-                                value=format_romaneio(row.get('Nr Romaneio', 'N/A'))
-                            )
+                                st.metric(
+                                    label="📦 Romaneio",
+                                    value=format_romaneio(row.get('Nr Romaneio', 'N/A'))
+                                )
 
-                        with subcol2:
-                            st.metric(
-                                label="🚚 Transportador",
-                                value=str(row.get('Transportador', 'N/A'))
-                            )
+                            with subcol2:
+                                st.metric(
+                                    label="🚚 Transportador",
+                                    value=str(row.get('Transportador', 'N/A'))
+                                )
                             
-                            st.metric(
-                                label="⚡ Status",
-                                value=str(row.get('Status', 'N/A'))
-                            )
+                                st.metric(
+                                    label="⚡ Status",
+                                    value=str(row.get('Status', 'N/A'))
+                                )
                         
-                        # Métricas de tempo
-                        col_lead, col_real = st.columns(2)
+                            # Métricas de tempo
+                            col_lead, col_real = st.columns(2)
                         
-                        with col_lead:
-                            # Lead Time (previsto)
-                            lead_time_valor = row.get('Lead Time', 'N/A')
-                            if pd.notna(lead_time_valor) and lead_time_valor != 'N/A':
-                                lead_time_formatado = f"{int(lead_time_valor)} dias"
-                            else:
-                                lead_time_formatado = 'N/A'
+                            with col_lead:
+                                # Lead Time (previsto)
+                                lead_time_valor = row.get('Lead Time', 'N/A')
+                                if pd.notna(lead_time_valor) and lead_time_valor != 'N/A':
+                                    lead_time_formatado = f"{int(lead_time_valor)} dias"
+                                else:
+                                    lead_time_formatado = 'N/A'
                             
-                            st.metric(
-                                label="⏱️ Lead Time (Previsto)",
-                                value=lead_time_formatado
-                            )
+                                st.metric(
+                                    label="⏱️ Lead Time (Previsto)",
+                                    value=lead_time_formatado
+                                )
                         
-                        with col_real:
-                            # Tempo Total (soma das etapas)
-                            if soma_real_dias is not None:
-                                tempo_total_formatado = f"{soma_real_dias} dias"
-                            else:
-                                tempo_total_formatado = 'N/A'
+                            with col_real:
+                                # Tempo Total (soma das etapas)
+                                if soma_real_dias is not None:
+                                    tempo_total_formatado = f"{soma_real_dias} dias"
+                                else:
+                                    tempo_total_formatado = 'N/A'
                             
-                            st.metric(
-                                label="🕐 Tempo Total",
-                                value=tempo_total_formatado,
-                                help="Soma de: Faturamento + Despacho + Entrega (dias corridos)"
-                            )
+                                st.metric(
+                                    label="🕐 Tempo Total",
+                                    value=tempo_total_formatado,
+                                    help="Soma de: Faturamento + Despacho + Entrega (dias corridos)"
+                                )
                     
-                    # Seção de Dados de Ocorrência
-                    st.markdown("#### ⚠️ Dados de Ocorrência")
+                        # Seção de Dados de Ocorrência
+                        st.markdown("#### ⚠️ Dados de Ocorrência")
                     
-                    # Verificar se existe a coluna de ocorrência e se há dados
-                    if 'Ocorrência' in row.index and pd.notna(row.get('Ocorrência')) and str(row.get('Ocorrência')).strip() != '':
-                        ocorrencia_texto = str(row.get('Ocorrência')).strip()
+                        # Verificar se existe a coluna de ocorrência e se há dados
+                        if 'Ocorrência' in row.index and pd.notna(row.get('Ocorrência')) and str(row.get('Ocorrência')).strip() != '':
+                            ocorrencia_texto = str(row.get('Ocorrência')).strip()
                         
-                        # Verificar se a entrega foi realizada normalmente (no prazo)
-                        entrega_normal = False
-                        try:
-                            data_entrega = pd.to_datetime(row.get('Data de Entrega'), errors='coerce')
-                            previsao_entrega = pd.to_datetime(row.get('Previsão de Entrega'), errors='coerce')
-                            
-                            if pd.notna(data_entrega) and pd.notna(previsao_entrega):
-                                entrega_normal = data_entrega <= previsao_entrega
-                        except:
-                            entrega_normal = False
+                            # Verificar se a entrega foi realizada normalmente (no prazo)
+                            entrega_normal = bool(row.get('No Prazo', False))
                         
-                        # Definir cores baseadas no status da entrega
-                        if entrega_normal:
-                            # Verde para entrega normal
-                            cor_fundo = "#d4edda"
-                            cor_borda = "#28a745"
-                            cor_texto = "#155724"
-                            icone = "✅"
-                            titulo = "Entrega Realizada Normalmente"
-                        else:
-                            # Amarelo para problemas/atrasos
-                            cor_fundo = "#fff3cd"
-                            cor_borda = "#ffc107"
-                            cor_texto = "#856404"
-                            icone = "⚠️"
-                            titulo = "Ocorrência Registrada"
+                            # Definir cores baseadas no status da entrega
+                            if entrega_normal:
+                                # Verde para entrega normal
+                                cor_fundo = "#d4edda"
+                                cor_borda = "#28a745"
+                                cor_texto = "#155724"
+                                icone = "✅"
+                                titulo = "Entrega Realizada Normalmente"
+                            else:
+                                # Amarelo para problemas/atrasos
+                                cor_fundo = "#fff3cd"
+                                cor_borda = "#ffc107"
+                                cor_texto = "#856404"
+                                icone = "⚠️"
+                                titulo = "Ocorrência Registrada"
                         
-                        # Exibir a ocorrência com formatação visual dinâmica
-                        ocorrencia_html = f"""
-                        <div style="
-                            margin: 10px 0;
-                            padding: 15px;
-                            background-color: {cor_fundo};
-                            border-left: 4px solid {cor_borda};
-                            border-radius: 8px;
-                            font-family: 'Source Sans Pro', sans-serif;
-                        ">
+                            # Exibir a ocorrência com formatação visual dinâmica
+                            ocorrencia_html = f"""
                             <div style="
-                                display: flex;
-                                align-items: flex-start;
-                                margin-bottom: 8px;
+                                margin: 10px 0;
+                                padding: 15px;
+                                background-color: {cor_fundo};
+                                border-left: 4px solid {cor_borda};
+                                border-radius: 8px;
+                                font-family: 'Source Sans Pro', sans-serif;
                             ">
                                 <div style="
-                                    font-size: 20px;
-                                    margin-right: 10px;
-                                    color: {cor_texto};
-                                    min-width: 25px;
+                                    display: flex;
+                                    align-items: flex-start;
+                                    margin-bottom: 8px;
                                 ">
-                                    {icone}
+                                    <div style="
+                                        font-size: 20px;
+                                        margin-right: 10px;
+                                        color: {cor_texto};
+                                        min-width: 25px;
+                                    ">
+                                        {icone}
+                                    </div>
+                                    <div style="
+                                        font-weight: 600;
+                                        color: {cor_texto};
+                                        font-size: 14px;
+                                    ">
+                                        {titulo}
+                                    </div>
                                 </div>
                                 <div style="
-                                    font-weight: 600;
+                                    margin-left: 35px;
                                     color: {cor_texto};
-                                    font-size: 14px;
+                                    font-size: 13px;
+                                    line-height: 1.4;
+                                    background-color: rgba(255, 255, 255, 0.7);
+                                    padding: 8px;
+                                    border-radius: 4px;
                                 ">
-                                    {titulo}
+                                    {ocorrencia_texto}
                                 </div>
                             </div>
-                            <div style="
-                                margin-left: 35px;
-                                color: {cor_texto};
-                                font-size: 13px;
-                                line-height: 1.4;
-                                background-color: rgba(255, 255, 255, 0.7);
-                                padding: 8px;
-                                border-radius: 4px;
-                            ">
-                                {ocorrencia_texto}
-                            </div>
-                        </div>
-                        """
+                            """
                         
-                        st.markdown(ocorrencia_html, unsafe_allow_html=True)
-                    else:
-                        # Exibir mensagem quando não há ocorrência
-                        sem_ocorrencia_html = f"""
-                        <div style="
-                            margin: 10px 0;
-                            padding: 15px;
-                            background-color: #d1edff;
-                            border-left: 4px solid #0084ff;
-                            border-radius: 8px;
-                            font-family: 'Source Sans Pro', sans-serif;
-                        ">
+                            st.markdown(ocorrencia_html, unsafe_allow_html=True)
+                        else:
+                            # Exibir mensagem quando não há ocorrência
+                            sem_ocorrencia_html = f"""
                             <div style="
-                                display: flex;
-                                align-items: center;
+                                margin: 10px 0;
+                                padding: 15px;
+                                background-color: #d1edff;
+                                border-left: 4px solid #0084ff;
+                                border-radius: 8px;
+                                font-family: 'Source Sans Pro', sans-serif;
                             ">
                                 <div style="
-                                    font-size: 20px;
-                                    margin-right: 10px;
-                                    color: #0066cc;
-                                    min-width: 25px;
-                                ">
-                                    ✅
-                                </div>
-                                <div style="
-                                    color: #0066cc;
-                                    font-size: 14px;
-                                    font-weight: 500;
+                                    display: flex;
+                                    align-items: center;
                                 ">
-                                    Nenhuma ocorrência registrada para esta nota fiscal
+                                    <div style="
+                                        font-size: 20px;
+                                        margin-right: 10px;
+                                        color: #0066cc;
+                                        min-width: 25px;
+                                    ">
+                                        ✅
+                                    </div>
+                                    <div style="
+                                        color: #0066cc;
+                                        font-size: 14px;
+                                        font-weight: 500;
+                                    ">
+                                        Nenhuma ocorrência registrada para esta nota fiscal
+                                    </div>
                                 </div>
                             </div>
-                        </div>
-                        """
+                            """
                         
-                        st.markdown(sem_ocorrencia_html, unsafe_allow_html=True)
+                            st.markdown(sem_ocorrencia_html, unsafe_allow_html=True)
                     
-                    # Separador entre resultados se houver múltiplas NFs
-                    if len(resultado) > 1:
-                        st.markdown("---")
-            else:
-                st.warning(f"❌ Nenhuma nota fiscal encontrada com o número '{numero_nf}'")
-else:
-    st.error("❌ Nenhum arquivo foi carregado. Faça upload de um arquivo Excel válido para continuar.")
-
-
+                        # Separador entre resultados se houver múltiplas NFs
+                        if len(resultado) > 1:
+                            st.markdown("---")
+                else:
+                    st.warning(f"❌ Nenhuma nota fiscal encontrada com o número '{numero_nf}'")
+            
+            if execucao_concluida:
+                mostrar_painel_performance(medidor_busca)
+    
+        if secao_ativa == SECOES[4]:
+            secao_busca_nf()
+        medidor.encerrar(f"Seção: {secao_ativa}")
+    else:
+        st.error("❌ Nenhum arquivo foi carregado. Faça upload de um arquivo Excel válido para continuar.")
+except ExecucaoInterrompida:
+    pass
+finally:
+    mostrar_painel_performance(medidor)
+    execucao_concluida = True